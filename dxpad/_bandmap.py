@@ -3,10 +3,12 @@
 
 import sys
 import time
+import bisect
 
 from PySide import QtCore, QtGui
 
-from . import _spotting, _dxcc, _bandplan, _config, _windowmanager
+from . import _spotting, _dxcc, _bandplan, _config, _windowmanager, \
+              _metrics
 
 COLOR_SPOT = QtGui.QColor(255, 120, 120)
 COLOR_BACKGROUND = QtGui.QColor(200, 200, 200)
@@ -17,6 +19,7 @@ COLOR_DIGI_PORTION = QtGui.QColor(169, 245, 242)
 COLOR_BEACON_PORTION = QtGui.QColor(245, 169, 169)
 COLOR_SSB_PORTION = QtGui.QColor(169, 245, 169)
 COLOR_FM_PORTION = QtGui.QColor(208, 169, 245)
+COLOR_OPENING = QtGui.QColor(0, 150, 0)
 COLOR_PORTION = {
     "CW": COLOR_CW_PORTION,
     "Digi": COLOR_DIGI_PORTION,
@@ -27,24 +30,35 @@ COLOR_PORTION = {
 
 class BandMap(QtCore.QObject):
     update_spots = QtCore.Signal(object)
+    update_openings = QtCore.Signal(object)
 
-    def __init__(self, parent = None):
+    def __init__(self, statistics = None, parent = None):
         QtCore.QObject.__init__(self, parent)
         self.spots = []
         self.spotter_continents = ["EU"]
+        self.statistics = statistics
+        self.delta_latency = _metrics.METRICS.histogram(
+            "gui.delta_latency_seconds")
 
     @QtCore.Slot(object)
-    def spots_received(self, spots):
-        self.spots = list(filter(self._filter_spot, spots))
+    def spots_changed(self, delta):
+        """Emit the spots that were received on the selected continents,
+        sorted by frequency."""
+        self.delta_latency.observe(time.monotonic() - delta.created)
+        self.spots = delta.table.query(
+            spotter_continents = self.spotter_continents)
         self.update_spots.emit(self.spots)
+        if self.statistics:
+            self.update_openings.emit(self.usual_band_activity())
 
-    def _filter_spot(self, spot):
-        sources_on_continent = [
-            source for source in spot.sources 
-            if source.source_dxcc_info 
-              and source.source_dxcc_info.continent in self.spotter_continents
-        ]
-        return len(sources_on_continent) > 0
+    def usual_band_activity(self):
+        """Return the spots per day that are usually received on the 
+        selected continents now, for every band of the statistics' 
+        bandplan."""
+        activities = [
+            self.statistics.band_activity(continent)
+            for continent in self.spotter_continents]
+        return [sum(activity) for activity in zip(*activities)]
 
 
 class OverviewBandmap(QtGui.QWidget):   
@@ -54,6 +68,7 @@ class OverviewBandmap(QtGui.QWidget):
         self.bandplan = bandplan
         self.band = band
         self.spots = []
+        self.openings = []
         self.from_kHz = 1000.0
         self.to_kHz = 30000.0
 
@@ -72,11 +87,16 @@ class OverviewBandmap(QtGui.QWidget):
 
         painter.fillRect(box, COLOR_BACKGROUND)
 
-        for band in self.bandplan:
+        max_opening = max(self.openings) if self.openings else 0
+        for i, band in enumerate(self.bandplan):
             band_selected = band == self.band
             x = int((band.from_kHz - self.from_kHz) * pixPerKHz)
             w = max(1, int((band.to_kHz - band.from_kHz) * pixPerKHz))
             painter.fillRect(x, 0, w, box.height(), COLOR_BAND)
+            if max_opening and i < len(self.openings):
+                painter.setOpacity(self.openings[i] / max_opening)
+                painter.fillRect(x, box.height() - 3, w, 3, COLOR_OPENING)
+                painter.setOpacity(1)
 
             color = COLOR_BAND_SELECTED if band_selected else COLOR_BAND
             painter.setPen(color)
@@ -100,6 +120,13 @@ class OverviewBandmap(QtGui.QWidget):
         self.spots = spots
         self.repaint()
 
+    @QtCore.Slot(object)
+    def update_openings(self, openings):
+        """Take the spots per day that are usually received now on every 
+        band, the more, the stronger the band is underlined."""
+        self.openings = openings
+        self.repaint()
+
     @QtCore.Slot(object)
     def select_band(self, band):
         self.band = band
@@ -181,10 +208,12 @@ class DetailedBandmap(QtGui.QWidget):
 
     @QtCore.Slot(object)
     def update_spots(self, spots):
-        self.spots = [
-          spot for spot in spots 
-          if spot.frequency >= self.from_kHz and spot.frequency <= self.to_kHz
-        ]
+        """Take the given spots, sorted by frequency, that are within the 
+        visible range."""
+        frequency = lambda spot: spot.frequency
+        self.spots = spots[
+            bisect.bisect_left(spots, self.from_kHz, key = frequency):
+            bisect.bisect_right(spots, self.to_kHz, key = frequency)]
         self.repaint()
 
     @QtCore.Slot(object)
@@ -314,6 +343,7 @@ class BandmapWindow(_windowmanager.ManagedWindow):
         self.bandmap.update_spots.connect(overview.update_spots)
         self.bandmap.update_spots.connect(single_band.update_spots)
         self.bandmap.update_spots.connect(detail.update_spots)
+        self.bandmap.update_openings.connect(overview.update_openings)
 
         self.vfo.band_changed.connect(overview.select_band)
         self.vfo.band_changed.connect(single_band.select_band)
@@ -335,20 +365,24 @@ def main(args):
     dxcc = _dxcc.DXCC()
     dxcc.load()
     aggregator = _spotting.SpotAggregator(dxcc)
+    aggregation_thread = _spotting.AggregationThread(aggregator)
     bandmap = BandMap()
 
     wid = BandmapWindow(bandmap)
     wid.resize(1000, 300)
     wid.show()
 
-    aggregator.update_spots.connect(bandmap.spots_received)
+    aggregator.spots_changed.connect(bandmap.spots_changed)
     bandmap.update_spots.connect(print_bandmap)
 
     clusters = config.clusters
     spotting_file = None #"rbn.txt"
+    aggregation_thread.start()
     aggregator.start_spotting(clusters, spotting_file)
 
     result = app.exec_()
     
     aggregator.stop_spotting()
+    aggregation_thread.stop()
+    aggregation_thread.wait()
     sys.exit(result)
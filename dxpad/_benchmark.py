@@ -0,0 +1,546 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Replay recorded cluster traffic through the spotting pipeline and measure
+where the time goes.
+
+The input is a file in the format that ClusterSpotter.record writes, i.e. the
+raw lines as received from the cluster (see rbn.txt). If no file is given, a
+synthetic RBN feed is generated from a fixed seed, so the numbers are
+repeatable on any machine without network access.
+
+The DXCC data is taken from ~/.config/dxpad/cty.dat if it exists. It is
+never downloaded, the lookups just return nothing without it.
+
+usage: python3 -m dxpad._benchmark [rbn.txt] [cleanup interval in spots]
+"""
+
+import sys
+import os
+import re
+import time
+import random
+import tracemalloc
+
+from . import _spotting, _dxcc, _config, _callinfo, _grid, _time, _parsing, \
+              _spottable, _bandplan, _location
+
+DEFAULT_CLEANUP_INTERVAL = 100 # spots
+SYNTHETIC_LINES = 20000
+SYNTHETIC_BASELINE = 16.7 * 2**20 # bytes retained of the synthetic lines, 
+                                  # once the DxSpots summarized their sources
+REPLAY_DAY = 1476576000 # 2016-10-16, the recordings only contain the time
+
+SKIMMER_COUNT = 150
+DX_CALL_COUNT = 2000
+BUST_RATE = 0.05
+
+POOL_WORKERS = [1, 2, 4]
+POOL_BATCH_SIZE = 500 # lines
+
+TABLE_SIZES = [5000, 50000] # spots
+TABLE_SOURCES = 3 # sources per spot
+TABLE_REPEAT = 5
+
+SOURCE_COUNTS = [10, 100, 1000] # source spots per DxSpot
+
+LOOKUP_CALLS = 1000000
+PORTABLE_RATE = 0.05
+DXCC_ENTITIES = 340
+DXCC_ALIASES = 20 # prefixes per entity
+DXCC_EXACT_CALLS = 20000
+
+CALL_PREFIXES = ["DL", "G", "F", "I", "EA", "OK", "SP", "K", "W", "N", "JA", 
+                 "VK", "UA", "9A", "S5", "HA", "YO", "PY", "LU"]
+
+class StageStatistics:
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+
+    def measure(self, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.durations.append(time.perf_counter() - start)
+        return result
+
+    def total(self):
+        return sum(self.durations)
+
+    def percentile(self, p):
+        if not self.durations: return 0.0
+        durations = sorted(self.durations)
+        index = min(len(durations) - 1, int(len(durations) * p / 100.0))
+        return durations[index]
+
+    def __str__(self):
+        total = self.total()
+        rate = len(self.durations) / total if total else 0.0
+        return "{:<10} {:>8} {:>10.3f} {:>12.0f} {:>10.1f} {:>10.1f}".format(
+            self.name, len(self.durations), total, rate,
+            self.percentile(50) * 1e6, self.percentile(99) * 1e6)
+
+
+def _random_call(rnd):
+    prefix = rnd.choice(CALL_PREFIXES)
+    suffix = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+                     for i in range(rnd.randint(1, 3)))
+    return "{}{}{}".format(prefix, rnd.randint(0, 9), suffix)
+
+def _bust(rnd, call):
+    letters = [i for i, c in enumerate(call) if c.isalpha()]
+    i = rnd.choice(letters[1:] or letters)
+    return call[:i] + rnd.choice("ESTIMO") + call[i + 1:]
+
+def generate_rbn_lines(count = SYNTHETIC_LINES, seed = 4711):
+    """Generate raw RBN lines in the format of arcluster.reversebeacon.net"""
+    rnd = random.Random(seed)
+    skimmers = [_random_call(rnd) + "-#" for i in range(SKIMMER_COUNT)]
+    dx_stations = [
+        (_random_call(rnd), rnd.choice([1800, 3500, 7000, 14000, 21000, 28000])
+                            + rnd.randint(0, 600) / 10.0)
+        for i in range(DX_CALL_COUNT)]
+    start = 12 * 60
+    lines = []
+    for i in range(count):
+        call, frequency = rnd.choice(dx_stations)
+        if rnd.random() < BUST_RATE:
+            call = _bust(rnd, call)
+        minute = start + (i * 60) // count
+        lines.append(
+            "DX de {}:{:>11.1f}  {:<14} CW {:>5} dB {:>3} WPM  CQ      "
+            "{:02d}{:02d}Z\n".format(
+                rnd.choice(skimmers), frequency + rnd.randint(-1, 1) / 10.0,
+                call, rnd.randint(3, 40), rnd.randint(18, 35),
+                minute // 60, minute % 60))
+    return lines
+
+def generate_dxcc(seed = 4711):
+    """Generate a prefix table of about the size of cty.dat, so the lookups
+    can be compared without it."""
+    rnd = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    infos = []
+    infos_by_prefix = {}
+    for i in range(DXCC_ENTITIES):
+        primary_prefix = (CALL_PREFIXES[i] 
+                          if i < len(CALL_PREFIXES) 
+                          else rnd.choice(alphabet[:26]) + rnd.choice(alphabet))
+        info = _dxcc.DXCCInfo(
+            primary_prefix, 0, 0, "EU", _location.LatLon(0, 0), 0.0, 
+            primary_prefix)
+        infos.append(info)
+        infos_by_prefix[primary_prefix] = info
+        for j in range(DXCC_ALIASES):
+            alias = primary_prefix + "".join(
+                rnd.choice(alphabet) for k in range(rnd.randint(1, 2)))
+            infos_by_prefix.setdefault(alias, info)
+    for i in range(DXCC_EXACT_CALLS):
+        info = rnd.choice(infos).copy()
+        info.needs_exact_match = True
+        infos_by_prefix[_random_call(rnd)] = info
+    dxcc = _dxcc.DXCC()
+    dxcc.infos_by_prefix = infos_by_prefix
+    return dxcc
+
+def generate_calls(count = LOOKUP_CALLS, seed = 4711):
+    """Generate the source and DX calls of a synthetic RBN feed, with some
+    portable calls among the DX calls."""
+    rnd = random.Random(seed)
+    skimmers = [_random_call(rnd) for i in range(SKIMMER_COUNT)]
+    dx_calls = []
+    for i in range(DX_CALL_COUNT):
+        call = _random_call(rnd)
+        if rnd.random() < PORTABLE_RATE:
+            call = rnd.choice(
+                [rnd.choice(CALL_PREFIXES) + "/" + call, call + "/P"])
+        dx_calls.append(call)
+    skimmers = [_callinfo.Call(call) for call in skimmers]
+    dx_calls = [_callinfo.Call(call) for call in dx_calls]
+    return [
+        rnd.choice(skimmers) if i % 2 else rnd.choice(dx_calls)
+        for i in range(count)]
+
+def load_lines(filename):
+    with open(filename) as f:
+        return f.readlines()
+
+def load_dxcc():
+    dxcc = _dxcc.DXCC()
+    filename = _config.filename("cty.dat")
+    if os.path.isfile(filename):
+        dxcc.load_from_file(filename)
+    else:
+        print("{} not found, running without DXCC data".format(filename))
+    return dxcc
+
+
+def replay(lines, dxcc, cleanup_interval = DEFAULT_CLEANUP_INTERVAL):
+    """Feed the given raw lines through ClusterSpotter and SpotAggregator.
+
+    The lines are replayed as fast as possible on a VirtualClock that 
+    follows their recorded time, so the spots expire like they did live.
+    Every stage is measured separately: parsing including the DXCC lookups 
+    per line, aggregation per spot and cleanup per call. Returns the 
+    statistics of all stages."""
+    parse = StageStatistics("parse")
+    aggregate = StageStatistics("aggregate")
+    cleanup = StageStatistics("cleanup")
+
+    clock = _time.VirtualClock()
+    client = _spotting.ReplayClient(None, clock, None, REPLAY_DAY)
+    spotter = _spotting.ClusterSpotter(client, dxcc, clock)
+    aggregator = _spotting.SpotAggregator(dxcc, clock = clock)
+    incoming_spots = []
+
+    spot_count = 0
+    for line in lines:
+        client.advance(line)
+        parse.measure(spotter._line_received, line, incoming_spots.append)
+        for spot in incoming_spots:
+            aggregate.measure(aggregator.spot_received, spot)
+            spot_count += 1
+            if spot_count % cleanup_interval == 0:
+                cleanup.measure(aggregator.cleanup_spots)
+        incoming_spots.clear()
+    cleanup.measure(aggregator.cleanup_spots)
+
+    return [parse, aggregate, cleanup]
+
+_legacy_spot_expression = re.compile(r'DX de ([A-Z0-9/]+)(-.+?)?:?\s*([0-9]+\.[0-9]+)\s+([A-Z0-9/]+)\s+(.+?)\s([0-9]{4})Z(\s+([A-Z]{2}[0-9]{2}))?')
+
+def legacy_parse_line(line):
+    """The line parser as it was before ClusterSpotter.parse_line, kept only
+    to compare the throughput. The console output of rejected lines is left
+    out, it would dominate the measurement."""
+    spot_match = _legacy_spot_expression.match(line)
+    if not spot_match:
+        return None
+    if not _callinfo.Call.is_valid_call(spot_match.group(4)):
+        return None
+    if not _callinfo.Call.is_valid_call(spot_match.group(1)):
+        return None
+
+    call = _callinfo.Call(spot_match.group(4))
+    frequency = float(spot_match.group(3))
+    timestamp = time.time()
+    source_call = _callinfo.Call(spot_match.group(1))
+    source_grid = (_grid.Locator(spot_match.group(8))
+                   if spot_match.group(8)
+                   else None)
+    comment = spot_match.group(5).strip()
+
+    rbn_comment_match = (_spotting.ClusterSpotter._rbn_comment_expression
+                         .match(comment))
+    if rbn_comment_match:
+        return _spotting.RbnSpot(
+            call, frequency, timestamp, source_call, source_grid, 
+            rbn_comment_match.group(1), float(rbn_comment_match.group(2)), 
+            rbn_comment_match.group(3), rbn_comment_match.group(5))
+    else:
+        return _spotting.ClusterSpot(
+            call, frequency, timestamp, source_call, source_grid, comment)
+
+def compare_parsers(lines):
+    """Parse all lines with the legacy and the current parser."""
+    legacy = StageStatistics("legacy")
+    current = StageStatistics("current")
+    for line in lines:
+        legacy.measure(legacy_parse_line, line)
+    for line in lines:
+        current.measure(_spotting.ClusterSpotter.parse_line, line)
+    return [legacy, current]
+
+def legacy_find_dxcc_prefix(dxcc, call):
+    """The DXCC lookup as it was before the prefix trie, kept only to 
+    compare the throughput."""
+    prefix = str(call).upper()
+    is_exact_match = True
+    while len(prefix) > 0:
+        if prefix in dxcc.infos_by_prefix:
+            dxcc_info = dxcc.infos_by_prefix[prefix]
+            if not (dxcc_info.needs_exact_match and not is_exact_match):
+                return prefix
+        prefix = prefix[:-1]
+        is_exact_match = False
+    return None
+
+def compare_dxcc_lookups(dxcc, calls):
+    """Look up all calls with the legacy lookup and the prefix trie. Returns
+    the durations of both and the number of calls they resolve 
+    differently."""
+    dxcc.find_dxcc_prefix(calls[0]) # compile the prefixes
+    start = time.perf_counter()
+    legacy = [legacy_find_dxcc_prefix(dxcc, call) for call in calls]
+    legacy_duration = time.perf_counter() - start
+    start = time.perf_counter()
+    current = [dxcc.find_dxcc_prefix(call) for call in calls]
+    duration = time.perf_counter() - start
+    differences = sum(1 for a, b in zip(legacy, current) if a != b)
+    return legacy_duration, duration, differences
+
+def compare_pool_sizes(lines, dxcc, worker_counts = POOL_WORKERS):
+    """Parse all lines including the DXCC lookups in this process and in
+    ParsingPools with the given numbers of workers. For the pools this 
+    includes sending the lines and rebuilding the spots from the records. 
+    Returns pairs of the name and the duration in seconds."""
+    spot_lines = [
+        (line, REPLAY_DAY) for line in lines 
+        if line.startswith(_spotting.ClusterSpotter.SPOT_PREFIX)]
+    batches = [
+        spot_lines[i:i + POOL_BATCH_SIZE]
+        for i in range(0, len(spot_lines), POOL_BATCH_SIZE)]
+    results = []
+
+    start = time.perf_counter()
+    for line, timestamp in spot_lines:
+        spot = _spotting.ClusterSpotter.parse_line(line, timestamp)
+        if spot:
+            spot.lookup_dxcc_info(dxcc)
+    results.append(("in process", time.perf_counter() - start))
+
+    for workers in worker_counts:
+        pool = _parsing.ParsingPool(dxcc, workers)
+        list(pool.parse_batches(batches[:workers])) # start the workers
+        start = time.perf_counter()
+        for spot in pool.parse_batches(batches):
+            pass
+        results.append(
+            ("{} worker{}".format(workers, "s" if workers > 1 else ""), 
+             time.perf_counter() - start))
+        pool.shutdown()
+    return len(spot_lines), results
+
+def generate_snapshots(count, seed = 4711):
+    """Generate DxSpotSnapshots with TABLE_SOURCES RBN sources each, spread
+    over the bands of IARU region 1."""
+    rnd = random.Random(seed)
+    infos = [
+        _dxcc.DXCCInfo(
+            continent, 0, 0, continent, _location.LatLon(0, 0), 0.0, continent)
+        for continent in _spottable.CONTINENTS]
+    skimmers = [
+        (_callinfo.Call(_random_call(rnd)), rnd.choice(infos)) 
+        for i in range(SKIMMER_COUNT)]
+    snapshots = []
+    for i in range(count):
+        band = rnd.choice(_bandplan.IARU_REGION_1)
+        frequency = rnd.uniform(band.from_kHz, band.to_kHz)
+        call = _callinfo.Call(_random_call(rnd))
+        spot = _spotting.DxSpot(call, frequency, rnd.choice(infos))
+        seen = REPLAY_DAY + rnd.randint(0, 540)
+        for j in range(TABLE_SOURCES):
+            source_call, source_info = rnd.choice(skimmers)
+            source = _spotting.RbnSpot(
+                call, frequency, seen, source_call, None, "CW", 
+                rnd.randint(3, 40), "22", "CQ")
+            source.source_dxcc_info = source_info
+            spot.add_source(source)
+        snapshots.append(spot.snapshot())
+    return snapshots
+
+def compare_spot_tables(sizes = TABLE_SIZES):
+    """Measure filtering, expiry and sorting of the active spots as list
+    comprehensions over the snapshots and as operations on a SpotTable.
+    Returns tuples of the operation, the number of spots and the durations
+    of both variants in seconds."""
+    band = _bandplan.IARU_REGION_1[5]
+    continents = ["EU"]
+    now = REPLAY_DAY + 300
+    by_frequency = lambda spot: spot.frequency
+    results = []
+    for size in sizes:
+        spots = generate_snapshots(size)
+        table = _spottable.SpotTable()
+        for spot in spots:
+            table.update(spot)
+        operations = [
+            ("band", 
+             lambda: [s for s in spots if band.contains(s.frequency)],
+             lambda: table.select(table.in_band(band))),
+            ("continent",
+             lambda: [s for s in spots if _bandmap_filter(s, continents)],
+             lambda: table.select(table.spotted_from(continents))),
+            ("expiry",
+             lambda: [s for s in spots if s.timeout < now],
+             lambda: table.select(table.expired(now))),
+            ("sort",
+             lambda: sorted(spots, key = by_frequency),
+             lambda: table.sorted_by_frequency()),
+            ("bandmap",
+             lambda: sorted(
+                [s for s in spots if _bandmap_filter(s, continents)], 
+                key = by_frequency),
+             lambda: table.sorted_by_frequency(
+                table.spotted_from(continents)))]
+        for name, with_lists, with_table in operations:
+            results.append((
+                name, size, _best_of(with_lists), _best_of(with_table)))
+    return results
+
+def _bandmap_filter(spot, continents):
+    return len([
+        source for source in spot.sources
+        if source.source_dxcc_info 
+            and source.source_dxcc_info.continent in continents]) > 0
+
+def _best_of(func, repeat = TABLE_REPEAT):
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def measure_source_memory(counts = SOURCE_COUNTS, seed = 4711):
+    """Add the given numbers of RBN reports from SKIMMER_COUNT skimmers to
+    one DxSpot each and trace the memory that is retained, including the
+    reports that the DxSpot keeps alive. Returns pairs 
+    of the number of reports and the retained bytes."""
+    rnd = random.Random(seed)
+    skimmers = [
+        _callinfo.Call(_random_call(rnd)) for i in range(SKIMMER_COUNT)]
+    call = _callinfo.Call("AA1BB")
+    results = []
+    for count in counts:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        sources = [
+            _spotting.RbnSpot(
+                call, 7010.0, REPLAY_DAY + i, rnd.choice(skimmers), None, 
+                "CW", rnd.randint(3, 40), "22", "CQ")
+            for i in range(count)]
+        spot = _spotting.DxSpot(call, 7010.0, None)
+        for source in sources:
+            spot.add_source(source)
+        del sources
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        results.append((count, sum(
+            stat.size_diff for stat in after.compare_to(before, "filename"))))
+    return results
+
+def measure_memory(lines, dxcc):
+    """Feed all lines into a SpotAggregator and trace the memory it retains.
+
+    The replay is much faster than real time, so nothing expires, but every
+    DxSpot keeps only a bounded summary of its sources. Returns the retained
+    bytes, the number of active DxSpots and the number of retained 
+    sources."""
+    client = _spotting.FastTextfileClient(None)
+    spotter = _spotting.ClusterSpotter(client, dxcc)
+    aggregator = _spotting.SpotAggregator(dxcc)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for line in lines:
+        spotter._line_received(line, aggregator.spot_received)
+    aggregator.cleanup_spots()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained_bytes = sum(
+        stat.size_diff for stat in after.compare_to(before, "filename"))
+    dx_spots = aggregator.spots.spots()
+    retained_sources = sum(len(dx_spot.sources) for dx_spot in dx_spots)
+    return retained_bytes, len(dx_spots), retained_sources
+
+def print_report(lines, stages):
+    total = sum(stage.total() for stage in stages)
+    aggregate = stages[1]
+    print_header("stage")
+    for stage in stages:
+        print(stage)
+    print("")
+    print("{} lines, {} spots in {:.3f}s".format(
+        len(lines), len(aggregate.durations), total))
+    if total:
+        print("{:.0f} lines/sec, {:.0f} spots/sec".format(
+            len(lines) / total, len(aggregate.durations) / total))
+
+def print_header(title):
+    print("{:<10} {:>8} {:>10} {:>12} {:>10} {:>10}".format(
+        title, "count", "total s", "per sec", "p50 us", "p99 us"))
+
+def print_parser_comparison(parsers):
+    print_header("parser")
+    for parser in parsers:
+        print(parser)
+    legacy, current = parsers
+    if current.total():
+        print("speedup {:.1f}x".format(legacy.total() / current.total()))
+
+def print_pool_comparison(line_count, results):
+    print("{:<10} {:>10} {:>12} {:>10}".format(
+        "parsing", "total s", "lines/sec", "speedup"))
+    baseline = results[0][1]
+    for name, duration in results:
+        print("{:<10} {:>10.3f} {:>12.0f} {:>9.1f}x".format(
+            name, duration, line_count / duration if duration else 0.0,
+            baseline / duration if duration else 0.0))
+
+def print_table_comparison(results):
+    print("{:<10} {:>8} {:>10} {:>10} {:>10}".format(
+        "operation", "spots", "lists ms", "table ms", "speedup"))
+    for name, size, with_lists, with_table in results:
+        print("{:<10} {:>8} {:>10.2f} {:>10.2f} {:>9.1f}x".format(
+            name, size, with_lists * 1e3, with_table * 1e3, 
+            with_lists / with_table if with_table else 0.0))
+
+def print_source_memory(results):
+    for count, retained_bytes in results:
+        print("{:>5} reports of one DX station retained in {:.1f} KiB".format(
+            count, retained_bytes / 2**10))
+
+def print_dxcc_comparison(call_count, legacy, current, differences):
+    print("{:<10} {:>10} {:>12}".format("lookup", "total s", "calls/sec"))
+    for name, duration in [("legacy", legacy), ("trie", current)]:
+        print("{:<10} {:>10.3f} {:>12.0f}".format(
+            name, duration, call_count / duration if duration else 0.0))
+    if current:
+        print("speedup {:.1f}x, {} calls resolved differently".format(
+            legacy / current, differences))
+
+def print_memory(
+        retained_bytes, dx_spots, retained_sources, baseline_bytes = None):
+    print("{} spots with {} sources retained in {:.1f} MiB".format(
+        dx_spots, retained_sources, retained_bytes / 2**20))
+    if baseline_bytes:
+        print("{:+.1f} MiB against the baseline of {:.1f} MiB".format(
+            (retained_bytes - baseline_bytes) / 2**20, baseline_bytes / 2**20))
+    print("{:.0f} bytes/spot, {:.0f} bytes/source".format(
+        retained_bytes / dx_spots if dx_spots else 0,
+        retained_bytes / retained_sources if retained_sources else 0))
+
+
+def main(args):
+    if len(args) > 1:
+        lines = load_lines(args[1])
+        baseline = None
+    else:
+        lines = generate_rbn_lines()
+        baseline = SYNTHETIC_BASELINE
+    cleanup_interval = (int(args[2])
+                        if len(args) > 2
+                        else DEFAULT_CLEANUP_INTERVAL)
+
+    dxcc = load_dxcc()
+    stages = replay(lines, dxcc, cleanup_interval)
+    print_report(lines, stages)
+    print("")
+    print_parser_comparison(compare_parsers(lines))
+    print("")
+    print_pool_comparison(*compare_pool_sizes(lines, dxcc))
+    print("")
+    print_table_comparison(compare_spot_tables())
+    print("")
+    calls = generate_calls()
+    lookup_dxcc = dxcc if dxcc.infos_by_prefix else generate_dxcc()
+    print_dxcc_comparison(
+        len(calls), *compare_dxcc_lookups(lookup_dxcc, calls))
+    print("")
+    print_memory(*measure_memory(lines, dxcc), baseline_bytes = baseline)
+    print_source_memory(measure_source_memory())
+
+if __name__ == "__main__": main(sys.argv)
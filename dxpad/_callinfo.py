@@ -4,6 +4,7 @@
 import sys
 import re
 import time
+import functools
 
 from . import _time
 
@@ -12,26 +13,65 @@ QSL_DIRECT = "direkt"
 QSL_LOTW = "LotW"
 QSL_EQSL = "eQSL"
 
+CALL_CACHE_SIZE = 16384
+
 CALL_EXPRESSION = re.compile(r'\b(([A-Z0-9]+)/)?([A-Z0-9]?[A-Z][0-9][A-Z0-9]*[A-Z])(/([A-Z0-9]+))?(/(P|A|M|MM|AM))?\b', re.IGNORECASE)
+# a whole call, which may end with further qualifiers that are not calls 
+# themselves, like DL2ABC/P/QRP; they are ignored like in Call(raw_text)
+PARSE_EXPRESSION = re.compile(
+    CALL_EXPRESSION.pattern + r'(?:/(?:[A-Z]+|[0-9]+))*', re.IGNORECASE)
 
 class Call:
-    def __init__(self, raw_text):
-        if not Call.is_valid_call(raw_text): 
-            raise ValueError("{} is not a valid call.".format(raw_text))
-        
-        match = CALL_EXPRESSION.match(raw_text)
-        if not(match):
-            print("Cannot find call: " + raw_text)
-        self.prefix = match.group(2).upper() if match and match.start(2) > -1 else None
-        self.base_call = match.group(3).upper()
-        self.suffix = match.group(5).upper() if match and match.start(5) > -1 else None
-        self.working_condition = (match.group(7).upper() 
-                                  if match.start(7) > -1 
-                                  else None)
-        if (self.suffix in ["P", "A", "M", "MM", "AM"] 
-                and not self.working_condition):
-            self.working_condition = self.suffix
-            self.suffix = None
+    """A call sign, split into prefix, base call, suffix and working condition.
+
+    Calls are immutable and interned: Call(raw_text) returns the same 
+    instance for the same text as long as it is in the LRU cache, so the
+    validation and parsing run only once for the calls that repeat in the 
+    spots."""
+    __slots__ = (
+        "prefix", "base_call", "suffix", "working_condition", "_key", "_hash")
+
+    def __new__(cls, raw_text):
+        return _intern_call(raw_text)
+
+    @staticmethod
+    def parse(raw_text):
+        """Return the Call if raw_text is exactly one call, otherwise None.
+        Qualifiers behind the working condition are ignored.
+
+        This needs only one anchored match, the groups are reused directly."""
+        return _parse_call(raw_text)
+
+    @staticmethod
+    def _from_match(match):
+        call = object.__new__(Call)
+        prefix = match.group(2).upper() if match.start(2) > -1 else None
+        base_call = match.group(3).upper()
+        suffix = match.group(5).upper() if match.start(5) > -1 else None
+        working_condition = (match.group(7).upper() 
+                             if match.start(7) > -1 
+                             else None)
+        if (suffix in ["P", "A", "M", "MM", "AM"] 
+                and not working_condition):
+            working_condition = suffix
+            suffix = None
+        key = (prefix, base_call, suffix, working_condition)
+        object.__setattr__(call, "prefix", prefix)
+        object.__setattr__(call, "base_call", base_call)
+        object.__setattr__(call, "suffix", suffix)
+        object.__setattr__(call, "working_condition", working_condition)
+        object.__setattr__(call, "_key", key)
+        object.__setattr__(call, "_hash", hash(key))
+        return call
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Call is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Call is immutable")
+
+    def __reduce__(self):
+        return (Call, (str(self),))
 
     def __repr__(self):
         return "Call(\"{}\")".format(str(self))
@@ -45,14 +85,16 @@ class Call:
         return result
 
     def __hash__(self):
-        return hash(
-            (self.prefix, self.base_call, self.suffix, self.working_condition))
+        return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if self is other: return True
+        if not isinstance(other, Call): return NotImplemented
+        return self._key == other._key
 
     def __ne__(self, other):
-        return hash(self) != hash(other)
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
 
     @staticmethod
     def is_valid_call(call):
@@ -63,6 +105,20 @@ class Call:
         matches = CALL_EXPRESSION.finditer(text)
         return list(map(map_func, matches))
 
+@functools.lru_cache(maxsize = CALL_CACHE_SIZE)
+def _intern_call(raw_text):
+    if not Call.is_valid_call(raw_text): 
+        raise ValueError("{} is not a valid call.".format(raw_text))
+    match = CALL_EXPRESSION.match(raw_text)
+    if not match:
+        raise ValueError("Cannot find call: {}".format(raw_text))
+    return Call._from_match(match)
+
+@functools.lru_cache(maxsize = CALL_CACHE_SIZE)
+def _parse_call(raw_text):
+    match = PARSE_EXPRESSION.fullmatch(raw_text)
+    return Call._from_match(match) if match else None
+
 class Info:
     def __init__(self, call):
         self.call = call
@@ -0,0 +1,126 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Filter commands for the cluster nodes, so that they only send the spots
+that dxpad shows anyway: the spots within the bandplan that were spotted
+from the selected continents.
+
+Every node software has its own filter syntax. A profile is a list of
+command templates, which are filled in from the bandplan and the spotter
+continents:
+
+    {continents}        EU,NA
+    {cq_zones}          the CQ zones of the continents (DX Spider has no
+                        continent filter), 1,2,3,...
+    {freq_ranges}       1810/2000,3500/3800,...
+    {ar_continents}     spottercont=EU or spottercont=NA
+    {ar_bands}          band=160 or band=80 or ...
+
+The profile of a cluster is configured with its "filter" value: the name
+of a profile, "auto" to detect the software from the greeting of the node,
+or "none" (the default) to send no commands at all.
+
+The nodes store the filters per user, so the commands replace the filters
+that were set up on the node before, also for other clients that log in
+with the same call. This is why the filter is opt-in.
+"""
+
+import re
+
+from . import _bandplan
+
+AUTO = "auto"
+NONE = "none"
+
+PROFILES = {
+    "dxspider": [
+        "clear/spots all",
+        "accept/spots on {freq_ranges} and by_zone {cq_zones}"
+    ],
+    "arcluster": [
+        "set dx filter ({ar_continents}) and ({ar_bands})"
+    ],
+    "cccluster": [
+        "set/nofilter",
+        "set/filter doc/pass {continents}"
+    ],
+    "rbn": [
+        "set/skimmer",
+        "set/nofilter",
+        "set/filter doc/pass {continents}"
+    ]
+}
+
+# checked in this order against the greeting, the first match wins; the
+# RBN runs its own telnet server, but also AR-Cluster nodes
+SOFTWARE_PATTERNS = [
+    ("dxspider", re.compile(r"dx ?spider", re.IGNORECASE)),
+    ("arcluster", re.compile(r"ar-?cluster", re.IGNORECASE)),
+    ("cccluster", re.compile(r"cc[- ]?cluster|\bCCC\b", re.IGNORECASE)),
+    ("rbn", re.compile(r"reverse ?beacon|\bRBN\b", re.IGNORECASE))
+]
+
+CQ_ZONES = {
+    "NA": list(range(1, 9)),
+    "SA": list(range(9, 14)),
+    "EU": [14, 15, 16, 20, 40],
+    "AS": [17, 18, 19] + list(range(21, 27)),
+    "OC": list(range(27, 33)),
+    "AF": list(range(33, 40)),
+    "AN": []
+}
+
+
+def detect_software(greeting):
+    """Return the name of the profile for the node software that is
+    mentioned in the given greeting, or None."""
+    for software, pattern in SOFTWARE_PATTERNS:
+        if pattern.search(greeting):
+            return software
+    return None
+
+def is_login_prompt(text, call):
+    """Whether the given text is the command prompt of a node after the
+    login with the call, e.g. "DL1ABC de GB7DJK 16-Oct-2026 1200Z >"."""
+    return re.match(
+        r"\s*{} de \S+.*>\s*$".format(re.escape(str(call))), text,
+        re.IGNORECASE) is not None
+
+
+class ClusterFilter:
+    """Renders the filter commands of a profile from the bandplan and the
+    continents of the spotters."""
+    def __init__(
+            self, continents, bandplan = _bandplan.IARU_REGION_1,
+            profiles = PROFILES):
+        self.continents = continents
+        self.bandplan = bandplan
+        self.profiles = profiles
+
+    def values(self):
+        band_numbers = [band.name.rstrip("m") for band in self.bandplan]
+        cq_zones = sorted(
+            zone
+            for continent in self.continents
+            for zone in CQ_ZONES.get(continent, []))
+        return {
+            "continents": ",".join(self.continents),
+            "cq_zones": ",".join(str(zone) for zone in cq_zones),
+            "freq_ranges": ",".join(
+                "{:g}/{:g}".format(band.from_kHz, band.to_kHz)
+                for band in self.bandplan),
+            "ar_continents": " or ".join(
+                "spottercont={}".format(continent)
+                for continent in self.continents),
+            "ar_bands": " or ".join(
+                "band={}".format(number) for number in band_numbers)
+        }
+
+    def commands(self, software):
+        """Return the filter commands for the given software, or an empty
+        list if there is no profile for it or no continent is selected."""
+        templates = self.profiles.get(software)
+        if not (templates and self.continents): return []
+        values = self.values()
+        return [template.format(**values) for template in templates]
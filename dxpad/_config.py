@@ -6,7 +6,7 @@ import os
 
 from PySide import QtCore
 
-from . import _grid, _callinfo
+from . import _grid, _callinfo, _clusterfilter
 
 DEFAULT_CALL = "dl0aaa"
 DEFAULT_LOCATOR = "JO51aa"
@@ -36,10 +36,13 @@ class Account:
             self.password = None
 
 class Cluster(Account):
-    def __init__(self, host, port, user, password = None):
+    def __init__(
+            self, host, port, user, password = None, 
+            filter_profile = _clusterfilter.NONE):
         Account.__init__(self, user, password)
         self.host = host
         self.port = int(port)
+        self.filter_profile = filter_profile
 
 class WSJTX:
     def __init__(
@@ -60,6 +63,8 @@ class Config:
         self.locator = _grid.Locator(
             self.settings.value("locator", DEFAULT_LOCATOR))
         self.clusters = self.get_clusters()
+        self.parsing_workers = int(self.settings.value("parsing_workers", 0))
+        self.spotter_continents = self.get_spotter_continents()
         self.hamqth = self.get_account("hamqth")
         self.qrz = self.get_account("qrz")
         self.wsjtx = self.get_wsjtx()
@@ -73,10 +78,24 @@ class Config:
             port = int(self.settings.value("port", 7000))
             user = self.settings.value("user", self.call)
             password = self.settings.value("password", None)
-            clusters.append(Cluster(host, port, user, password))
+            # opt-in, the filter commands replace the filters of the user
+            # on the node
+            filter_profile = self.settings.value(
+                "filter", _clusterfilter.NONE)
+            clusters.append(
+                Cluster(host, port, user, password, filter_profile))
         self.settings.endArray()
         return clusters
 
+    def get_spotter_continents(self):
+        continents = self.settings.value("spotter_continents", [])
+        if isinstance(continents, str): # QSettings splits "EU,NA" itself
+            continents = continents.split(",")
+        return [
+            continent.strip().upper() 
+            for continent in continents 
+            if continent.strip()]
+
     def get_account(self, name):
         self.settings.beginGroup(name)
         user = self.settings.value("user", self.call)
@@ -116,6 +135,7 @@ class Config:
             self.settings.setValue("user", cluster.user)
             if cluster.password:
                 self.settings.setValue("password", cluster.password)
+            self.settings.setValue("filter", cluster.filter_profile)
         self.settings.endArray()
         self.settings.beginGroup("hamqth")
         self.settings.setValue("user", self.hamqth.user)
@@ -0,0 +1,461 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run the spotting pipeline without a GUI and publish the aggregated spots
+over a local socket.
+
+The daemon follows the clusters, PSK Reporter and WSJT-X, aggregates the
+spots and sends every SpotDelta to all attached clients. A client that
+attaches first gets all active spots, so a GUI that is started with
+--attach shows the current state at once and does not open connections of
+its own.
+
+The address is either the path of a Unix socket (by default
+~/.config/dxpad/daemon.sock) or host:port for TCP.
+
+Every frame starts with its length and kind (<IB), followed by the payload:
+
+    FULL, UPDATE    the counts of added, changed and expired spots (<III),
+                    the added and changed snapshots, the ids of the expired
+                    spots (<Q each). A FULL frame replaces all spots.
+    DX_CALL         the call that is selected in WSJT-X (UTF-8)
+
+A snapshot is packed as <QddddIIffB (id, frequency, timeout, first seen,
+last seen, source count, spotter count, best SNR, average SNR, spotter 
+continents),
+followed by the call, the spotters and modes (each with a count), and the
+recent sources as journal records (see _journal). Strings have a one byte
+length. The DXCC infos are not sent, the client looks them up itself.
+
+usage: python3 -m dxpad._daemon [address]
+"""
+
+import sys
+import os
+import math
+import signal
+import struct
+import asyncio
+
+from PySide import QtCore
+
+from . import _spotting, _spottable, _journal, _pskreporter, _wsjtx, _dxcc, \
+              _config, _callinfo, _parsing, _propagation, _clusterfilter
+
+DAEMON_SOCKET = "daemon.sock"
+MAX_FRAME_SIZE = 64 * 2**20 # bytes
+MAX_CLIENT_BUFFER = 4 * 2**20 # bytes
+RECONNECT_DELAY = 5 # seconds
+
+FULL = 1
+UPDATE = 2
+DX_CALL = 3
+
+_header = struct.Struct("<IB")
+_counts = struct.Struct("<III")
+_snapshot = struct.Struct("<QddddIIffB")
+_id = struct.Struct("<Q")
+_count = struct.Struct("<H")
+ENCODING = "utf-8"
+
+
+def default_address():
+    return _config.filename(DAEMON_SOCKET)
+
+def tcp_address(address):
+    """Return host and port if the given address is host:port, else None."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return None
+
+async def start_server(address, client_connected):
+    tcp = tcp_address(address)
+    if tcp:
+        return await asyncio.start_server(client_connected, *tcp)
+    if os.path.exists(address):
+        os.remove(address)
+    return await asyncio.start_unix_server(client_connected, address)
+
+async def open_connection(address):
+    tcp = tcp_address(address)
+    if tcp:
+        return await asyncio.open_connection(*tcp)
+    return await asyncio.open_unix_connection(address)
+
+
+def _encode_string(text):
+    data = str(text).encode(ENCODING)[:255]
+    return bytes([len(data)]) + data
+
+def _decode_string(data, offset):
+    length = data[offset]
+    offset += 1
+    return bytes(data[offset:offset + length]).decode(ENCODING), offset + length
+
+def _snr(value):
+    return value if value is not None else math.nan
+
+def _optional_snr(value):
+    return None if math.isnan(value) else value
+
+def encode_snapshot(snapshot):
+    return b"".join([
+        _snapshot.pack(
+            snapshot.id, snapshot.frequency, snapshot.timeout,
+            snapshot.first_seen, snapshot.last_seen, snapshot.source_count,
+            snapshot.spotter_count, _snr(snapshot.best_snr), _snr(snapshot.average_snr),
+            snapshot.spotter_continents),
+        _encode_string(snapshot.call),
+        _count.pack(len(snapshot.spotters)),
+        b"".join(_encode_string(spotter) for spotter in snapshot.spotters),
+        bytes([len(snapshot.modes)]),
+        b"".join(_encode_string(mode) for mode in snapshot.modes),
+        bytes([len(snapshot.sources)]),
+        b"".join(_journal.encode_spot(source) for source in snapshot.sources)])
+
+def decode_snapshot(data, offset = 0, dxcc = None):
+    """Decode the snapshot at the given offset. Returns the snapshot and the
+    offset after it."""
+    id, frequency, timeout, first_seen, last_seen, source_count, \
+        spotter_count, best_snr, average_snr, spotter_continents = \
+        _snapshot.unpack_from(data, offset)
+    offset += _snapshot.size
+    call, offset = _decode_string(data, offset)
+    count, = _count.unpack_from(data, offset)
+    offset += _count.size
+    spotters = []
+    for i in range(count):
+        spotter, offset = _decode_string(data, offset)
+        spotters.append(spotter)
+    count = data[offset]
+    offset += 1
+    modes = []
+    for i in range(count):
+        mode, offset = _decode_string(data, offset)
+        modes.append(sys.intern(mode))
+    count = data[offset]
+    offset += 1
+    sources = []
+    for i in range(count):
+        source, offset = _journal.decode_spot(data, offset)
+        if dxcc:
+            source.lookup_dxcc_info(dxcc)
+        sources.append(source)
+
+    call = _callinfo.Call(call)
+    snapshot = _spotting.DxSpotSnapshot(
+        id, call, frequency, dxcc.find_dxcc_info(call) if dxcc else None,
+        tuple(sources), source_count, tuple(spotters), spotter_count,
+        _optional_snr(best_snr), _optional_snr(average_snr),
+        spotter_continents, tuple(modes), timeout, first_seen, last_seen)
+    return snapshot, offset
+
+def encode_frame(kind, payload):
+    return _header.pack(len(payload), kind) + payload
+
+def encode_update(kind, added, changed, expired_ids):
+    """Encode a FULL or UPDATE frame from the encoded added and changed
+    snapshots and the ids of the expired spots."""
+    return encode_frame(kind, b"".join(
+        [_counts.pack(len(added), len(changed), len(expired_ids))]
+        + added + changed
+        + [_id.pack(spot_id) for spot_id in expired_ids]))
+
+def decode_update(payload, dxcc = None):
+    """Decode the payload of a FULL or UPDATE frame. Returns the added and
+    changed snapshots and the ids of the expired spots."""
+    added_count, changed_count, expired_count = _counts.unpack_from(payload)
+    offset = _counts.size
+    snapshots = []
+    for i in range(added_count + changed_count):
+        snapshot, offset = decode_snapshot(payload, offset, dxcc)
+        snapshots.append(snapshot)
+    expired_ids = [
+        _id.unpack_from(payload, offset + i * _id.size)[0]
+        for i in range(expired_count)]
+    return snapshots[:added_count], snapshots[added_count:], expired_ids
+
+async def read_frame(reader):
+    """Read the next frame. Returns its kind and payload, or None when the
+    connection is closed."""
+    try:
+        header = await reader.readexactly(_header.size)
+        length, kind = _header.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise ValueError("frame of {} bytes is too large".format(length))
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return kind, payload
+
+
+class SpotPublisher:
+    """Sends the spot deltas to all attached clients, driven by an asyncio
+    event loop. Every delta is encoded once, the encoded snapshots of the
+    active spots are kept for the clients that attach later. Clients that
+    do not keep up are disconnected."""
+    def __init__(self):
+        self.encoded_spots = {}
+        self.dx_call = None
+        self.writers = set()
+        self.server = None
+
+    async def start(self, address):
+        self.server = await start_server(address, self._client_connected)
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        self.writers.clear()
+
+    def publish(self, delta):
+        added = self._encode(delta.added)
+        changed = self._encode(delta.changed)
+        expired_ids = [spot.id for spot in delta.expired]
+        for spot_id in expired_ids:
+            self.encoded_spots.pop(spot_id, None)
+        self._broadcast(encode_update(UPDATE, added, changed, expired_ids))
+
+    def _encode(self, snapshots):
+        encoded = []
+        for snapshot in snapshots:
+            data = encode_snapshot(snapshot)
+            self.encoded_spots[snapshot.id] = data
+            encoded.append(data)
+        return encoded
+
+    def publish_dx_call(self, call):
+        self.dx_call = str(call) if call else ""
+        self._broadcast(
+            encode_frame(DX_CALL, self.dx_call.encode(ENCODING)))
+
+    def _broadcast(self, frame):
+        for writer in list(self.writers):
+            self._send(writer, frame)
+
+    def _send(self, writer, frame):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.writers.discard(writer)
+            writer.close()
+            return
+        writer.write(frame)
+
+    async def _client_connected(self, reader, writer):
+        writer.write(encode_update(
+            FULL, list(self.encoded_spots.values()), [], []))
+        if self.dx_call:
+            writer.write(encode_frame(
+                DX_CALL, self.dx_call.encode(ENCODING)))
+        self.writers.add(writer)
+        try:
+            await reader.read() # the clients send nothing, wait for EOF
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class SpotSubscriber:
+    """Receives the frames of a SpotPublisher and turns them into
+    SpotDeltas with a SpotTable of their own."""
+    def __init__(self, dxcc = None):
+        self.dxcc = dxcc
+        self.snapshots = {}
+        self.table = _spottable.SpotTable()
+        self.writer = None
+
+    async def run(self, address, delta_callback, dx_call_callback):
+        """Receive the frames until the connection is closed."""
+        reader, self.writer = await open_connection(address)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if not frame: return
+                kind, payload = frame
+                if kind == DX_CALL:
+                    call = payload.decode(ENCODING)
+                    dx_call_callback(_callinfo.Call(call) if call else None)
+                elif kind in (FULL, UPDATE):
+                    delta_callback(self.apply(kind, payload))
+        finally:
+            self.writer.close()
+
+    def apply(self, kind, payload):
+        """Apply the payload of a FULL or UPDATE frame and return the
+        resulting SpotDelta."""
+        added, changed, expired_ids = decode_update(payload, self.dxcc)
+        if kind == FULL:
+            expired = list(self.snapshots.values())
+            self.snapshots = {}
+            self.table = _spottable.SpotTable()
+        else:
+            expired = [self.snapshots.pop(spot_id) for spot_id in expired_ids
+                       if spot_id in self.snapshots]
+        for snapshot in expired:
+            self.table.remove(snapshot.id)
+        for snapshot in added + changed:
+            self.snapshots[snapshot.id] = snapshot
+            self.table.update(snapshot)
+        return _spotting.SpotDelta(added, changed, expired, self.table.copy())
+
+    def stop(self):
+        if self.writer:
+            self.writer.close()
+
+
+class SpotServer(QtCore.QThread):
+    """Runs a SpotPublisher in its own thread with its own asyncio event
+    loop."""
+    def __init__(self, address = None, parent = None):
+        QtCore.QThread.__init__(self, parent)
+        self.address = address if address else default_address()
+        self.publisher = SpotPublisher()
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        try:
+            self.loop.run_until_complete(self.publisher.start(self.address))
+            self.loop.run_forever()
+            self.publisher.close()
+        finally:
+            self.loop.close()
+
+    @QtCore.Slot(object)
+    def publish_delta(self, delta):
+        self._call_soon(self.publisher.publish, delta)
+
+    @QtCore.Slot(object)
+    def publish_dx_call(self, call):
+        self._call_soon(self.publisher.publish_dx_call, call)
+
+    @QtCore.Slot()
+    def stop(self):
+        self._call_soon(self.loop.stop)
+
+    def _call_soon(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass # the loop is already closed
+
+
+class DaemonClient(QtCore.QThread):
+    """Attaches to a running daemon and emits its spot deltas like a
+    SpotAggregator. Reconnects after RECONNECT_DELAY when the connection
+    is lost."""
+    spots_changed = QtCore.Signal(object)
+    dx_call_updated = QtCore.Signal(object)
+
+    def __init__(self, dxcc = None, address = None, parent = None):
+        QtCore.QThread.__init__(self, parent)
+        self.address = address if address else default_address()
+        self.subscriber = SpotSubscriber(dxcc)
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.stopped = False
+
+    def run(self):
+        try:
+            if self.stopped: return
+            self.task = self.loop.create_task(self._run())
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def _run(self):
+        while not self.stopped:
+            try:
+                await self.subscriber.run(
+                    self.address, self.spots_changed.emit,
+                    self.dx_call_updated.emit)
+            except OSError as e:
+                print("Daemon at {} not available: {}".format(
+                    self.address, e))
+            if not self.stopped:
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    @QtCore.Slot()
+    def stop(self):
+        self.stopped = True
+        try:
+            self.loop.call_soon_threadsafe(self._stop)
+        except RuntimeError:
+            pass # the loop is already closed
+
+    def _stop(self):
+        self.subscriber.stop()
+        if self.task:
+            self.task.cancel()
+
+
+def main(args):
+    app = QtCore.QCoreApplication(args)
+    address = args[1] if len(args) > 1 else None
+
+    config = _config.load_config()
+    dxcc = _dxcc.DXCC()
+    dxcc.load()
+    journal = _journal.Journal()
+    statistics = _propagation.PropagationStatistics()
+    aggregator = _spotting.SpotAggregator(
+        dxcc, journal, statistics = statistics)
+    aggregator.restore_spots(journal.recent_spots())
+    aggregation_thread = _spotting.AggregationThread(aggregator)
+    pskreporter = _pskreporter.PskReporter(
+        config.call, config.locator, dxcc)
+    wsjtx_config = config.get_wsjtx()
+    wsjtx = _wsjtx.WSJTX(
+        wsjtx_config.listen_host, wsjtx_config.listen_port,
+        wsjtx_config.repeater, wsjtx_config.repeater_host,
+        wsjtx_config.repeater_port)
+    server = SpotServer(address)
+
+    aggregator.spots_changed.connect(server.publish_delta)
+    pskreporter.spots_received.connect(aggregator.spots_received)
+    wsjtx.status.dx_call_updated.connect(server.publish_dx_call)
+    wsjtx.status.dx_call_updated.connect(pskreporter.set_dx_call)
+
+    signal.signal(signal.SIGINT, lambda *args: app.quit())
+    signal.signal(signal.SIGTERM, lambda *args: app.quit())
+    interrupt_timer = QtCore.QTimer()
+    interrupt_timer.timeout.connect(lambda: None) # let Python handle signals
+    interrupt_timer.start(500)
+
+    server.start()
+    aggregation_thread.start()
+    parsing_pool = (_parsing.ParsingPool(dxcc, config.parsing_workers)
+                    if config.parsing_workers
+                    else None)
+    cluster_filter = _clusterfilter.ClusterFilter(
+        config.spotter_continents 
+        or [dxcc.find_dxcc_info(config.call).continent])
+    aggregator.start_spotting(
+        config.clusters, None, None, parsing_pool, cluster_filter)
+    pskreporter.start()
+    wsjtx.start()
+    print("Publishing spots at {}".format(server.address))
+
+    result = app.exec_()
+
+    aggregator.stop_spotting()
+    aggregation_thread.stop()
+    aggregation_thread.wait()
+    if parsing_pool:
+        parsing_pool.shutdown()
+    server.stop()
+    server.wait()
+    journal.close()
+    statistics.close()
+    pskreporter.stop()
+    wsjtx.stop()
+
+    sys.exit(result)
+
+if __name__ == "__main__": main(sys.argv)
@@ -36,6 +36,13 @@ The following special characters can be applied after an alias prefix:
 
 For detailed information about handling of prefixes and suffixes see 
 http://www.cqwpx.com/rules.htm and http://svn.fkurz.net/dxcc/trunk/dxcc?view=markup
+
+For the lookups, the prefixes are compiled into a trie, which finds the 
+longest matching prefix of a call in one pass over its characters. The 
+calls that need an exact match are kept in a separate dict. Portable calls
+are resolved by their parts (see _callinfo.Call): DL/G4ABC by the prefix
+DL, G4ABC/P by the base call and K1ABC/KH6 by the suffix KH6. Maritime and 
+aeronautical mobile stations (/MM, /AM) are in no DXCC entity.
 """
 
 import sys
@@ -43,7 +50,10 @@ import os
 import re
 import requests
 
-from . import _location, _config
+from . import _location, _config, _callinfo
+
+NO_ENTITY_CONDITIONS = ["MM", "AM"]
+IGNORED_SUFFIXES = ["QRP", "LH", "LGT"]
 
 class DXCCInfo:
     def __init__(
@@ -77,9 +87,46 @@ class DXCCInfo:
                 self.latlon, self.time_offset, self.primary_prefix, 
                 self.needs_exact_match))
 
+class PrefixTrie:
+    """A trie of the prefixes in infos_by_prefix. Every node is a dict of 
+    the next characters, the key "" holds the prefix that ends there."""
+    def __init__(self, prefixes):
+        self.root = {}
+        for prefix in prefixes:
+            node = self.root
+            for c in prefix:
+                node = node.setdefault(c, {})
+            node[""] = prefix
+
+    def longest_prefix(self, text):
+        """Return the longest prefix of text in this trie, or None."""
+        node = self.root
+        result = None
+        for c in text:
+            node = node.get(c)
+            if node is None: break
+            result = node.get("", result)
+        return result
+
+
+class CompiledPrefixes:
+    """The lookup structures of one infos_by_prefix dict."""
+    def __init__(self, infos_by_prefix):
+        self.infos_by_prefix = infos_by_prefix
+        self.exact_calls = {
+            prefix 
+            for prefix, info in infos_by_prefix.items() 
+            if info.needs_exact_match}
+        self.trie = PrefixTrie(
+            prefix
+            for prefix, info in infos_by_prefix.items()
+            if not info.needs_exact_match)
+
+
 class DXCC:
     def __init__(self):
         self.infos_by_prefix = {}
+        self.compiled = CompiledPrefixes(self.infos_by_prefix)
 
     def _parse_dxcc_info(self, line):
         fields = line.split(":")
@@ -158,6 +205,7 @@ class DXCC:
                         next_country = True
 
         self.infos_by_prefix = infos_by_prefix
+        self.compiled = CompiledPrefixes(infos_by_prefix)
 
     @staticmethod
     def download_cty_file():
@@ -173,20 +221,52 @@ class DXCC:
         self.load_from_file(filename)
 
     def find_dxcc_info(self, call):
-        prefix = str(call).upper()
-        is_exact_match = True
-        while len(prefix) > 0:
-            if prefix in self.infos_by_prefix:
-                dxcc_info = self.infos_by_prefix[prefix]
-                if dxcc_info.needs_exact_match and not is_exact_match:
-                    dxcc_info = None
-                else:
-                    return dxcc_info
+        """Find the DXCC info for the given call. 
+
+        This is safe to call from several threads, the compiled prefixes are
+        only read here and load_from_file replaces them as a whole."""
+        compiled = self._compiled()
+        prefix = self._find_prefix(compiled, call)
+        return compiled.infos_by_prefix[prefix] if prefix else None
+
+    def _compiled(self):
+        """Return the compiled lookup structures, compile them again if 
+        infos_by_prefix was replaced."""
+        compiled = self.compiled
+        if compiled.infos_by_prefix is not self.infos_by_prefix:
+            compiled = CompiledPrefixes(self.infos_by_prefix)
+            self.compiled = compiled
+        return compiled
+
+    def find_dxcc_prefix(self, call):
+        """Find the key of the DXCC info for the given call in 
+        infos_by_prefix. The call is either a _callinfo.Call or text."""
+        return self._find_prefix(self._compiled(), call)
+
+    def _find_prefix(self, compiled, call):
+        if not isinstance(call, _callinfo.Call):
+            text = str(call).upper()
+            parsed = _callinfo.Call.parse(text)
+            if not parsed:
+                if text in compiled.exact_calls: return text
+                return compiled.trie.longest_prefix(text)
+            call = parsed
 
-            prefix = prefix[:-1]
-            is_exact_match = False
+        if call.prefix or call.suffix or call.working_condition:
+            text = str(call)
+            if text in compiled.exact_calls: return text
+            if call.working_condition in NO_ENTITY_CONDITIONS: return None
+            if call.prefix:
+                return compiled.trie.longest_prefix(call.prefix)
+            if (call.suffix 
+                    and len(call.suffix) > 1 
+                    and call.suffix not in IGNORED_SUFFIXES):
+                prefix = compiled.trie.longest_prefix(call.suffix)
+                if prefix: return prefix
 
-        return None
+        base_call = call.base_call
+        if base_call in compiled.exact_calls: return base_call
+        return compiled.trie.longest_prefix(base_call)
 
 def main(args):
     dxcc = DXCC()
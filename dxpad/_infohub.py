@@ -89,13 +89,13 @@ class Infohub(QtCore.QObject):
             self.locator_changed.emit(_grid.Locator.from_lat_lon(info.latlon))
 
     @QtCore.Slot(object)
-    def calls_seen(self, spots):
-        for spot in spots:
+    def calls_seen(self, delta):
+        for spot in delta.added + delta.changed:
             if spot.call in self:
                 existing_info = self[spot.call]
                 existing_info.last_seen = spot.last_seen
                 existing_info.last_seen_frequency = spot.frequency
-                existing_info.spot_sources = len(spot.sources)
+                existing_info.spot_sources = spot.source_count
                 existing_info.touch()
                 self.info_changed.emit(spot.call, existing_info)
 
@@ -0,0 +1,351 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+An append-only binary journal of the received spots.
+
+The spots are written into one file per UTC day (spots-YYYYMMDD.journal).
+Every record starts with its length, followed by a fixed part and the
+strings, each with a one byte length:
+
+    length      H   size of the record without this field
+    time        d   seconds since the epoch
+    frequency   d   kHz
+    snr         f   dB, 0 if unknown
+    ttl         H   seconds
+    type        B   index into SPOT_TYPES
+    strings     call, source call, source grid, mode, speed, text (comment
+                of cluster spots, type of RBN spots)
+
+Next to every journal file an index file (spots-YYYYMMDD.index) holds the
+offset of the first record of every minute as pairs of (minute of the day,
+offset), packed as <HI. The index follows the order in which the records
+were written, spots that arrive late (PSK Reporter reports are up to ten
+minutes old) are found in the minute in which they were written.
+
+usage: python3 -m dxpad._journal [journal directory] [minutes]
+"""
+
+import sys
+import os
+import time
+import struct
+import mmap
+import bisect
+import calendar
+
+from . import _spotting, _pskreporter, _callinfo, _grid, _config
+
+JOURNAL_DIRECTORY = "journal"
+WARM_RESTART_WINDOW = _pskreporter.PskReporterSpot.TTL # seconds
+
+SPOT_TYPES = [
+    _spotting.Spot,
+    _spotting.ClusterSpot,
+    _spotting.RbnSpot,
+    _pskreporter.PskReporterSpot
+]
+
+_length = struct.Struct("<H")
+_record = struct.Struct("<ddfHB")
+_index_entry = struct.Struct("<HI")
+ENCODING = "latin_1"
+MAX_STRING_LENGTH = 255
+
+
+def journal_filename(directory, day):
+    return os.path.join(directory, "spots-{}.journal".format(day))
+
+def index_filename(directory, day):
+    return os.path.join(directory, "spots-{}.index".format(day))
+
+def day_of(timestamp):
+    return time.strftime("%Y%m%d", time.gmtime(timestamp))
+
+def start_of_day(day):
+    return calendar.timegm(time.strptime(day, "%Y%m%d"))
+
+def minute_of_day(timestamp):
+    return int(timestamp % 86400) // 60
+
+
+class TornRecord(ValueError):
+    """The length of a record does not match the data, e.g. because the
+    process died while the record was written. The records behind it cannot
+    be found."""
+
+
+def _encode_string(text):
+    if not text: return b"\x00"
+    data = str(text).encode(ENCODING, "replace")[:MAX_STRING_LENGTH]
+    return bytes([len(data)]) + data
+
+def encode_spot(spot):
+    """Encode the given spot as one record, including its length."""
+    spot_type = SPOT_TYPES.index(type(spot))
+    strings = [
+        spot.call, spot.source_call, spot.source_grid,
+        getattr(spot, "mode", None),
+        getattr(spot, "speed", None),
+        getattr(spot, "comment", None) or getattr(spot, "rbnType", None)]
+    body = _record.pack(
+        spot.time, spot.frequency, getattr(spot, "snr", 0.0), spot.ttl,
+        spot_type) + b"".join(_encode_string(s) for s in strings)
+    return _length.pack(len(body)) + body
+
+def decode_spot(data, offset = 0):
+    """Decode the record at the given offset. Returns the spot and the
+    offset of the next record. Raises TornRecord if the record is not
+    framed correctly, ValueError if its content is invalid."""
+    if offset + _length.size > len(data):
+        raise TornRecord("incomplete record at {}".format(offset))
+    length, = _length.unpack_from(data, offset)
+    offset += _length.size
+    end = offset + length
+    if end > len(data) or length < _record.size:
+        raise TornRecord("incomplete record at {}".format(offset))
+    timestamp, frequency, snr, ttl, spot_type = _record.unpack_from(
+        data, offset)
+    offset += _record.size
+    strings = []
+    while offset < end:
+        string_length = data[offset]
+        offset += 1
+        strings.append(
+            bytes(data[offset:offset + string_length]).decode(ENCODING))
+        offset += string_length
+    if offset != end:
+        raise TornRecord("corrupt record at {}".format(end - length))
+    if len(strings) != 6 or spot_type >= len(SPOT_TYPES):
+        raise ValueError("invalid record at {}".format(end - length))
+    call, source_call, source_grid, mode, speed, text = strings
+
+    call = _callinfo.Call(call)
+    source_call = _callinfo.Call(source_call)
+    source_grid = _grid.Locator(source_grid) if source_grid else None
+    spot_class = SPOT_TYPES[spot_type]
+    if spot_class is _spotting.ClusterSpot:
+        spot = _spotting.ClusterSpot(
+            call, frequency, timestamp, source_call, source_grid, text)
+    elif spot_class is _spotting.RbnSpot:
+        spot = _spotting.RbnSpot(
+            call, frequency, timestamp, source_call, source_grid,
+            sys.intern(mode), snr, sys.intern(speed), sys.intern(text))
+    elif spot_class is _pskreporter.PskReporterSpot:
+        spot = _pskreporter.PskReporterSpot(
+            call, frequency, timestamp, source_call, source_grid,
+            sys.intern(mode), snr)
+    else:
+        spot = _spotting.Spot(
+            ttl, call, frequency, timestamp, source_call, source_grid)
+    return spot, end
+
+
+class JournalWriter:
+    """Appends spots to the journal file of the current day, through a
+    buffer. Call flush to make the written spots visible to readers."""
+    def __init__(self, directory, clock = time.time):
+        self.directory = directory
+        self.clock = clock
+        self.day = None
+        self.journal_file = None
+        self.index_file = None
+        self.last_minute = -1
+        self.written = 0
+
+    def append(self, spot):
+        now = self.clock()
+        day = day_of(now)
+        if day != self.day:
+            self._rotate(day)
+
+        minute = minute_of_day(now)
+        if minute > self.last_minute:
+            self.index_file.write(
+                _index_entry.pack(minute, self.journal_file.tell()))
+            self.last_minute = minute
+        self.journal_file.write(encode_spot(spot))
+        self.written += 1
+
+    def _rotate(self, day):
+        self.close()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.day = day
+        self._repair(day)
+        self.journal_file = open(journal_filename(self.directory, day), "ab")
+        self.index_file = open(index_filename(self.directory, day), "ab")
+        self.last_minute = JournalReader.last_indexed_minute(
+            index_filename(self.directory, day))
+
+    def _repair(self, day):
+        """Cut off a torn record that is left at the end of the file if the
+        process died while writing, so that the next records are appended
+        at a record boundary, and the index entries behind it."""
+        with JournalReader(self.directory, day) as reader:
+            size = len(reader.data)
+            i = bisect.bisect_right(reader.offsets, size) - 1
+            end = reader.end_of_records(reader.offsets[i] if i >= 0 else 0)
+            entries = bisect.bisect_right(reader.offsets, end)
+        filename = journal_filename(self.directory, day)
+        if end < size:
+            os.truncate(filename, end)
+        filename = index_filename(self.directory, day)
+        if os.path.isfile(filename):
+            if os.path.getsize(filename) != entries * _index_entry.size:
+                os.truncate(filename, entries * _index_entry.size)
+
+    def flush(self):
+        if self.journal_file:
+            self.journal_file.flush()
+            self.index_file.flush()
+
+    def close(self):
+        if self.journal_file:
+            self.journal_file.close()
+            self.index_file.close()
+        self.journal_file = None
+        self.index_file = None
+        self.day = None
+
+
+class JournalReader:
+    """Reads one journal file through mmap."""
+    def __init__(self, directory, day):
+        self.day = day
+        self.minutes = []
+        self.offsets = []
+        self.data = b""
+        self._file = None
+        filename = journal_filename(directory, day)
+        if os.path.isfile(filename) and os.path.getsize(filename) > 0:
+            self._file = open(filename, "rb")
+            self.data = mmap.mmap(
+                self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        self._load_index(index_filename(directory, day))
+
+    def _load_index(self, filename):
+        if not os.path.isfile(filename): return
+        with open(filename, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % _index_entry.size
+        for minute, offset in _index_entry.iter_unpack(data[:usable]):
+            self.minutes.append(minute)
+            self.offsets.append(offset)
+
+    @staticmethod
+    def last_indexed_minute(filename):
+        if not os.path.isfile(filename): return -1
+        size = os.path.getsize(filename)
+        size -= size % _index_entry.size
+        if not size: return -1
+        with open(filename, "rb") as f:
+            f.seek(size - _index_entry.size)
+            minute, offset = _index_entry.unpack(f.read(_index_entry.size))
+        return minute
+
+    def close(self):
+        if self._file:
+            self.data.close()
+            self._file.close()
+        self._file = None
+        self.data = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self._spots(0, len(self.data))
+
+    def _records(self, offset, end):
+        """Yield the spots and the offsets behind their records. The spot is
+        None for a record that is framed correctly, but cannot be decoded.
+        Stops at a torn record."""
+        end = min(end, len(self.data))
+        while offset + _length.size <= end:
+            try:
+                spot, next_offset = decode_spot(self.data, offset)
+            except TornRecord:
+                return
+            except ValueError:
+                length, = _length.unpack_from(self.data, offset)
+                spot, next_offset = None, offset + _length.size + length
+            yield spot, next_offset
+            offset = next_offset
+
+    def _spots(self, offset, end):
+        for spot, next_offset in self._records(offset, end):
+            if spot:
+                yield spot
+
+    def end_of_records(self, offset = 0):
+        """Return the offset behind the last complete record, starting with
+        the record at the given offset."""
+        for spot, next_offset in self._records(offset, len(self.data)):
+            offset = next_offset
+        return offset
+
+    def spots_between(self, start, end):
+        """Yield the spots with start <= time < end that were written in this
+        minute range, using the index to skip everything before."""
+        day_start = start_of_day(self.day)
+        first_minute = max(0, int(start - day_start) // 60)
+        last_minute = int(end - day_start) // 60
+        i = bisect.bisect_right(self.minutes, first_minute) - 1
+        offset = self.offsets[i] if i >= 0 else 0
+        j = bisect.bisect_right(self.minutes, last_minute)
+        end_offset = (self.offsets[j] 
+                      if j < len(self.offsets) 
+                      else len(self.data))
+        for spot in self._spots(offset, end_offset):
+            if start <= spot.time < end:
+                yield spot
+
+
+class Journal:
+    """The journal of all days in one directory."""
+    def __init__(self, directory = None, clock = time.time):
+        self.directory = (directory
+                          if directory
+                          else _config.filename(JOURNAL_DIRECTORY))
+        self.writer = JournalWriter(self.directory, clock)
+
+    def append(self, spot):
+        self.writer.append(spot)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+    def spots_between(self, start, end):
+        """Return all spots with start <= time < end from the daily files."""
+        self.flush()
+        spots = []
+        day = start_of_day(day_of(start))
+        while day < end:
+            with JournalReader(self.directory, day_of(day)) as reader:
+                spots.extend(reader.spots_between(start, end))
+            day += 86400
+        return spots
+
+    def recent_spots(self, window = WARM_RESTART_WINDOW):
+        """Return the spots of the last window seconds, to restore the 
+        aggregated spots after a restart."""
+        now = self.writer.clock()
+        return self.spots_between(now - window, now + 1)
+
+
+def main(args):
+    directory = args[1] if len(args) > 1 else None
+    minutes = int(args[2]) if len(args) > 2 else 10
+    journal = Journal(directory)
+    now = time.time()
+    for spot in journal.spots_between(now - minutes * 60, now):
+        print(str(spot))
+
+if __name__ == "__main__": main(sys.argv)
@@ -3,19 +3,23 @@
 
 import sys
 
-from PySide import QtCore, QtGui
+from PySide import QtGui
 
 from . import _bandmap, _dxcc, _map, _spotting, _pskreporter, _infohub, \
               _hamqth, _qrz, _notepad, _entry, _config, _windowmanager, _wsjtx, \
-              _vfo, _bandplan
+              _vfo, _bandplan, _journal, _metrics, _parsing, _daemon, \
+              _propagation, _clusterfilter, _time
 
 class MainWindow(_windowmanager.ManagedMainWindow):
-    def __init__(self, app, entry_line, notepad, parent = None):
+    def __init__(
+            self, app, entry_line, notepad, diagnostics_window, 
+            parent = None):
         _windowmanager.ManagedMainWindow.__init__(self, parent)
         self.setObjectName("main")
         self.app = app
         self.entry_line = entry_line
         self.notepad = notepad
+        self.diagnostics_window = diagnostics_window
 
         self.line_widget = _entry.EntryWidget(entry_line)
         self.notepad_widget = _notepad.NotepadWidget(notepad)
@@ -31,11 +35,36 @@ class MainWindow(_windowmanager.ManagedMainWindow):
         self.setWindowTitle("DXPad")
         self.resize(800, 400)
 
+        shortcut = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self)
+        shortcut.activated.connect(self.diagnostics_window.show)
+
     def closeEvent(self, e):
         _windowmanager.ManagedMainWindow.closeEvent(self, e)
         self.app.quit()
 
 def main(args):
+    """usage: dxpad.py [--attach [daemon address]] [--replay file [speed]]
+
+    With --attach, the spots are taken from a running daemon (see _daemon),
+    instead of following the clusters, PSK Reporter and WSJT-X here.
+
+    With --replay, the cluster traffic recorded in the file (see 
+    ClusterSpotter.record) is replayed on a virtual clock instead of 
+    following the clusters and PSK Reporter. speed is the factor of the 
+    replay (default 1) or "max" to replay as fast as possible. The replayed
+    spots are not journaled and not counted in the propagation 
+    statistics."""
+    attach = "--attach" in args
+    if attach:
+        i = args.index("--attach")
+        daemon_address = args[i + 1] if len(args) > i + 1 else None
+    replay = "--replay" in args and not attach
+    if replay:
+        i = args.index("--replay")
+        replay_file = args[i + 1]
+        speed = args[i + 2] if len(args) > i + 2 else "1"
+        replay_speed = float("inf") if speed == "max" else float(speed)
+
     app = QtGui.QApplication(sys.argv)
     app.aboutToQuit.connect(app.closeAllWindows)
 
@@ -46,15 +75,35 @@ def main(args):
     vfo = _vfo.VFO(bandplan)
     dxcc = _dxcc.DXCC()
     dxcc.load()
-    aggregator = _spotting.SpotAggregator(dxcc)
-    spot_cleanup_timer = QtCore.QTimer()
-    pskreporter = _pskreporter.PskReporter(config.call, config.locator)
-    bandmap = _bandmap.BandMap()
+    spotter_continents = (config.spotter_continents 
+                          or [dxcc.find_dxcc_info(config.call).continent])
+    if attach:
+        daemon_client = _daemon.DaemonClient(dxcc, daemon_address)
+        spot_source = daemon_client
+    elif replay:
+        aggregator = _spotting.SpotAggregator(
+            dxcc, clock = _time.VirtualClock())
+        aggregation_thread = _spotting.AggregationThread(aggregator)
+        spot_source = aggregator
+    else:
+        journal = _journal.Journal()
+        statistics = _propagation.PropagationStatistics()
+        aggregator = _spotting.SpotAggregator(
+            dxcc, journal, statistics = statistics)
+        aggregator.restore_spots(journal.recent_spots())
+        aggregation_thread = _spotting.AggregationThread(aggregator)
+        pskreporter = _pskreporter.PskReporter(
+            config.call, config.locator, dxcc)
+        spot_source = aggregator
+    usual_openings = _propagation.PropagationStatistics(writable = False)
+    bandmap = _bandmap.BandMap(usual_openings)
+    bandmap.spotter_continents = spotter_continents
     map = _map.Map()
+    map.set_statistics(usual_openings)
     map.select_band(vfo.band)
     map.set_own_call(config.call)
     map.set_own_locator(config.locator)
-    map.select_continents([dxcc.find_dxcc_info(config.call).continent])
+    map.select_continents(spotter_continents)
     vfo.band_changed.connect(map.select_band)
     notepad = _notepad.Notepad()
     entry_line = _entry.EntryLine(notepad)
@@ -65,27 +114,31 @@ def main(args):
     if config.qrz:
         callbooks.append(_qrz.AsyncQrz(config.qrz.user, config.qrz.password))
     infohub = _infohub.Infohub(dxcc, callbooks, config.call, config.locator)
-    wsjtx_config = config.get_wsjtx()
-    wsjtx = _wsjtx.WSJTX(
-        wsjtx_config.listen_host, wsjtx_config.listen_port, 
-        wsjtx_config.repeater, wsjtx_config.repeater_host, 
-        wsjtx_config.repeater_port)
+    if not attach:
+        wsjtx_config = config.get_wsjtx()
+        wsjtx = _wsjtx.WSJTX(
+            wsjtx_config.listen_host, wsjtx_config.listen_port, 
+            wsjtx_config.repeater, wsjtx_config.repeater_host, 
+            wsjtx_config.repeater_port)
 
 
     infohub.locator_changed.connect(map.set_destination_locator)
     infohub.call_looked_up.connect(map.select_call)
-    infohub.call_looked_up.connect(pskreporter.set_dx_call)
-    aggregator.update_spots.connect(bandmap.spots_received)
-    aggregator.update_spots.connect(map.highlight_spots)
-    aggregator.update_spots.connect(infohub.calls_seen)
-    pskreporter.spot_received.connect(aggregator.spot_received)
-    spot_cleanup_timer.timeout.connect(aggregator.cleanup_spots)
+    spot_source.spots_changed.connect(bandmap.spots_changed)
+    spot_source.spots_changed.connect(map.spots_changed)
+    spot_source.spots_changed.connect(infohub.calls_seen)
     notepad.call_added.connect(infohub.lookup_call)
-    wsjtx.status.dx_call_updated.connect(infohub.lookup_call)
-
-    spot_cleanup_timer.start(1000)
-
-    main_window = MainWindow(app, entry_line, notepad)
+    if attach:
+        daemon_client.dx_call_updated.connect(infohub.lookup_call)
+    else:
+        if not replay:
+            infohub.call_looked_up.connect(pskreporter.set_dx_call)
+            pskreporter.spots_received.connect(aggregator.spots_received)
+        wsjtx.status.dx_call_updated.connect(infohub.lookup_call)
+        aggregation_thread.start()
+
+    diagnostics_window = _metrics.DiagnosticsWindow()
+    main_window = MainWindow(app, entry_line, notepad, diagnostics_window)
     infohub_window = _infohub.InfohubWindow(infohub)
     bandmap_window = _bandmap.BandmapWindow(bandmap, vfo)
     map_window = _map.MapWindow(map)
@@ -96,6 +149,7 @@ def main(args):
     window_manager.add_window(bandmap_window)
     window_manager.add_window(map_window)
     window_manager.add_window(vfo_window)
+    window_manager.add_window(diagnostics_window)
     window_manager.restore_visibility()
 
     bandmap_window.show()
@@ -106,16 +160,42 @@ def main(args):
 
     main_window.setFocus()
 
-    clusters = config.clusters
-    spotting_file = None #"../rbn.txt"
-    aggregator.start_spotting(clusters, spotting_file)
-    pskreporter.start()
-    wsjtx.start()
+    if attach:
+        daemon_client.start()
+    elif replay:
+        aggregator.start_spotting([], replay_file, replay_speed)
+        wsjtx.start()
+    else:
+        clusters = config.clusters
+        parsing_pool = (_parsing.ParsingPool(dxcc, config.parsing_workers)
+                        if config.parsing_workers
+                        else None)
+        cluster_filter = _clusterfilter.ClusterFilter(
+            spotter_continents, bandplan)
+        aggregator.start_spotting(
+            clusters, None, None, parsing_pool, cluster_filter)
+        pskreporter.start()
+        wsjtx.start()
 
     result = app.exec_()
     
-    aggregator.stop_spotting()
-    pskreporter.stop()
-    wsjtx.stop()
+    if attach:
+        daemon_client.stop()
+        daemon_client.wait()
+    elif replay:
+        aggregator.stop_spotting()
+        aggregation_thread.stop()
+        aggregation_thread.wait()
+        wsjtx.stop()
+    else:
+        aggregator.stop_spotting()
+        aggregation_thread.stop()
+        aggregation_thread.wait()
+        if parsing_pool:
+            parsing_pool.shutdown()
+        journal.close()
+        statistics.close()
+        pskreporter.stop()
+        wsjtx.stop()
 
     sys.exit(result)
@@ -8,7 +8,7 @@ import os
 from PySide import QtCore, QtGui, QtSvg
 
 from . import _sun, _location, _grid, _dxcc, _bandmap, _bandplan, _spotting, \
-              _config, _callinfo, _windowmanager
+              _config, _callinfo, _windowmanager, _spottable
 
 
 """
@@ -63,10 +63,11 @@ class SpotterContinentFilter:
         self.continents = continents
 
     def filter_spot(self, spot):
-        return [
-            source for source in spot.sources 
-            if source.source_dxcc_info 
-                and (source.source_dxcc_info.continent in self.continents)]
+        return (spot.spotter_continents 
+                & _spottable.continent_mask(self.continents)) != 0
+
+    def query(self, table, band):
+        return table.query(band = band, spotter_continents = self.continents)
 
     def spot_locators(self, spot):
         if not(spot.dxcc_info): return []
@@ -81,8 +82,11 @@ class SpotterFilter:
 
     def filter_spot(self, spot):
         if not self.call: return False
-        return len([source for source in spot.sources
-                    if self.call.base_call == source.source_call.base_call]) > 0
+        return self.call.base_call in spot.spotters
+
+    def query(self, table, band):
+        if not self.call: return []
+        return table.query(band = band, source_call = self.call)
 
     def spot_locators(self, spot):
         if not(spot.dxcc_info): return []
@@ -100,6 +104,10 @@ class ReceivingCallFilter:
         if not self.call: return False
         return self.call.base_call == spot.call.base_call
 
+    def query(self, table, band):
+        if not self.call: return []
+        return table.query(band = band, dx_call = self.call)
+
     def spot_locators(self, spot):
         def to_grid_heat_tuple(source):
             if hasattr(source, "snr"):
@@ -129,12 +137,17 @@ class Map(QtCore.QObject):
         self.map_visible = True
         self.grid_visible = True
         self.grayline_visible = True
+        self.openings_visible = True
         self.own_locator = None
         self.destination_locator = None
         self.locator_heatmap = LocatorHeatmap(
             cell_width = self.spot_cell_width, 
             cell_height = self.spot_cell_height)
         self.band = _bandplan.NO_BAND
+        self.table = _spottable.SpotTable()
+        self.band_spot_ids = set()
+        self.statistics = None
+        self.usual_openings = []
         self.spot_filters = [
             SpotterContinentFilter(),
             ReceivingCallFilter(),
@@ -157,10 +170,21 @@ class Map(QtCore.QObject):
         self.grayline_visible = state
         self.changed.emit()
 
+    @QtCore.Slot(bool)
+    def show_openings(self, state):
+        self.openings_visible = state
+        self.changed.emit()
+
+    def set_statistics(self, statistics):
+        """Use the given _propagation.PropagationStatistics to show where 
+        the selected band is usually open now."""
+        self.statistics = statistics
+        self._highlight_spots()
+
     @QtCore.Slot(object)
     def set_own_call(self, call):
         self.spot_filters[1].call = call
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot(object)
     def set_own_locator(self, locator):
@@ -180,18 +204,18 @@ class Map(QtCore.QObject):
     @QtCore.Slot(object)
     def select_continents(self, continents):
         self.spot_filters[0].continents = continents
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot()
     def show_spots_received_on_selected_continents(self):
         self.spot_filter = self.spot_filters[0]
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot(object)
     def select_call(self, call):
         self.spot_filters[2].call = call
         self.spot_filters[3].call = call
-        self.changed.emit()
+        self._highlight_spots()
 
     def selected_call(self):
         return self.spot_filters[2].call
@@ -199,37 +223,55 @@ class Map(QtCore.QObject):
     @QtCore.Slot(object)
     def select_band(self, band):
         self.band = band
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot()
     def show_spots_receiving_own_call(self):
         self.spot_filter = self.spot_filters[1]
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot()
     def show_spots_receiving_selected_call(self):
         self.spot_filter = self.spot_filters[2]
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot()
     def show_spots_from_selected_call(self):
         self.spot_filter = self.spot_filters[3]
-        self.changed.emit()
+        self._highlight_spots()
 
     @QtCore.Slot(object)
-    def highlight_spots(self, spots):
+    def spots_changed(self, delta):
+        self.table = delta.table
+        band_changed = any(
+            spot.id in self.band_spot_ids or self._in_selected_band(spot)
+            for spot in delta.expired + delta.added + delta.changed)
+        if band_changed:
+            self._highlight_spots()
+
+    def _highlight_spots(self):
         locator_heatmap = LocatorHeatmap(
             cell_width = self.spot_cell_width, 
             cell_height = self.spot_cell_height)
-        filtered_spots = list(
-            filter(self.spot_filter.filter_spot, 
-                list(filter(self._in_selected_band, spots))))
+        self.band_spot_ids = set(
+            self.table.id[:len(self.table)][self.table.in_band(self.band)]
+            .tolist())
+        filtered_spots = self.spot_filter.query(self.table, self.band)
         for spot in filtered_spots:
             for locator, heat in self.spot_filter.spot_locators(spot):
                 locator_heatmap.add(locator, heat, self.spot_filter.add_heat)
         self.locator_heatmap = locator_heatmap
+        self.usual_openings = self._find_usual_openings()
         self.changed.emit()
 
+    def _find_usual_openings(self):
+        if not self.statistics: return []
+        return [
+            (latlon, activity) 
+            for continent in self.spot_filters[0].continents
+            for prefix, latlon, activity 
+            in self.statistics.usually_open(self.band, continent)]
+
     def _in_selected_band(self, spot):
         return self.band.contains(spot.frequency)
 
@@ -280,6 +322,8 @@ class MapWidget(QtGui.QWidget):
             self._draw_grid(painter)
         if self.map.grayline_visible:
             self._draw_grayline(painter)
+        if self.map.openings_visible:
+            self._draw_usual_openings(painter)
         self._draw_locator_heatmap(painter)
         self._draw_own_locator(painter)
         self._draw_destination(painter)
@@ -374,6 +418,18 @@ class MapWidget(QtGui.QWidget):
                 height = heatmap.cell_height, color = self._heat_color(heat), 
                 opacity = 0.4)
 
+    def _draw_usual_openings(self, painter):
+        """Circle the DXCC entities that are usually received now, the 
+        more spots per day, the larger the circle."""
+        painter.setOpacity(0.6)
+        pen = QtGui.QPen(QtGui.QColor(0, 150, 0))
+        pen.setWidthF(0.5)
+        painter.setPen(pen)
+        painter.setBrush(QtCore.Qt.NoBrush)
+        for latlon, activity in self.map.usual_openings:
+            r = min(1.0 + activity / 10.0, 5.0)
+            painter.drawEllipse(QtCore.QPointF(latlon.lon, latlon.lat), r, r)
+
     def _draw_lat_lon(
             self, painter, latlon, width = 2, height = 1, 
             color = QtGui.QColor(255, 0, 0), opacity = 1):
@@ -435,6 +491,12 @@ class MapWindow(_windowmanager.ManagedWindow):
         hbox.addWidget(self.show_spots_receiving_selected_call)
         hbox.addWidget(self.show_spots_from_selected_call)
 
+        show_openings = QtGui.QCheckBox()
+        show_openings.setText("Üblicherweise offen")
+        show_openings.setChecked(self.map.openings_visible)
+        show_openings.toggled.connect(self.map.show_openings)
+        hbox.addWidget(show_openings)
+
         vbox = QtGui.QVBoxLayout()
         vbox.addLayout(hbox)
         vbox.addWidget(self.map_widget)
@@ -470,10 +532,7 @@ def main(args):
     dxcc = _dxcc.DXCC()
     dxcc.load()
     aggregator = _spotting.SpotAggregator(dxcc)
-
-    spot_cleanup_timer = QtCore.QTimer()
-    spot_cleanup_timer.timeout.connect(aggregator.cleanup_spots)
-    spot_cleanup_timer.start(1000)
+    aggregation_thread = _spotting.AggregationThread(aggregator)
     
     map = Map()
     map.set_own_locator(config.locator)
@@ -481,18 +540,21 @@ def main(args):
     map.select_call(_callinfo.Call("K1TTT")) #config.call)
     map.select_continents([dxcc.find_dxcc_info(config.call).continent])
     map.select_band(_bandplan.IARU_REGION_1[4])
-    aggregator.update_spots.connect(map.highlight_spots)
+    aggregator.spots_changed.connect(map.spots_changed)
 
     win = MapWindow(map)
     win.show()
 
-    st = _spotting.SpottingThread.textfile("rbn.txt")
-    st.spot_received.connect(aggregator.spot_received)
+    st = _spotting.SpottingThread.textfile("rbn.txt", dxcc)
+    st.spots_received.connect(aggregator.spots_received)
+    aggregation_thread.start()
     st.start()
 
     result = app.exec_()
 
     st.stop()
     st.wait()
+    aggregation_thread.stop()
+    aggregation_thread.wait()
 
     sys.exit(result)
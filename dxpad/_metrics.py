@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Counters, gauges and histograms of the spotting pipeline.
+
+All metrics live in the registry METRICS and are safe to update from any
+thread. The diagnostics window shows them, METRICS.dump writes them as JSON.
+"""
+
+import time
+import json
+import threading
+import collections
+
+from PySide import QtCore, QtGui
+
+from . import _config, _windowmanager
+
+RATE_WINDOW = 60 # seconds
+HISTOGRAM_SIZE = 1000 # observations
+REFRESH_INTERVAL = 1000 # milliseconds
+METRICS_FILENAME = "metrics.json"
+
+class Counter:
+    """Counts events and keeps their rate over the last RATE_WINDOW."""
+    def __init__(self, clock = time.monotonic):
+        self.clock = clock
+        self.value = 0
+        self.buckets = collections.deque()
+        self.lock = threading.Lock()
+
+    def inc(self, count = 1):
+        second = int(self.clock())
+        with self.lock:
+            self.value += count
+            if self.buckets and self.buckets[-1][0] == second:
+                self.buckets[-1][1] += count
+            else:
+                self.buckets.append([second, count])
+            self._evict(second)
+
+    def _evict(self, second):
+        while self.buckets and self.buckets[0][0] <= second - RATE_WINDOW:
+            self.buckets.popleft()
+
+    def rate(self):
+        """The events per second in the last RATE_WINDOW."""
+        with self.lock:
+            self._evict(int(self.clock()))
+            return sum(count for second, count in self.buckets) / RATE_WINDOW
+
+    def to_dict(self):
+        return {"value": self.value, "rate": self.rate()}
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def add(self, value):
+        with self.lock:
+            self.value += value
+
+    def to_dict(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """Keeps count, sum and maximum of all observations and the last
+    HISTOGRAM_SIZE observations for the percentiles."""
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.observations = collections.deque(maxlen = HISTOGRAM_SIZE)
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+            self.observations.append(value)
+
+    def time(self):
+        """Return a context manager that observes the duration of its
+        block in seconds."""
+        return _Timer(self)
+
+    def percentile(self, p):
+        with self.lock:
+            observations = sorted(self.observations)
+        if not observations: return 0.0
+        index = min(len(observations) - 1, int(len(observations) * p / 100.0))
+        return observations[index]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max}
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, name, metric_class):
+        metric = self.metrics.get(name)
+        if metric: return metric
+        with self.lock:
+            return self.metrics.setdefault(name, metric_class())
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def gauge(self, name):
+        return self._get(name, Gauge)
+
+    def histogram(self, name):
+        return self._get(name, Histogram)
+
+    def to_dict(self):
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        return {name: metric.to_dict() for name, metric in metrics}
+
+    def dump(self, filename = None):
+        """Write all metrics as JSON, by default into
+        ~/.config/dxpad/metrics.json."""
+        if not filename:
+            filename = _config.filename(METRICS_FILENAME)
+        with open(filename, "w") as f:
+            json.dump(
+                {"time": time.time(), "metrics": self.to_dict()}, f,
+                indent = 2, sort_keys = True)
+        return filename
+
+    def format(self):
+        lines = []
+        for name, values in sorted(self.to_dict().items()):
+            lines.append("{:<40} {}".format(name, ", ".join(
+                "{}: {:.6g}".format(key, value)
+                for key, value in sorted(values.items()))))
+        return "\n".join(lines)
+
+METRICS = Registry()
+
+
+class DiagnosticsWindow(_windowmanager.ManagedWindow):
+    def __init__(self, registry = METRICS, parent = None):
+        _windowmanager.ManagedWindow.__init__(self, parent)
+        self.setObjectName("diagnostics")
+        self.registry = registry
+
+        self.text = QtGui.QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QtGui.QFont("Monospace"))
+        dump_button = QtGui.QPushButton("Dump JSON")
+        dump_button.clicked.connect(self.dump)
+
+        vbox = QtGui.QVBoxLayout()
+        vbox.addWidget(self.text)
+        vbox.addWidget(dump_button)
+        self.setLayout(vbox)
+        self.setWindowTitle("Diagnostics")
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_INTERVAL)
+
+    @QtCore.Slot()
+    def refresh(self):
+        if self.isVisible():
+            self.text.setPlainText(self.registry.format())
+
+    @QtCore.Slot()
+    def dump(self):
+        filename = self.registry.dump()
+        print("Metrics written to {}".format(filename))
+
@@ -0,0 +1,160 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parse the cluster lines in a pool of worker processes.
+
+With the full RBN feed plus several clusters, parsing the lines and creating
+the calls can keep one core busy. The ParsingPool sends the raw lines in
+batches to worker processes, which parse them, look up the DXCC prefixes and
+return compact records. Only the records are sent back, the spots are
+rebuilt from them in the calling process, with the DXCC infos of its own
+DXCC object. The batches of one cluster are delivered in the order in which
+they were submitted, so the order of the lines of every cluster is kept.
+"""
+
+import asyncio
+import multiprocessing
+import concurrent.futures
+
+from . import _spotting, _callinfo, _grid, _metrics
+
+LINE_BATCH_SIZE = 200 # lines
+LINE_BATCH_DELAY = 0.05 # seconds
+
+_CLUSTER_SPOT = 0
+_RBN_SPOT = 1
+
+_worker_dxcc = None
+
+def _init_worker(dxcc):
+    global _worker_dxcc
+    _worker_dxcc = dxcc
+
+def _dxcc_prefix(call):
+    return _worker_dxcc.find_dxcc_prefix(call) if _worker_dxcc else None
+
+def encode_spot(spot):
+    """Encode the given spot as a tuple of plain values. Instead of the DXCC
+    infos, the record contains their keys in DXCC.infos_by_prefix."""
+    source_grid = str(spot.source_grid) if spot.source_grid else None
+    call = str(spot.call)
+    source_call = str(spot.source_call)
+    if isinstance(spot, _spotting.RbnSpot):
+        return (
+            _RBN_SPOT, spot.time, spot.frequency, call, source_call,
+            source_grid, _dxcc_prefix(call), _dxcc_prefix(source_call),
+            spot.mode, spot.snr, spot.speed, spot.rbnType)
+    return (
+        _CLUSTER_SPOT, spot.time, spot.frequency, call, source_call,
+        source_grid, _dxcc_prefix(call), _dxcc_prefix(source_call),
+        spot.comment)
+
+def parse_lines(lines):
+    """Parse the given (line, timestamp) pairs in a worker process. Returns
+    the records of the parsed spots and the number of lines that could not
+    be parsed."""
+    records = []
+    failures = 0
+    for line, timestamp in lines:
+        spot = _spotting.ClusterSpotter.parse_line(line, timestamp)
+        if spot:
+            records.append(encode_spot(spot))
+        else:
+            failures += 1
+    return records, failures
+
+def decode_spot(record, dxcc = None):
+    """Rebuild the spot from the given record, with the DXCC infos of the
+    given DXCC object."""
+    kind, timestamp, frequency, call, source_call, source_grid, \
+        dxcc_prefix, source_dxcc_prefix = record[:8]
+    call = _callinfo.Call(call)
+    source_call = _callinfo.Call(source_call)
+    source_grid = _grid.Locator(source_grid) if source_grid else None
+    if kind == _RBN_SPOT:
+        mode, snr, speed, rbnType = record[8:]
+        spot = _spotting.RbnSpot(
+            call, frequency, timestamp, source_call, source_grid, mode, snr,
+            speed, rbnType)
+    else:
+        spot = _spotting.ClusterSpot(
+            call, frequency, timestamp, source_call, source_grid, record[8])
+    if dxcc:
+        spot.dxcc_info = dxcc.infos_by_prefix.get(dxcc_prefix)
+        spot.source_dxcc_info = dxcc.infos_by_prefix.get(source_dxcc_prefix)
+    return spot
+
+
+class ParsingPool:
+    """A pool of worker processes that parse the lines of ClusterSpotters.
+    The workers get a copy of the given DXCC object when they start."""
+    def __init__(
+            self, dxcc = None, workers = None, batch_size = LINE_BATCH_SIZE,
+            batch_delay = LINE_BATCH_DELAY):
+        self.dxcc = dxcc
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = workers,
+            mp_context = multiprocessing.get_context("spawn"),
+            initializer = _init_worker, initargs = (dxcc,))
+        self.batches = _metrics.METRICS.counter("parsing_pool.batches")
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def submit(self, lines):
+        """Submit the given (line, timestamp) pairs, return the future of
+        their records."""
+        self.batches.inc()
+        return self.executor.submit(parse_lines, lines)
+
+    def decode(self, records):
+        return [decode_spot(record, self.dxcc) for record in records]
+
+    def parse_batches(self, batches):
+        """Parse the given batches of (line, timestamp) pairs and yield the
+        spots in the order of the lines."""
+        futures = [self.submit(batch) for batch in batches]
+        for future in futures:
+            records, failures = future.result()
+            yield from self.decode(records)
+
+    async def run_spotter(self, spotter, spot_callback, batchers):
+        """Run the client of the given ClusterSpotter and parse its lines in
+        the pool. The line batcher of the spotter is added to batchers while
+        it runs, to be flushed periodically."""
+        pending = asyncio.Queue()
+
+        def submit(lines):
+            pending.put_nowait(asyncio.wrap_future(self.submit(lines)))
+
+        line_batcher = _spotting.SpotBatcher(
+            submit, self.batch_size, self.batch_delay)
+
+        def line_received(line):
+            spotter.count_line(line)
+            if line.startswith(spotter.SPOT_PREFIX):
+                line_batcher.add((line, spotter.clock.time()))
+
+        delivery = asyncio.ensure_future(
+            self._deliver(pending, spotter, spot_callback))
+        batchers.append(line_batcher)
+        try:
+            await spotter.client.run(line_received)
+            line_batcher.flush()
+            pending.put_nowait(None)
+            await delivery
+        finally:
+            batchers.remove(line_batcher)
+            delivery.cancel()
+
+    async def _deliver(self, pending, spotter, spot_callback):
+        while True:
+            future = await pending.get()
+            if future is None: return
+            records, failures = await future
+            spotter.parse_failures.inc(failures)
+            for spot in self.decode(records):
+                spot_callback(spot)
@@ -0,0 +1,259 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rolling statistics of the received spots, to show where a band is usually
+open at this time of the day.
+
+The spots are counted per band, continent of the spotter, DXCC entity of
+the DX station and hour of the day (UTC) in a NumPy array of fixed shape.
+Every UTC day has its own array, memory-mapped from its own file
+(propagation-YYYYMMDD.npy), so the counts of the current day survive a
+crash of dxpad. On startup and whenever the day changes, the arrays of the
+last WINDOW_DAYS days are memory-mapped and summed up. A lookup is then one
+index into this sum and the array of the current day.
+
+The DXCC entities are numbered in the order in which they were seen first.
+entities.txt holds one line per entity with its primary prefix, latitude
+and longitude, the line number is the index into the arrays. At most
+MAX_ENTITIES entities are counted.
+
+usage: python3 -m dxpad._propagation [continent] [band]
+"""
+
+import sys
+import os
+import time
+import bisect
+
+import numpy as np
+
+from . import _bandplan, _config, _location, _spottable
+
+STATISTICS_DIRECTORY = "propagation"
+ENTITIES_FILE = "entities.txt"
+WINDOW_DAYS = 14
+MAX_ENTITIES = 512
+HOURS = 24
+OPEN_THRESHOLD = 1.0 # spots per day
+
+
+def statistics_filename(directory, day):
+    return os.path.join(directory, "propagation-{}.npy".format(day))
+
+def day_of(timestamp):
+    return time.strftime("%Y%m%d", time.gmtime(timestamp))
+
+def hour_of_day(timestamp):
+    return int(timestamp % 86400) // 3600
+
+
+class PropagationStatistics:
+    """The spot counts of the current day and the sum of the counts of the
+    last window_days days before.
+
+    Only one writable instance must use a directory at a time, it is fed
+    from the SpotAggregator. Read-only instances (e.g. of a GUI attached to
+    a daemon) see the counts of the current day as they are written,
+    through the shared memory mapping."""
+    def __init__(
+            self, directory = None, bandplan = _bandplan.IARU_REGION_1,
+            clock = time.time, window_days = WINDOW_DAYS, writable = True):
+        self.directory = (directory
+                          if directory
+                          else _config.filename(STATISTICS_DIRECTORY))
+        self.bandplan = bandplan
+        self.band_edges = [
+            edge for band in bandplan for edge in (band.from_kHz, band.to_kHz)]
+        self.clock = clock
+        self.window_days = window_days
+        self.writable = writable
+        self.shape = (len(bandplan), len(_spottable.CONTINENTS), MAX_ENTITIES,
+                      HOURS)
+        self.continent_indexes = {
+            continent: i for i, continent in enumerate(_spottable.CONTINENTS)}
+        self.entities = []
+        self.entity_locations = []
+        self.entity_indexes = {}
+        self.entities_size = 0
+        self.day = None
+        self.next_day = 0
+        self.days = 0
+        self.today = None
+        self.history = None
+        if writable and not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self._load_entities()
+        self._check_day(clock())
+
+    def band_index(self, frequency):
+        i = bisect.bisect_right(self.band_edges, frequency)
+        return i // 2 if i % 2 == 1 else -1
+
+    def _load_entities(self):
+        filename = os.path.join(self.directory, ENTITIES_FILE)
+        if not os.path.isfile(filename): return
+        size = os.path.getsize(filename)
+        if size == self.entities_size: return
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        for line in lines[len(self.entities):]:
+            fields = line.split()
+            if len(fields) != 3: break # incomplete line at the end
+            prefix, lat, lon = fields
+            self.entity_indexes[prefix] = len(self.entities)
+            self.entities.append(prefix)
+            self.entity_locations.append(
+                _location.LatLon(float(lat), float(lon)))
+        self.entities_size = size
+
+    def entity_index(self, dxcc_info, add = False):
+        """Return the index of the DXCC entity of the given info, or None.
+        With add, unknown entities get the next free index."""
+        index = self.entity_indexes.get(dxcc_info.primary_prefix)
+        if index is not None or not add:
+            return index
+        if len(self.entities) >= MAX_ENTITIES:
+            return None
+        index = len(self.entities)
+        latlon = dxcc_info.latlon
+        filename = os.path.join(self.directory, ENTITIES_FILE)
+        with open(filename, "a") as f:
+            f.write("{} {:.2f} {:.2f}\n".format(
+                dxcc_info.primary_prefix, latlon.lat, latlon.lon))
+        self.entities_size = os.path.getsize(filename)
+        self.entity_indexes[dxcc_info.primary_prefix] = index
+        self.entities.append(dxcc_info.primary_prefix)
+        self.entity_locations.append(latlon)
+        return index
+
+    def _check_day(self, now):
+        if now >= self.next_day:
+            self._load(now)
+        elif not self.writable:
+            self._load_entities()
+            if self.today is None:
+                self.today = self._open_today()
+
+    def _load(self, now):
+        """Open the array of the current day and sum up the arrays of the
+        days before."""
+        self.close()
+        self.day = day_of(now)
+        self.next_day = (now - now % 86400) + 86400
+        history = np.zeros(self.shape, np.uint32)
+        days = 0
+        for i in range(1, self.window_days + 1):
+            filename = statistics_filename(
+                self.directory, day_of(now - i * 86400))
+            counts = self._map(filename, "r")
+            if counts is None: continue
+            history += counts
+            days += 1
+        self.history = history
+        self.days = days
+        self.today = self._open_today()
+
+    def _open_today(self):
+        filename = statistics_filename(self.directory, self.day)
+        counts = self._map(filename, "r+" if self.writable else "r")
+        if counts is None and self.writable:
+            counts = np.lib.format.open_memmap(
+                filename, mode = "w+", dtype = np.uint32, shape = self.shape)
+        return counts
+
+    def _map(self, filename, mode):
+        """Memory-map the array in the given file, or return None if there
+        is none or it has another shape, e.g. of an older bandplan."""
+        if not os.path.isfile(filename): return None
+        try:
+            counts = np.load(filename, mmap_mode = mode)
+        except ValueError:
+            return None
+        if counts.shape != self.shape or counts.dtype != np.uint32:
+            return None
+        return counts
+
+    def flush(self):
+        if self.writable and self.today is not None:
+            self.today.flush()
+
+    def close(self):
+        self.flush()
+        self.today = None
+
+    def count(self, spot, dxcc_info = None):
+        """Count the given spot. dxcc_info is the info of the DX station,
+        if it is not set in the spot. Only spots of the current day are 
+        counted, e.g. not the spots of a replayed recording."""
+        dxcc_info = dxcc_info or spot.dxcc_info
+        source_dxcc_info = spot.source_dxcc_info
+        if not (dxcc_info and source_dxcc_info): return
+        band = self.band_index(spot.frequency)
+        continent = self.continent_indexes.get(source_dxcc_info.continent)
+        if band < 0 or continent is None: return
+        entity = self.entity_index(dxcc_info, add = True)
+        if entity is None: return
+        self._check_day(self.clock())
+        if not (self.next_day - 86400 <= spot.time < self.next_day): return
+        self.today[band, continent, entity, hour_of_day(spot.time)] += 1
+
+    def _counts(self, band, continent, hour):
+        now = self.clock()
+        if hour is None:
+            hour = hour_of_day(now)
+        self._check_day(now)
+        band = (self.bandplan.index(band)
+                if band in self.bandplan
+                else self.band_index(band.from_kHz))
+        continent = self.continent_indexes.get(continent)
+        if band < 0 or continent is None: return None
+        counts = self.history[band, continent, :, hour]
+        if self.today is not None:
+            counts = counts + self.today[band, continent, :, hour]
+        return counts
+
+    def activity(self, band, continent, dxcc_info, hour = None):
+        """Return the spots per day of the given DXCC entity on the band,
+        received on the continent in the hour (now by default)."""
+        counts = self._counts(band, continent, hour)
+        entity = self.entity_index(dxcc_info)
+        if entity is None or counts is None: return 0.0
+        return float(counts[entity]) / (self.days + 1)
+
+    def band_activity(self, continent, hour = None):
+        """Return the spots per day on every band of the bandplan, received
+        on the given continent in the hour (now by default)."""
+        return [
+            float(counts.sum()) / (self.days + 1) if counts is not None else 0
+            for counts in (
+                self._counts(band, continent, hour) for band in self.bandplan)]
+
+    def usually_open(
+            self, band, continent, hour = None, threshold = OPEN_THRESHOLD):
+        """Return the primary prefix, location and spots per day of the DXCC
+        entities that are usually received on the band and continent in the
+        hour (now by default), with at least threshold spots per day."""
+        counts = self._counts(band, continent, hour)
+        if counts is None: return []
+        entities = len(self.entities)
+        activity = counts[:entities] / (self.days + 1)
+        return [
+            (self.entities[i], self.entity_locations[i], float(activity[i]))
+            for i in np.flatnonzero(activity >= threshold).tolist()]
+
+
+def main(args):
+    continent = args[1] if len(args) > 1 else "EU"
+    band_name = args[2] if len(args) > 2 else "20m"
+    statistics = PropagationStatistics(writable = False)
+    band = [band for band in statistics.bandplan if band.name == band_name][0]
+    hour = hour_of_day(time.time())
+    print("Usually received in {} on {} at {:02d}Z:".format(
+        continent, band_name, hour))
+    for prefix, latlon, activity in sorted(
+            statistics.usually_open(band, continent, hour),
+            key = lambda entry: -entry[2]):
+        print("{:<8} {:6.1f} spots/day".format(prefix, activity))
+
+if __name__ == "__main__": main(sys.argv)
@@ -15,9 +15,10 @@ import xml.dom.minidom as minidom
 
 from PySide import QtCore, QtGui
 
-from . import _spotting, _callinfo, _grid, _location, _config
+from . import _spotting, _callinfo, _grid, _location, _config, _metrics
 
 class PskReporterSpot(_spotting.Spot):
+    __slots__ = ("mode", "snr")
     TTL = 600
     def __init__(
             self, call, frequency, time, source_call, source_grid, mode, snr):
@@ -45,12 +46,13 @@ class PskReporterSpot(_spotting.Spot):
 class PskReporterWorker(QtCore.QThread):
     MAX_SNR = 30.0
     MIN_REQUEST_TIME = 200.0
-    spot_received = QtCore.Signal(object)
+    spots_received = QtCore.Signal(object)
 
-    def __init__(self, own_call, grid, parent = None):
+    def __init__(self, own_call, grid, dxcc = None, parent = None):
         QtCore.QThread.__init__(self, parent)
         self.own_call = own_call
         self.grid = grid
+        self.dxcc = dxcc
         self.dx_call = None
         self.query_last_request = {}
 
@@ -81,18 +83,21 @@ class PskReporterWorker(QtCore.QThread):
         if not(xml_data):
             return
         
-        spot_count = 0
+        incoming_spots = []
         for element in xml_data.getElementsByTagName("receptionReport"):
             incoming_spot = self._element_to_spot(element)
             if not(incoming_spot): 
                 continue
             
             #if not(incoming_spot in unique_spots):
-            self.spot_received.emit(incoming_spot)
+            incoming_spots.append(incoming_spot)
             #unique_spots.add(incoming_spot)
-            spot_count += 1
 
-        # print("PskReporter: received {} spots".format(spot_count))
+        # print("PskReporter: received {} spots".format(len(incoming_spots)))
+        if incoming_spots:
+            _metrics.METRICS.gauge(_spotting.SPOT_QUEUE_DEPTH).add(
+                len(incoming_spots))
+            self.spots_received.emit(incoming_spots)
 
     def _request_spots(self, query):
         if not(self._is_query_valid(query)):
@@ -141,27 +146,31 @@ class PskReporterWorker(QtCore.QThread):
         call = _callinfo.Call(element.getAttribute("senderCallsign"))
         frequency = int(element.getAttribute("frequency")) / 1000
         time = int(element.getAttribute("flowStartSeconds"))
-        mode = element.getAttribute("mode")
+        mode = sys.intern(element.getAttribute("mode"))
         snr = float(element.getAttribute("sNR")) if element.hasAttribute("sNR") else 0.0
         normalized_snr = snr if snr >= 0.0 else self.MAX_SNR + snr
 
-        return PskReporterSpot(call, frequency, time, source_call,
+        spot = PskReporterSpot(call, frequency, time, source_call,
             source_grid, mode, normalized_snr)
+        if self.dxcc:
+            spot.lookup_dxcc_info(self.dxcc)
+        return spot
 
 
 class PskReporter(QtCore.QObject):
-    spot_received = QtCore.Signal(object)
+    spots_received = QtCore.Signal(object)
 
-    def __init__(self, own_call, own_locator, parent = None):
+    def __init__(self, own_call, own_locator, dxcc = None, parent = None):
         QtCore.QObject.__init__(self, parent)
-        self.worker = PskReporterWorker(str(own_call), str(own_locator)[:2])
-        self.worker.spot_received.connect(self._spot_received)
+        self.worker = PskReporterWorker(
+            str(own_call), str(own_locator)[:2], dxcc)
+        self.worker.spots_received.connect(self._spots_received)
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.worker.start)
         self.timer.setInterval(240000)
 
-    def _spot_received(self, spot):
-        self.spot_received.emit(spot)
+    def _spots_received(self, spots):
+        self.spots_received.emit(spots)
 
     def start(self):
         self.worker.start()
@@ -176,8 +185,9 @@ class PskReporter(QtCore.QObject):
         self.worker.set_dx_call(str(dx_call))
 
 
-def print_spot(spot):
-    print(str(spot))
+def print_spots(spots):
+    for spot in spots:
+        print(str(spot))
 
 def main(args):
     app = QtGui.QApplication(sys.argv)
@@ -190,7 +200,7 @@ def main(args):
     config = _config.load_config()
 
     psk_reporter = PskReporter(config.call, config.locator)
-    psk_reporter.spot_received.connect(print_spot)
+    psk_reporter.spots_received.connect(print_spots)
     psk_reporter.set_dx_call("GM0HUU")
     psk_reporter.start()
 
@@ -0,0 +1,333 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+A columnar table of the active DX spots.
+
+Every row holds the numbers of one DxSpot in NumPy arrays, so filtering by
+band and spotter continent, finding expired spots and sorting by frequency
+are vectorized operations over all spots. The spots list links each row
+back to its DxSpotSnapshot.
+
+Rows are removed by moving the last row into their place, so the order of
+the rows is arbitrary. Use sorted_by_frequency to get the spots in order.
+
+Besides the columns, the ids of the spots are indexed by the base call of
+the DX station, by the base calls of the recent spotters and by the modes 
+the spotters reported. query uses these indexes to narrow the rows down before
+the band, frequency, continent and time masks are applied.
+
+copy returns a read-only table that shares the columns and the spots list
+with this table. The table copies them only when it is changed next, so
+publishing a table costs nothing until the next update. The read-only 
+table has no indexes, it finds the rows of a key by scanning its spots 
+once and keeps them for further queries.
+"""
+
+import math
+
+import numpy as np
+
+from . import _bandplan, _callinfo
+
+CONTINENTS = ["AF", "AN", "AS", "EU", "NA", "OC", "SA"]
+INITIAL_CAPACITY = 1024 # rows
+
+COLUMNS = [
+    ("id", np.int64),
+    ("frequency", np.float64),
+    ("timeout", np.float64),
+    ("first_seen", np.float64),
+    ("last_seen", np.float64),
+    ("source_count", np.int32),
+    ("best_snr", np.float32),
+    ("band", np.int8),
+    ("spotter_continents", np.uint8)
+]
+
+def continent_mask(continents):
+    """Return the bitmask of the given continent abbreviations."""
+    mask = 0
+    for continent in continents:
+        if continent in CONTINENTS:
+            mask |= 1 << CONTINENTS.index(continent)
+    return mask
+
+
+def base_call(call):
+    if not isinstance(call, _callinfo.Call):
+        call = _callinfo.Call(call)
+    return call.base_call
+
+def index_keys(spot):
+    """Return the keys of the given spot in the call, source call and mode 
+    index."""
+    return (spot.call.base_call, spot.spotters, spot.modes)
+
+
+def key_matches(which, keys, key):
+    """Return whether the given key is in the keys of index which (0: call,
+    1: source calls, 2: modes) returned by index_keys."""
+    return keys == key if which == 0 else key in keys
+
+
+class SpotIndex:
+    """The ids of the spots by key. 
+
+    Most keys belong to a single spot, so a key maps to the id itself and 
+    only to a set of ids when several spots share it."""
+    def __init__(self):
+        self.ids = {}
+
+    def get(self, key):
+        ids = self.ids.get(key)
+        if ids is None: return ()
+        return ids if isinstance(ids, set) else (ids,)
+
+    def add(self, key, spot_id):
+        ids = self.ids.get(key)
+        if ids is None:
+            self.ids[key] = spot_id
+        elif isinstance(ids, set):
+            ids.add(spot_id)
+        elif ids != spot_id:
+            self.ids[key] = {ids, spot_id}
+
+    def discard(self, key, spot_id):
+        ids = self.ids.get(key)
+        if ids is None: return
+        if isinstance(ids, set):
+            ids.discard(spot_id)
+            if len(ids) == 1:
+                self.ids[key] = next(iter(ids))
+        elif ids == spot_id:
+            del self.ids[key]
+
+
+class SpotTable:
+    def __init__(self, bandplan = _bandplan.IARU_REGION_1, capacity = 0):
+        self.bandplan = bandplan
+        self.band_edges = np.array([
+            edge for band in bandplan for edge in (band.from_kHz, band.to_kHz)])
+        self.size = 0
+        self.spots = []
+        self.rows_by_id = {}
+        self.keys_by_id = {}
+        self.ids_by_call = SpotIndex()
+        self.ids_by_source_call = SpotIndex()
+        self.ids_by_mode = SpotIndex()
+        self.shared = False
+        self.rows_by_key = None
+        capacity = max(capacity, INITIAL_CAPACITY)
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype))
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, spot_id):
+        if self.rows_by_id is None:
+            return bool((self.id[:self.size] == spot_id).any())
+        return spot_id in self.rows_by_id
+
+    def band_index(self, frequency):
+        """Return the index of the band in the bandplan that contains the
+        given frequency, or -1."""
+        i = int(np.searchsorted(self.band_edges, frequency, side = "right"))
+        return i // 2 if i % 2 == 1 else -1
+
+    def update(self, spot):
+        """Add the given spot or update the row of the spot with its id."""
+        self._unshare()
+        row = self.rows_by_id.get(spot.id)
+        if row is None:
+            row = self.size
+            if row == len(self.frequency):
+                self._grow()
+            self.size += 1
+            self.spots.append(spot)
+            self.rows_by_id[spot.id] = row
+        else:
+            self.spots[row] = spot
+        self._index(spot)
+        self.id[row] = spot.id
+        self.frequency[row] = spot.frequency
+        self.timeout[row] = spot.timeout
+        self.first_seen[row] = spot.first_seen
+        self.last_seen[row] = spot.last_seen
+        self.source_count[row] = spot.source_count
+        self.best_snr[row] = (spot.best_snr 
+                              if spot.best_snr is not None 
+                              else math.nan)
+        self.band[row] = self.band_index(spot.frequency)
+        self.spotter_continents[row] = spot.spotter_continents
+
+    def _index(self, spot):
+        keys = index_keys(spot)
+        old_keys = self.keys_by_id.get(spot.id)
+        if keys == old_keys: return
+        if old_keys:
+            self._unindex(spot.id, old_keys)
+        call, source_calls, modes = keys
+        self.ids_by_call.add(call, spot.id)
+        for source_call in source_calls:
+            self.ids_by_source_call.add(source_call, spot.id)
+        for mode in modes:
+            self.ids_by_mode.add(mode, spot.id)
+        self.keys_by_id[spot.id] = keys
+
+    def _unindex(self, spot_id, keys):
+        call, source_calls, modes = keys
+        self.ids_by_call.discard(call, spot_id)
+        for source_call in source_calls:
+            self.ids_by_source_call.discard(source_call, spot_id)
+        for mode in modes:
+            self.ids_by_mode.discard(mode, spot_id)
+
+    def remove(self, spot_id):
+        if spot_id not in self.rows_by_id: return
+        self._unshare()
+        row = self.rows_by_id.pop(spot_id)
+        self._unindex(spot_id, self.keys_by_id.pop(spot_id))
+        last = self.size - 1
+        if row != last:
+            moved = self.spots[last]
+            self.spots[row] = moved
+            self.rows_by_id[moved.id] = row
+            for name, dtype in COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+        self.spots.pop()
+        self.size = last
+
+    def _grow(self):
+        for name, dtype in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(max(INITIAL_CAPACITY, 2 * len(column)), dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _unshare(self):
+        """Copy the columns and the spots list before they are changed, if
+        they are shared with a read-only copy."""
+        if not self.shared: return
+        self.spots = list(self.spots)
+        for name, dtype in COLUMNS:
+            setattr(self, name, getattr(self, name).copy())
+        self.shared = False
+
+    def copy(self):
+        """Return a read-only copy of this table, to be handed to other
+        threads. It shares the columns and the spots with this table until
+        this table is changed."""
+        table = SpotTable.__new__(SpotTable)
+        table.bandplan = self.bandplan
+        table.band_edges = self.band_edges
+        table.size = self.size
+        table.spots = self.spots
+        table.rows_by_id = None
+        table.keys_by_id = None
+        table.ids_by_call = None
+        table.ids_by_source_call = None
+        table.ids_by_mode = None
+        table.shared = True
+        table.rows_by_key = {}
+        for name, dtype in COLUMNS:
+            column = getattr(self, name)[:self.size]
+            column.flags.writeable = False
+            setattr(table, name, column)
+        self.shared = True
+        return table
+
+    def _rows(self, which, key):
+        """Return the rows of the spots with the given key in index which 
+        (0: call, 1: source calls, 2: modes)."""
+        if self.rows_by_key is None:
+            index = (self.ids_by_call, self.ids_by_source_call, 
+                     self.ids_by_mode)[which]
+            return [self.rows_by_id[spot_id] for spot_id in index.get(key)]
+        rows = self.rows_by_key.get((which, key))
+        if rows is None:
+            rows = [row for row, spot in enumerate(self.spots)
+                    if key_matches(which, index_keys(spot)[which], key)]
+            self.rows_by_key[(which, key)] = rows
+        return rows
+
+    def all(self):
+        return np.ones(self.size, bool)
+
+    def in_band(self, band):
+        """Return the mask of the rows in the given band."""
+        if band in self.bandplan:
+            return self.band[:self.size] == self.bandplan.index(band)
+        frequency = self.frequency[:self.size]
+        return (frequency >= band.from_kHz) & (frequency < band.to_kHz)
+
+    def in_range(self, from_kHz, to_kHz):
+        frequency = self.frequency[:self.size]
+        return (frequency >= from_kHz) & (frequency <= to_kHz)
+
+    def spotted_from(self, continents):
+        """Return the mask of the rows with at least one source on the given
+        continents."""
+        return (self.spotter_continents[:self.size]
+                & continent_mask(continents)) != 0
+
+    def expired(self, now):
+        """Return the mask of the rows that timed out before now."""
+        return self.timeout[:self.size] < now
+
+    def select(self, mask):
+        """Return the spots of the rows in the given mask."""
+        spots = self.spots
+        return [spots[row] for row in np.flatnonzero(mask).tolist()]
+
+    def sorted_by_frequency(self, mask = None):
+        """Return the spots of the rows in the given mask, or all spots,
+        sorted by frequency."""
+        rows = (np.flatnonzero(mask)
+                if mask is not None
+                else np.arange(self.size))
+        order = rows[np.argsort(self.frequency[rows], kind = "stable")]
+        spots = self.spots
+        return [spots[row] for row in order.tolist()]
+
+    def query(
+            self, band = None, freq_range = None, spotter_continents = None, 
+            dx_call = None, source_call = None, mode = None, since = None):
+        """Return the spots that match all given criteria, sorted by 
+        frequency:
+
+        band                the spots within the given band
+        freq_range          the spots within the (from_kHz, to_kHz) range
+        spotter_continents  the spots with a source on one of the continents
+        dx_call             the spots of the call (base call only)
+        source_call         the spots with the call as recent source (base 
+                            call)
+        mode                the spots with a source that reported the mode
+        since               the spots that were seen since the given time"""
+        rows = None
+        for which, key in enumerate([
+                dx_call and base_call(dx_call),
+                source_call and base_call(source_call),
+                mode]):
+            if not key: continue
+            key_rows = self._rows(which, key)
+            rows = (set(key_rows)
+                    if rows is None
+                    else rows.intersection(key_rows))
+        if rows is None:
+            mask = self.all()
+        else:
+            mask = np.zeros(self.size, bool)
+            mask[list(rows)] = True
+
+        if band is not None:
+            mask &= self.in_band(band)
+        if freq_range is not None:
+            mask &= self.in_range(*freq_range)
+        if spotter_continents is not None:
+            mask &= self.spotted_from(spotter_continents)
+        if since is not None:
+            mask &= self.last_seen[:self.size] >= since
+        return self.sorted_by_frequency(mask)
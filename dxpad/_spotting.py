@@ -4,16 +4,32 @@
 import sys
 import time
 import re
-import telnetlib as tn
-import Levenshtein as ls
+import bisect
+import heapq
+import itertools
+import asyncio
+import collections
 
 from PySide import QtCore, QtGui
 
-from . import _dxcc, _config, _grid, _callinfo, _time
+from . import _dxcc, _config, _grid, _callinfo, _time, _metrics, _spottable, \
+              _clusterfilter
 
 FREQUENCY_WINDOW = 10.0 #kHz
+BATCH_SIZE = 100 # spots
+BATCH_DELAY = 0.1 # seconds
+CLEANUP_INTERVAL = 1000 # milliseconds
+SPOT_QUEUE_DEPTH = "spot_queue_depth" # spots delivered, but not aggregated
+DUPLICATE_FREQUENCY_TOLERANCE = 1.0 # kHz
+DUPLICATE_TIME_TOLERANCE = 60 # seconds
+DUPLICATE_MAX_AGE = 120 # seconds
+DUPLICATE_MAX_SIZE = 20000 # spots
 
 class Spot:
+    __slots__ = (
+        "ttl", "call", "frequency", "time", "source_call", "source_grid", 
+        "source_dxcc_info", "dxcc_info")
+
     def __init__(self, ttl, call, frequency, time, source_call, source_grid):
         self.ttl = ttl
         self.call = call
@@ -22,6 +38,13 @@ class Spot:
         self.source_call = source_call
         self.source_grid = source_grid
         self.source_dxcc_info = None
+        self.dxcc_info = None
+
+    def lookup_dxcc_info(self, dxcc):
+        """Look up the DXCC info of the DX and the source call. This is done 
+        in the worker threads, right after parsing."""
+        self.dxcc_info = dxcc.find_dxcc_info(self.call)
+        self.source_dxcc_info = dxcc.find_dxcc_info(self.source_call)
 
     def __str__(self):
         return ("source({}, {}, {}) spot({}, {}, {}, {})"
@@ -31,6 +54,7 @@ class Spot:
 
 
 class ClusterSpot(Spot):
+    __slots__ = ("comment",)
     TTL = 300
     def __init__(
             self, call, frequency, time, source_call, source_grid, comment):
@@ -43,6 +67,7 @@ class ClusterSpot(Spot):
 
 
 class RbnSpot(Spot):
+    __slots__ = ("mode", "snr", "speed", "rbnType")
     TTL = 60
     def __init__(
             self, call, frequency, time, source_call, source_grid, mode, snr, 
@@ -59,67 +84,183 @@ class RbnSpot(Spot):
             .format(Spot.__str__(self), self.mode, self.snr, self.speed, 
                 self.rbnType))
 
-class TelnetClient:
+TELNET_IAC = 255
+TELNET_DONT = 254
+TELNET_DO = 253
+TELNET_WONT = 252
+TELNET_WILL = 251
+TELNET_SB = 250
+TELNET_SE = 240
+
+def strip_telnet_commands(data):
+    """Split raw telnet bytes into the payload, the replies to send and the
+    unprocessed rest of an incomplete command at the end.
+
+    All options are refused like telnetlib did: DO is answered with WONT and
+    WILL with DONT, subnegotiations are skipped."""
+    payload = bytearray()
+    replies = bytearray()
+    i = 0
+    while i < len(data):
+        iac = data.find(TELNET_IAC, i)
+        if iac == -1:
+            payload += data[i:]
+            break
+        payload += data[i:iac]
+        if iac + 1 >= len(data):
+            return bytes(payload), bytes(replies), data[iac:]
+        command = data[iac + 1]
+        if command == TELNET_IAC:
+            payload.append(TELNET_IAC)
+            i = iac + 2
+        elif command in (TELNET_DO, TELNET_DONT, TELNET_WILL, TELNET_WONT):
+            if iac + 2 >= len(data):
+                return bytes(payload), bytes(replies), data[iac:]
+            option = data[iac + 2]
+            if command == TELNET_DO:
+                replies += bytes([TELNET_IAC, TELNET_WONT, option])
+            elif command == TELNET_WILL:
+                replies += bytes([TELNET_IAC, TELNET_DONT, option])
+            i = iac + 3
+        elif command == TELNET_SB:
+            end = data.find(bytes([TELNET_IAC, TELNET_SE]), iac + 2)
+            if end == -1:
+                return bytes(payload), bytes(replies), data[iac:]
+            i = end + 2
+        else:
+            i = iac + 2
+    return bytes(payload), bytes(replies), b""
+
+
+class ClusterConnection:
+    """The connection to one telnet cluster, driven by the event loop of a
+    ClusterEngine. Use it as the client of a ClusterSpotter, its run method
+    is a coroutine.
+
+    With a cluster_filter (see _clusterfilter) and a software other than 
+    "none", the filter commands for the node's software are sent as soon as
+    the node shows its prompt after the login. With software = "auto", the
+    software is detected from the greeting of the node."""
     ENCODING = "latin_1"
+    READ_SIZE = 4096
+    CALL_PROMPTS = ["Please enter your call: ", "callsign: ", "login: "]
+    PASSWORD_PROMPTS = ["password: "]
+    GREETING_LINES = 50
 
-    def __init__(self, hostname, port, call, password = ""):
+    def __init__(
+            self, hostname, port, call, password = "", cluster_filter = None,
+            software = _clusterfilter.NONE):
         self.hostname = hostname
         self.port = port
         self.call = call
         self.password = password
+        self.cluster_filter = cluster_filter
+        self.software = software
         self.running = False
         self.connected = False
+        self.writer = None
+        self.greeting = []
+        self.filter_sent = False
 
-    def run(self, line_callback):
+    async def run(self, line_callback):
         self.running = True
 
         while self.running:
-            telnet = self._connect()
-            if not telnet:
+            reader, self.writer = await self._connect()
+            if not reader:
                 self.running = False 
                 return
             self.connected = True
+            self.greeting = []
+            self.filter_sent = False
+            try:
+                await self._read_lines(reader, line_callback)
+            finally:
+                self.writer.close()
+                self.writer = None
+                print("Disconnected from {}:{}".format(
+                    self.hostname, self.port))
+
+    async def _read_lines(self, reader, line_callback):
+        raw = b""
+        buffer = b""
+        while self.running and self.connected:
+            try:
+                data = await reader.read(self.READ_SIZE)
+            except (ConnectionError, OSError):
+                data = b""
+            if not data:
+                self.connected = False
+                if self.running:
+                    print("Connection closed by {}:{}!".format(
+                        self.hostname, self.port))
+                return
 
-            buffer = ""
-            while self.running and self.connected:
-                try:
-                    buffer += telnet.read_until(b"\n", 1).decode(self.ENCODING)
-                except EOFError:
-                    self.connected = False
-                    print("Connection closed by {}:{}!".format(self.hostname, self.port))
-                    break
-
-                line = ""
-                while buffer.find("\n") != -1:
-                    line, buffer = buffer.split("\n", 1)
-                    line_callback(line)
-                    
-                if line.strip() == "Please enter your call:":
-                    telnet.write(str(self.call + "\n").encode(self.ENCODING))
-                if buffer.endswith("Please enter your call: "):
-                    telnet.write(str(self.call + "\n").encode(self.ENCODING))
-                if buffer.endswith("callsign: "):
-                    telnet.write(str(self.call + "\n").encode(self.ENCODING))
-                if buffer.endswith("login: "):
-                    telnet.write(str(self.call + "\n").encode(self.ENCODING))
-                if buffer.endswith("password: "):
-                    telnet.write(str(self.password + "\n").encode(self.ENCODING))
-
-            telnet.close()
-            print("Disconnected from {}:{}".format(self.hostname, self.port))
-
-    def _connect(self):
+            payload, replies, raw = strip_telnet_commands(raw + data)
+            if replies:
+                self.writer.write(replies)
+
+            lines = (buffer + payload).split(b"\n")
+            buffer = lines.pop()
+            lines = [line.decode(self.ENCODING) for line in lines]
+            for line in lines:
+                line_callback(line)
+            if not self.connected: 
+                return
+
+            last_line = lines[-1] if lines else ""
+            self._answer_prompts(last_line, buffer.decode(self.ENCODING))
+            self._send_filter(lines, buffer.decode(self.ENCODING))
+
+    def _answer_prompts(self, last_line, buffer):
+        if last_line.strip() == "Please enter your call:":
+            self._send(self.call)
+        if any(buffer.endswith(prompt) for prompt in self.CALL_PROMPTS):
+            self._send(self.call)
+        if any(buffer.endswith(prompt) for prompt in self.PASSWORD_PROMPTS):
+            self._send(self.password)
+
+    def _send_filter(self, lines, buffer):
+        if self.filter_sent or not self.cluster_filter: return
+        self.greeting = (self.greeting + lines)[-self.GREETING_LINES:]
+        last_line = lines[-1] if lines else ""
+        prompt = next(
+            (text for text in (buffer, last_line) 
+             if _clusterfilter.is_login_prompt(text, self.call)), 
+            None)
+        if not prompt: return
+
+        self.filter_sent = True
+        software = self.software
+        if software == _clusterfilter.AUTO:
+            software = _clusterfilter.detect_software(
+                "\n".join(self.greeting + [prompt]))
+        commands = self.cluster_filter.commands(software)
+        for command in commands:
+            self._send(command)
+        if commands:
+            print("Sent {} filter to {}:{}".format(
+                software, self.hostname, self.port))
+
+    def _send(self, text):
+        self.writer.write(str(text + "\n").encode(self.ENCODING))
+
+    async def _connect(self):
         try:
-            telnet = tn.Telnet(self.hostname, self.port)
+            reader, writer = await asyncio.open_connection(
+                self.hostname, self.port)
             print("Connected to {}:{}".format(self.hostname, self.port))
-            return telnet
-        except:
+            return reader, writer
+        except OSError:
             print("Cannot connect to {}:{}".format(self.hostname, self.port))
-            return None
-
+            return None, None
 
     def stop(self):
+        """Stop the connection, call this from the event loop's thread."""
         self.running = False
+        self.connected = False
+        if self.writer:
+            self.writer.close()
 
 
 class TextfileClient:
@@ -140,6 +281,72 @@ class TextfileClient:
         self.running = False
 
 
+class ReplayClient:
+    """Replays a recorded file (see ClusterSpotter.record) with the recorded
+    timing. The HHMMZ of every spot line sets the given VirtualClock, so the
+    spots get their recorded time and expire like they did live.
+
+    speed is the factor of the replay, e.g. 1.0 for real time or 10.0; with 
+    speed None the lines are replayed as fast as possible. The recorded
+    file only contains the time of the day, day is any timestamp of the UTC
+    day on which the recording starts (default today). before_advance is
+    called with the later recorded time before the clock moves on to it, 
+    e.g. to deliver the spots of the previous minute."""
+    _time_expression = re.compile(r'\s([0-2][0-9])([0-5][0-9])Z')
+    MAX_SLEEP = 0.1 # seconds
+
+    def __init__(self, filename, clock, speed = 1.0, day = None):
+        self.filename = filename
+        self.clock = clock
+        self.speed = speed
+        day = day if day is not None else time.time()
+        self.day_start = day - day % 86400
+        self.before_advance = None
+        self.running = False
+
+    def run(self, line_callback):
+        self.running = True
+        with open(self.filename) as f:
+            for line in f:
+                if not self.running: break
+                self.advance(line)
+                line_callback(line)
+        self.running = False
+
+    def advance(self, line):
+        """Set the clock to the recorded time of the given line and wait 
+        according to the speed."""
+        timestamp = self.recorded_time(line)
+        if timestamp is None: return
+        delay = timestamp - self.clock.time()
+        if delay > 0 and self.before_advance:
+            self.before_advance(timestamp)
+        if self.speed and delay > 0 and self.clock.time() > 0:
+            self._sleep(delay / self.speed)
+        self.clock.set(timestamp)
+
+    def recorded_time(self, line):
+        if not line.startswith(ClusterSpotter.SPOT_PREFIX): return None
+        match = self._time_expression.search(line)
+        if not match: return None
+        timestamp = (self.day_start 
+                     + int(match.group(1)) * 3600 + int(match.group(2)) * 60)
+        while timestamp < self.clock.time() - 12 * 3600:
+            self.day_start += 86400
+            timestamp += 86400
+        return timestamp
+
+    def _sleep(self, seconds):
+        end = time.monotonic() + seconds
+        while self.running:
+            remaining = end - time.monotonic()
+            if remaining <= 0: break
+            time.sleep(min(remaining, self.MAX_SLEEP))
+
+    def stop(self):
+        self.running = False
+
+
 class FastTextfileClient:
     def __init__(self, filename):
         self.filename = filename
@@ -151,15 +358,30 @@ class FastTextfileClient:
 
 
 class ClusterSpotter:
-    _spot_expression = re.compile(r'DX de ([A-Z0-9/]+)(-.+?)?:?\s*([0-9]+\.[0-9]+)\s+([A-Z0-9/]+)\s+(.+?)\s([0-9]{4})Z(\s+([A-Z]{2}[0-9]{2}))?')
+    SPOT_PREFIX = "DX de "
+    _spot_expression = re.compile(r'([A-Z0-9/]+)(-.+?)?:?\s*([0-9]+\.[0-9]+)\s+([A-Z0-9/]+)\s+(.+?)\s([0-9]{4})Z(\s+([A-Z]{2}[0-9]{2}))?')
     _rbn_comment_expression = re.compile(r'([A-Z0-9]+)\s+([0-9]+) dB\s+([0-9]+) (WPM|BPS)\s+(.*)\s*')
 
-    def __init__(self, client):
+    def __init__(self, client, dxcc = None, clock = _time.WALL_CLOCK):
         self.client = client
+        self.dxcc = dxcc
+        self.clock = clock
         self.record = False
+        self.lines_received = _metrics.METRICS.counter(
+            "lines_received." + self._client_name(client))
+        self.parse_failures = _metrics.METRICS.counter("parse_failures")
+
+    @staticmethod
+    def _client_name(client):
+        if hasattr(client, "hostname"):
+            return "{}:{}".format(client.hostname, client.port)
+        return str(getattr(client, "filename", None))
 
     def run(self, spot_callback):
-        self.client.run(lambda line: self._line_received(line, spot_callback))
+        """Run the client. If the client runs in an event loop, this returns
+        the coroutine to await."""
+        return self.client.run(
+            lambda line: self._line_received(line, spot_callback))
 
     def stop(self):
         self.client.stop()
@@ -168,226 +390,962 @@ class ClusterSpotter:
         return self.client.running
 
     def _line_received(self, line, spot_callback):
+        self.count_line(line)
+        spot = self.parse_line(line, self.clock.time())
+        if not spot: 
+            if line.startswith(self.SPOT_PREFIX):
+                self.parse_failures.inc()
+            return
+        if self.dxcc:
+            spot.lookup_dxcc_info(self.dxcc)
+        spot_callback(spot)
+
+    def count_line(self, line):
+        """Count and record the given line, without parsing it."""
         if self.record:
             with open("rbn.txt", "a") as f:
                 f.write(line)
+        self.lines_received.inc()
+
+    @staticmethod
+    def parse_line(line, timestamp = None):
+        """Return the spot in the given cluster line or None. The spot gets
+        the given timestamp, by default the current time.
 
-        spot_match = self._spot_expression.match(line)
+        Announcements, WCY, talk and other lines that do not start with
+        "DX de " are rejected without running any regular expression."""
+        if not line.startswith(ClusterSpotter.SPOT_PREFIX):
+            return None
+
+        spot_match = ClusterSpotter._spot_expression.match(
+            line, len(ClusterSpotter.SPOT_PREFIX))
         if not spot_match:
-            print(line)
-            return
+            return None
 
-        if not _callinfo.Call.is_valid_call(spot_match.group(4)):
-            print(line)
-            return
+        call = _callinfo.Call.parse(spot_match.group(4))
+        if not call:
+            return None
+        source_call = _callinfo.Call.parse(spot_match.group(1))
+        if not source_call:
+            return None
 
-        if not _callinfo.Call.is_valid_call(spot_match.group(1)):
-            print(line)
-            return
-        
-        call = _callinfo.Call(spot_match.group(4))
         frequency = float(spot_match.group(3))
-        timestamp = time.time()
-        source_call = _callinfo.Call(spot_match.group(1))
+        timestamp = timestamp if timestamp is not None else time.time()
         source_grid = (_grid.Locator(spot_match.group(8))
                        if spot_match.group(8)
                        else None)
         comment = spot_match.group(5).strip()
 
-        rbn_comment_match = self._rbn_comment_expression.match(comment)
+        rbn_comment_match = ClusterSpotter._rbn_comment_expression.match(
+            comment)
         if rbn_comment_match:
-            mode = rbn_comment_match.group(1)
+            mode = sys.intern(rbn_comment_match.group(1))
             snr = float(rbn_comment_match.group(2))
-            speed = rbn_comment_match.group(3)
-            rbnType = rbn_comment_match.group(5)
-            spot = RbnSpot(
+            speed = sys.intern(rbn_comment_match.group(3))
+            rbnType = sys.intern(rbn_comment_match.group(5))
+            return RbnSpot(
                 call, frequency, timestamp, source_call, source_grid, mode, 
                 snr, speed, rbnType)
         else:
-            spot = ClusterSpot(
+            return ClusterSpot(
                 call, frequency, timestamp, source_call, source_grid, comment)
-        spot_callback(spot)
+
+
+class SpotBatcher:
+    """Collects spots and delivers them as a list, when the batch is full or
+    when its first spot is older than max_delay."""
+    def __init__(
+            self, deliver, max_size = BATCH_SIZE, max_delay = BATCH_DELAY,
+            clock = time.monotonic):
+        self.deliver = deliver
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.clock = clock
+        self.spots = []
+        self.first_added = 0
+
+    def __len__(self):
+        return len(self.spots)
+
+    def add(self, spot):
+        if not self.spots:
+            self.first_added = self.clock()
+        self.spots.append(spot)
+        if len(self.spots) >= self.max_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self.spots and self.clock() - self.first_added >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if not self.spots: return
+        spots = self.spots
+        self.spots = []
+        self.deliver(spots)
 
 
 class SpottingThread(QtCore.QThread):
-    spot_received = QtCore.Signal(object)
+    """Runs a ClusterSpotter in its own thread. When it replays a recording,
+    clock_advanced is emitted with every later recorded time, after the 
+    spots of the previous time were delivered."""
+    spots_received = QtCore.Signal(object)
+    clock_advanced = QtCore.Signal(float)
 
-    def __init__(self, client, parent = None):
+    def __init__(
+            self, client, dxcc = None, clock = _time.WALL_CLOCK, 
+            parent = None):
         QtCore.QThread.__init__(self, parent)
-        self.spotter = ClusterSpotter(client)
+        self.spotter = ClusterSpotter(client, dxcc, clock)
 
     @staticmethod
-    def telnet(hostname, port, call, password = ""):
-        client = TelnetClient(hostname, port, call, password)
-        return SpottingThread(client)
+    def textfile(filename, dxcc = None):
+        client = TextfileClient(filename)
+        return SpottingThread(client, dxcc)
 
     @staticmethod
-    def textfile(filename):
-        client = TextfileClient(filename)
-        return SpottingThread(client)
+    def replay(filename, clock, speed = 1.0, dxcc = None):
+        client = ReplayClient(filename, clock, speed)
+        return SpottingThread(client, dxcc, clock)
 
     def run(self):
-        self.spotter.run(lambda spot: self.spot_received.emit(spot))
+        self.batcher = SpotBatcher(self._emit_spots)
+        if isinstance(self.spotter.client, ReplayClient):
+            self.spotter.client.before_advance = self._before_advance
+        self.spotter.run(self.batcher.add)
+        self.batcher.flush()
+
+    def _before_advance(self, timestamp):
+        self.batcher.flush()
+        self.clock_advanced.emit(timestamp)
+
+    def _emit_spots(self, spots):
+        _metrics.METRICS.gauge(SPOT_QUEUE_DEPTH).add(len(spots))
+        self.spots_received.emit(spots)
 
     @QtCore.Slot()
     def stop(self):
         self.spotter.stop()
 
 
+class ClusterEngine(QtCore.QThread):
+    """Follows all telnet clusters in one thread with one asyncio event 
+    loop. The spots of all clusters are delivered in batches.
+
+    With a parsing_pool (see _parsing.ParsingPool), the lines are parsed in
+    worker processes instead of the engine's thread."""
+    spots_received = QtCore.Signal(object)
+
+    def __init__(self, dxcc = None, parsing_pool = None, parent = None):
+        QtCore.QThread.__init__(self, parent)
+        self.dxcc = dxcc
+        self.parsing_pool = parsing_pool
+        self.spotters = []
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.stopped = False
+
+    def add_cluster(
+            self, hostname, port, call, password = "", cluster_filter = None,
+            software = _clusterfilter.NONE):
+        """Add a cluster before the engine is started."""
+        connection = ClusterConnection(
+            hostname, port, call, password, cluster_filter, software)
+        spotter = ClusterSpotter(connection, self.dxcc)
+        self.spotters.append(spotter)
+        return spotter
+
+    def run(self):
+        try:
+            if self.stopped: return
+            self.task = self.loop.create_task(self._run_spotters())
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def _run_spotters(self):
+        batcher = SpotBatcher(self._emit_spots)
+        batchers = [batcher]
+        if self.parsing_pool:
+            runs = [self.parsing_pool.run_spotter(spotter, batcher.add, batchers)
+                    for spotter in self.spotters]
+        else:
+            runs = [spotter.run(batcher.add) for spotter in self.spotters]
+        flusher = asyncio.ensure_future(self._flush_periodically(batchers))
+        try:
+            await asyncio.gather(*runs)
+        finally:
+            flusher.cancel()
+            batcher.flush()
+
+    async def _flush_periodically(self, batchers):
+        while True:
+            await asyncio.sleep(BATCH_DELAY)
+            for batcher in batchers:
+                batcher.flush_if_due()
+
+    def _emit_spots(self, spots):
+        _metrics.METRICS.gauge(SPOT_QUEUE_DEPTH).add(len(spots))
+        self.spots_received.emit(spots)
+
+    @QtCore.Slot()
+    def stop(self):
+        self.stopped = True
+        try:
+            self.loop.call_soon_threadsafe(self._stop_spotters)
+        except RuntimeError:
+            pass # the loop is already closed
+
+    def _stop_spotters(self):
+        for spotter in self.spotters:
+            spotter.stop()
+        if self.task:
+            self.task.cancel()
+
+
 class DxSpot:
+    """The aggregated spots of one call on one frequency.
+
+    Instead of all source spots, a DxSpot keeps a summary of them: the 
+    number of source spots and spotters, the best and average SNR, the 
+    continents of the spotters as bitmask and the modes they reported.
+    Only the last RECENT_SOURCES source spots and the base calls of the last
+    RECENT_SPOTTERS distinct spotters are kept for the details. 
+
+    A spotter that reports again after it was pushed out of the recent 
+    spotters is counted again, so spotter_count is exact only up to 
+    RECENT_SPOTTERS spotters. The spotters and modes are tuples that are
+    replaced instead of changed, so snapshots share them."""
+    __slots__ = (
+        "id", "call", "frequency", "dxcc_info", "sources", "source_count",
+        "spotters", "spotter_count", "best_snr", "snr_sum", "snr_count", 
+        "spotter_continents", "modes", "timeout", "first_seen", "last_seen")
+    _ids = itertools.count(1)
+    RECENT_SOURCES = 10
+    RECENT_SPOTTERS = 16
+
     def __init__(self, call, frequency, dxcc_info):
+        self.id = next(DxSpot._ids)
         self.call = call
         self.frequency = frequency
         self.dxcc_info = dxcc_info
-        self.sources = set([])
+        self.sources = []
+        self.source_count = 0
+        self.spotters = ()
+        self.spotter_count = 0
+        self.best_snr = None
+        self.snr_sum = 0.0
+        self.snr_count = 0
+        self.spotter_continents = 0
+        self.modes = ()
         self.timeout = 0
-        self.first_seen = time.time()
+        self.first_seen = None
         self.last_seen = 0
 
     def __str__(self):
-        return "{0:<10} on {1:>8.1f} kHz, timeout in {2:3.0f}, sources: {3:>2.0f}".format(str(self.call), self.frequency, self.timeout - time.time(), len(self.sources))
+        return "{0:<10} on {1:>8.1f} kHz, timeout in {2:3.0f}, sources: {3:>2.0f}".format(str(self.call), self.frequency, self.timeout - time.time(), self.source_count)
 
     def add_source(self, source_spot):
-        self.sources.add(source_spot)
+        self.sources.append(source_spot)
+        if len(self.sources) > self.RECENT_SOURCES:
+            del self.sources[0]
+        self.source_count += 1
+        self._add_spotter(source_spot.source_call.base_call)
+        snr = getattr(source_spot, "snr", None)
+        if snr is not None:
+            self.best_snr = (snr 
+                             if self.best_snr is None 
+                             else max(self.best_snr, snr))
+            self.snr_sum += snr
+            self.snr_count += 1
+        if source_spot.source_dxcc_info:
+            self.spotter_continents |= _spottable.continent_mask(
+                [source_spot.source_dxcc_info.continent])
+        mode = getattr(source_spot, "mode", None)
+        if mode and mode not in self.modes:
+            self.modes += (mode,)
         if self.frequency != source_spot.frequency:
             self.frequency = (self.frequency + source_spot.frequency) / 2
         self.timeout = max(self.timeout, source_spot.time + source_spot.ttl)
-        self.first_seen = min(self.first_seen, source_spot.time)
+        self.first_seen = (source_spot.time
+                           if self.first_seen is None
+                           else min(self.first_seen, source_spot.time))
         self.last_seen = max(self.last_seen, source_spot.time)
 
+    def _add_spotter(self, spotter):
+        if spotter in self.spotters: return
+        self.spotters = self.spotters[1 - self.RECENT_SPOTTERS:] + (spotter,)
+        self.spotter_count += 1
+
     def merge(self, spot):
-        self.sources.update(spot.sources)
+        self.sources = sorted(
+            self.sources + spot.sources, 
+            key = lambda source: source.time)[-self.RECENT_SOURCES:]
+        self.source_count += spot.source_count
+        new_spotters = tuple(
+            spotter for spotter in spot.spotters 
+            if spotter not in self.spotters)
+        self.spotter_count += (
+            spot.spotter_count - len(spot.spotters) + len(new_spotters))
+        self.spotters = (
+            self.spotters + new_spotters)[-self.RECENT_SPOTTERS:]
+        if spot.best_snr is not None:
+            self.best_snr = (spot.best_snr 
+                             if self.best_snr is None 
+                             else max(self.best_snr, spot.best_snr))
+        self.snr_sum += spot.snr_sum
+        self.snr_count += spot.snr_count
+        self.spotter_continents |= spot.spotter_continents
+        self.modes += tuple(
+            mode for mode in spot.modes if mode not in self.modes)
         self.timeout = max(self.timeout, spot.timeout)
         self.first_seen = min(self.first_seen, spot.first_seen)
         self.last_seen = max(self.last_seen, spot.last_seen)
 
+    def average_snr(self):
+        return self.snr_sum / self.snr_count if self.snr_count else None
+
+    def snapshot(self):
+        return DxSpotSnapshot(
+            self.id, self.call, self.frequency, self.dxcc_info, 
+            tuple(self.sources), self.source_count, self.spotters,
+            self.spotter_count, self.best_snr, self.average_snr(), 
+            self.spotter_continents, self.modes, self.timeout, 
+            self.first_seen, self.last_seen)
+
+
+class DxSpotSnapshot(collections.namedtuple("DxSpotSnapshot", [
+        "id", "call", "frequency", "dxcc_info", "sources", "source_count",
+        "spotters", "spotter_count", "best_snr", "average_snr", 
+        "spotter_continents", "modes", "timeout", "first_seen", 
+        "last_seen"])):
+    """An immutable copy of a DxSpot. Only snapshots leave the aggregation
+    thread, so the GUI never sees a DxSpot while it is changed."""
+    __slots__ = ()
+
+    def __str__(self):
+        return DxSpot.__str__(self)
+
+
+MORSE_CODE = {
+    "A": ".-", "B": "-...", "C": "-.-.", "D": "-..", "E": ".", "F": "..-.", 
+    "G": "--.", "H": "....", "I": "..", "J": ".---", "K": "-.-", "L": ".-..", 
+    "M": "--", "N": "-.", "O": "---", "P": ".--.", "Q": "--.-", "R": ".-.", 
+    "S": "...", "T": "-", "U": "..-", "V": "...-", "W": ".--", "X": "-..-", 
+    "Y": "-.--", "Z": "--..", "0": "-----", "1": ".----", "2": "..---", 
+    "3": "...--", "4": "....-", "5": ".....", "6": "-....", "7": "--...", 
+    "8": "---..", "9": "----.", "/": "-..-."
+}
+
+def _edit_distance(a, b):
+    previous_row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a):
+        row = [i + 1]
+        for j, char_b in enumerate(b):
+            row.append(min(
+                previous_row[j + 1] + 1, 
+                row[j] + 1, 
+                previous_row[j] + (char_a != char_b)))
+        previous_row = row
+    return previous_row[-1]
+
+def _cw_confusion_costs():
+    """The cost to confuse two characters in CW is the number of dits and 
+    dahs that need to be inserted, deleted or flipped to get from one to the 
+    other, e.g. E/I/S/H or T/M/O cost 1, A/N cost 2."""
+    return {
+        (a, b): _edit_distance(code_a, code_b)
+        for a, code_a in MORSE_CODE.items()
+        for b, code_b in MORSE_CODE.items()}
+
+CW_CONFUSION_COSTS = _cw_confusion_costs()
+
+
+class BustedCallIndex:
+    """An index from each active base call to the other active base calls 
+    that are likely busted copies of it, e.g. due to skimmer errors.
+
+    A call is a busted variant of another call if it differs by one inserted
+    or deleted character, or by one substituted character that is easily 
+    confused in CW (see CW_CONFUSION_COSTS). 
+
+    To find the variants of a new call by hash lookups, every call is indexed
+    under its deletion neighbourhood: the call itself, and the call with each
+    single character removed, with and without the position of the removed
+    character. Two calls that share such a key are one edit apart. The 
+    variants of each call are kept up to date when calls are added or 
+    removed, so looking up the variants of a call is a single dict access.
+
+    Most keys belong to only one call, so the keys are plain strings and 
+    map to the call itself; only keys that are shared by several calls map
+    to a set of calls. Calls without variants have no entry in variants."""
+    MAX_BUST_COST = 1
+
+    def __init__(self):
+        self.references = {}
+        self.calls_by_key = {}
+        self.variants = {}
+
+    def __len__(self):
+        return len(self.references)
+
+    def __contains__(self, call):
+        return call in self.references
+
+    def add(self, call):
+        """Add a reference to the given base call."""
+        if call in self.references:
+            self.references[call] += 1
+            return
+        self.references[call] = 1
+
+        variants = self._find_variants(call)
+        if variants:
+            self.variants[call] = variants
+        for variant in variants:
+            self.variants.setdefault(variant, set()).add(call)
+        calls_by_key = self.calls_by_key
+        for key in self._keys(call):
+            calls = calls_by_key.get(key)
+            if calls is None:
+                calls_by_key[key] = call
+            elif isinstance(calls, str):
+                calls_by_key[key] = {calls, call}
+            else:
+                calls.add(call)
+
+    def remove(self, call):
+        """Remove a reference to the given base call. The call is removed from
+        the index when it is not referenced anymore."""
+        self.references[call] -= 1
+        if self.references[call] > 0: return
+        del self.references[call]
+
+        for variant in self.variants.pop(call, ()):
+            variants = self.variants[variant]
+            variants.discard(call)
+            if not variants:
+                del self.variants[variant]
+        calls_by_key = self.calls_by_key
+        for key in self._keys(call):
+            calls = calls_by_key[key]
+            if isinstance(calls, str):
+                del calls_by_key[key]
+                continue
+            calls.discard(call)
+            if len(calls) == 1:
+                calls_by_key[key] = calls.pop()
+
+    def similar_calls(self, call):
+        """Return the given call and its busted variants."""
+        if call in self.references:
+            variants = set(self.variants.get(call, ()))
+        else:
+            variants = self._find_variants(call)
+        variants.add(call)
+        return variants
+
+    def _keys(self, call):
+        keys = set(["=" + call])
+        for i in range(len(call)):
+            deleted = call[:i] + call[i + 1:]
+            keys.add("-" + deleted)
+            keys.add("{}~{}".format(i, deleted))
+        return keys
+
+    def _calls(self, key):
+        calls = self.calls_by_key.get(key, ())
+        return (calls,) if isinstance(calls, str) else calls
+
+    def _find_variants(self, call):
+        variants = set()
+        for i in range(len(call)):
+            deleted = call[:i] + call[i + 1:]
+            variants.update(self._calls("=" + deleted))
+            for other_call in self._calls("{}~{}".format(i, deleted)):
+                cost = CW_CONFUSION_COSTS.get(
+                    (call[i], other_call[i]), self.MAX_BUST_COST + 1)
+                if cost <= self.MAX_BUST_COST:
+                    variants.add(other_call)
+        variants.update(self._calls("-" + call))
+        variants.discard(call)
+        return variants
+
+
+class SpotDelta:
+    """The snapshots of the DxSpots that were added, changed or expired since
+    the last update.
+
+    A DxSpot keeps its id for its whole lifetime, consumers should use the id 
+    to keep track of the spots they received before. The table is a 
+    read-only _spottable.SpotTable of all active spots after this update."""
+    def __init__(self, added, changed, expired, table = None):
+        self.added = added
+        self.changed = changed
+        self.expired = expired
+        self.table = table
+        self.created = time.monotonic()
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.expired)
+
+    def __str__(self):
+        return "delta(added: {}, changed: {}, expired: {})".format(
+            len(self.added), len(self.changed), len(self.expired))
+
+
+class FrequencyIndex:
+    """A sequence of spots, kept sorted by frequency."""
+    def __init__(self):
+        self.frequencies = []
+        self.spots = []
+
+    def __len__(self):
+        return len(self.spots)
+
+    def __iter__(self):
+        return iter(self.spots)
+
+    def __getitem__(self, index):
+        return self.spots[index]
+
+    def add(self, spot):
+        index = bisect.bisect_right(self.frequencies, spot.frequency)
+        self.frequencies.insert(index, spot.frequency)
+        self.spots.insert(index, spot)
+
+    def remove(self, spot):
+        index = self._index_of(spot)
+        if index < 0:
+            raise ValueError("{} is not in the index.".format(spot))
+        del self.frequencies[index]
+        del self.spots[index]
+
+    def __contains__(self, spot):
+        return self._index_of(spot) >= 0
+
+    def _index_of(self, spot):
+        index = bisect.bisect_left(self.frequencies, spot.frequency)
+        while index < len(self.spots) \
+                and self.frequencies[index] == spot.frequency:
+            if self.spots[index] is spot:
+                return index
+            index += 1
+        return -1
+
+    def find(self, frequency, window = FREQUENCY_WINDOW):
+        """Return the spot closest to the given frequency, if it is within the
+        given window."""
+        index = bisect.bisect_left(self.frequencies, frequency)
+        closest = None
+        for i in (index - 1, index):
+            if i < 0 or i >= len(self.spots): continue
+            distance = abs(self.frequencies[i] - frequency)
+            if distance <= window and (not closest or distance < closest[0]):
+                closest = (distance, self.spots[i])
+        return closest[1] if closest else None
+
+    def in_range(self, from_kHz, to_kHz):
+        start = bisect.bisect_left(self.frequencies, from_kHz)
+        end = bisect.bisect_right(self.frequencies, to_kHz)
+        return self.spots[start:end]
+
+
+class SpotStore:
+    """The DxSpots by call, the spots of each call sorted by frequency, and
+    by base call.
+
+    The frequency of a DxSpot is part of the index, use add_source to add a
+    source spot to a DxSpot that is already in the store."""
+    def __init__(self, spots = []):
+        self.spots_by_call = {}
+        self.spots_by_base_call = {}
+        self.all_spots = FrequencyIndex()
+        for spot in spots:
+            self.add(spot)
+
+    def __len__(self):
+        return len(self.spots_by_call)
+
+    def __iter__(self):
+        return iter(self.spots_by_call)
+
+    def __contains__(self, call):
+        return call in self.spots_by_call
+
+    def __getitem__(self, call):
+        return self.spots_by_call[call]
+
+    def contains_spot(self, spot):
+        if not spot.call in self.spots_by_call: return False
+        return spot in self.spots_by_call[spot.call]
+
+    def find(self, call, frequency, window = FREQUENCY_WINDOW):
+        if not call in self.spots_by_call: return None
+        return self.spots_by_call[call].find(frequency, window)
+
+    def add(self, spot):
+        if not spot.call in self.spots_by_call:
+            self.spots_by_call[spot.call] = FrequencyIndex()
+        self.spots_by_call[spot.call].add(spot)
+        self.spots_by_base_call.setdefault(spot.call.base_call, []).append(spot)
+        self.all_spots.add(spot)
+
+    def remove(self, spot):
+        spots_by_call = self.spots_by_call[spot.call]
+        spots_by_call.remove(spot)
+        if not spots_by_call:
+            del self.spots_by_call[spot.call]
+        spots_by_base_call = self.spots_by_base_call[spot.call.base_call]
+        spots_by_base_call.remove(spot)
+        if not spots_by_base_call:
+            del self.spots_by_base_call[spot.call.base_call]
+        self.all_spots.remove(spot)
+
+    def add_source(self, spot, source_spot):
+        if spot.frequency == source_spot.frequency:
+            spot.add_source(source_spot)
+            return
+        self.remove(spot)
+        spot.add_source(source_spot)
+        self.add(spot)
+
+    def in_range(self, from_kHz, to_kHz):
+        """Return all spots within the given frequency range, regardless of 
+        their call, sorted by frequency."""
+        return self.all_spots.in_range(from_kHz, to_kHz)
+
+    def near(self, base_call, frequency, window = FREQUENCY_WINDOW):
+        """Return the spots of the given base call within the window around
+        the frequency."""
+        return [spot for spot in self.spots_by_base_call.get(base_call, ())
+                if abs(spot.frequency - frequency) <= window]
+
+    def spots(self):
+        return list(self.all_spots)
+
+
+class DuplicateFilter:
+    """Recognizes spots that were already received, e.g. from another 
+    cluster or repeated by the same skimmer.
+
+    A spot is a duplicate if the last spot that passed with the same source
+    call and DX call is less than DUPLICATE_FREQUENCY_TOLERANCE and
+    DUPLICATE_TIME_TOLERANCE away, so there are no bucket edges. The last 
+    passed spot of every pair of calls is kept in an LRU that is bounded by
+    max_size and evicts entries older than max_age."""
+    def __init__(
+            self, max_size = DUPLICATE_MAX_SIZE, max_age = DUPLICATE_MAX_AGE, 
+            clock = time.time):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self.last_seen = collections.OrderedDict()
+        self.next_eviction = 0
+        self.passed = 0
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def is_duplicate(self, spot):
+        last_seen = self.last_seen
+        key = (spot.source_call, spot.call)
+        entry = last_seen.get(key)
+        now = self.clock()
+        if (entry is not None
+                and abs(entry[0] - spot.frequency) 
+                    <= DUPLICATE_FREQUENCY_TOLERANCE
+                and abs(entry[1] - spot.time) < DUPLICATE_TIME_TOLERANCE
+                and entry[2] >= now - self.max_age):
+            self.suppressed += 1
+            return True
+
+        self.passed += 1
+        if entry is not None:
+            last_seen.move_to_end(key)
+        last_seen[key] = (spot.frequency, spot.time, now)
+        if len(last_seen) > self.max_size:
+            last_seen.popitem(last = False)
+        if now >= self.next_eviction:
+            self._evict(now)
+            self.next_eviction = now + 1
+        return False
+
+    def _evict(self, now):
+        oldest = now - self.max_age
+        last_seen = self.last_seen
+        while last_seen:
+            key = next(iter(last_seen))
+            if last_seen[key][2] >= oldest: break
+            del last_seen[key]
+
 
 class SpotAggregator(QtCore.QObject):
-    update_spots = QtCore.Signal(object)
+    spots_changed = QtCore.Signal(object)
 
-    def __init__(self, dxcc, parent = None):
+    def __init__(
+            self, dxcc, journal = None, clock = _time.WALL_CLOCK, 
+            statistics = None, parent = None):
         QtCore.QObject.__init__(self, parent)
         self.dxcc = dxcc
-        self.spots = {}
+        self.journal = journal
+        self.statistics = statistics
+        self.clock = clock
+        self.spots = SpotStore()
+        self.timeouts = []
+        self.timeout_sequence = itertools.count()
+        self.added_spots = set()
+        self.changed_spots = set()
+        self.busted_calls = BustedCallIndex()
+        self.snapshots = {}
+        self.table = _spottable.SpotTable()
+        self.duplicates = DuplicateFilter(clock = clock.time)
+        self.spot_counters = {}
+        metrics = _metrics.METRICS
+        self.queue_depth = metrics.gauge(SPOT_QUEUE_DEPTH)
+        self.duplicates_counter = metrics.counter("spots.duplicates")
+        self.active_spots = metrics.gauge("aggregator.active_spots")
+        self.cleanup_time = metrics.histogram("aggregator.cleanup_seconds")
+        self.merge_time = metrics.histogram("aggregator.merge_seconds")
         self.spotting_threads = []
+        self.replay_time = None
 
     @QtCore.Slot(object)
-    def spot_received(self, incoming_spot):
-        incoming_spot.source_dxcc_info = self.dxcc.find_dxcc_info(
-            incoming_spot.source_call)
-
-        if incoming_spot.call in self.spots:
-            spots_by_call = self.spots[incoming_spot.call]
-            spot = None
-            for s in spots_by_call:
-                if abs(s.frequency - incoming_spot.frequency) \
-                    <= FREQUENCY_WINDOW:
-                    spot = s
-                    break
-
-            if not spot:
-                spot = DxSpot(
-                    incoming_spot.call, incoming_spot.frequency, 
-                    self.dxcc.find_dxcc_info(incoming_spot.call))
-                spots_by_call.append(spot)
-            spot.add_source(incoming_spot)
+    def spots_received(self, incoming_spots):
+        self.queue_depth.add(-len(incoming_spots))
+        self._count_spots(incoming_spots)
+        duplicates = 0
+        for incoming_spot in incoming_spots:
+            if not self._aggregate(incoming_spot):
+                duplicates += 1
+        if duplicates:
+            self.duplicates_counter.inc(duplicates)
+
+    def restore_spots(self, spots):
+        """Aggregate spots that were journaled before, e.g. after a restart,
+        without writing them to the journal or counting them in the 
+        statistics again."""
+        journal = self.journal
+        statistics = self.statistics
+        self.journal = None
+        self.statistics = None
+        try:
+            for spot in spots: # not delivered, so not in the queue depth
+                self.spot_received(spot)
+        finally:
+            self.journal = journal
+            self.statistics = statistics
 
+    @QtCore.Slot(object)
+    def spot_received(self, incoming_spot):
+        self._count_spots((incoming_spot,))
+        if not self._aggregate(incoming_spot):
+            self.duplicates_counter.inc()
+
+    def _aggregate(self, incoming_spot):
+        """Aggregate the given spot, return False if it is a duplicate."""
+        if self.duplicates.is_duplicate(incoming_spot):
+            return False
+        if self.journal:
+            self.journal.append(incoming_spot)
+        if not incoming_spot.source_dxcc_info:
+            incoming_spot.source_dxcc_info = self.dxcc.find_dxcc_info(
+                incoming_spot.source_call)
+
+        spot = self.spots.find(incoming_spot.call, incoming_spot.frequency)
+        if spot:
+            self.spots.add_source(spot, incoming_spot)
         else:
             spot = DxSpot(
                 incoming_spot.call, incoming_spot.frequency, 
-                self.dxcc.find_dxcc_info(incoming_spot.call))
+                incoming_spot.dxcc_info 
+                or self.dxcc.find_dxcc_info(incoming_spot.call))
             spot.add_source(incoming_spot)
-            spots_by_call = [spot]
-
-        self.spots[incoming_spot.call] = spots_by_call
+            self.spots.add(spot)
+            self.busted_calls.add(spot.call.base_call)
+            self._schedule_timeout(spot)
+            self.added_spots.add(spot)
+        self.changed_spots.add(spot)
+        if self.statistics:
+            self.statistics.count(incoming_spot, spot.dxcc_info)
+        return True
+
+    def query(self, **criteria):
+        """Query the active spots as of the last cleanup, see 
+        _spottable.SpotTable.query for the criteria. Call this only in the
+        aggregator's thread, other threads use the table of the last 
+        SpotDelta."""
+        return self.table.query(**criteria)
+
+    def _count_spots(self, spots):
+        """Count the given spots per type, with one update per counter."""
+        counts = {}
+        for spot in spots:
+            spot_type = type(spot)
+            counts[spot_type] = counts.get(spot_type, 0) + 1
+        for spot_type, count in counts.items():
+            counter = self.spot_counters.get(spot_type)
+            if not counter:
+                counter = _metrics.METRICS.counter(
+                    "spots." + spot_type.__name__)
+                self.spot_counters[spot_type] = counter
+            counter.inc(count)
+
+    def _schedule_timeout(self, spot):
+        heapq.heappush(
+            self.timeouts, (spot.timeout, next(self.timeout_sequence), spot))
 
     @QtCore.Slot()
     def cleanup_spots(self):
-        now = time.time()
-        active_spots = [spot for spots_by_call in list(self.spots.values()) 
-            for spot in spots_by_call
-            if now <= spot.timeout]
-
-        spots_to_emit = sorted(active_spots, key= lambda spot: spot.frequency)
-        spots_to_emit = self._merge_spots_with_similar_call(spots_to_emit)
-
-        self.spots = self._group_spots_by_call(spots_to_emit)
-        self.update_spots.emit(spots_to_emit)
-
-    def _merge_spots_with_similar_call(self, spots):
-        result = []
-        window = []
-        tail = spots
-
-        while tail or window:
-            window, tail = self._pop_frequency_window(window, tail)
-            merge_candidates, window = self._extract_merge_candidates(window)
-            merge_target = self._merge_spots(merge_candidates)
-            if merge_target:
-                result.append(merge_target)
-        return result
-
-    def _pop_frequency_window(self, current_window, spots):
-        window = current_window
-        tail = spots
-        if window:
-            lower_bound_frequency = window[0].frequency
-        elif tail:
-            lower_bound_frequency = tail[0].frequency
-        else:
-            return (window, tail)
-
-        while tail:
-            next_spot = tail[0]
-            if next_spot.frequency - lower_bound_frequency <= FREQUENCY_WINDOW:
-                window.append(tail.pop(0))
-            else:
-                break
-        return window, tail
-
-    def _extract_merge_candidates(self, spots):
-        if not spots: return ([], [])
-        remainder = spots
-        seam = remainder.pop(0)
-        merge_candidates = [seam]
-        i = 0
-        while i < len(remainder):
-            spot = remainder[i]
-            distance = ls.distance(seam.call.base_call, spot.call.base_call)
-            if distance <= 1:
-                merge_candidates.append(spot)
-                remainder.pop(i)
-            else:
-                i += 1
-        return merge_candidates, remainder
+        """Remove the spots that timed out and merge the spots that changed 
+        since the last cleanup with similar calls in their neighbourhood.
+
+        The timeouts are kept in a heap. An entry is only re-scheduled when 
+        its spot was extended in the meantime, so the spots that did not 
+        expire and did not change are not touched at all.
+
+        A SpotDelta with only the spots that were added, changed or expired 
+        is emitted (spots_changed). It contains DxSpotSnapshots, new 
+        snapshots are only taken of the spots that were added or changed."""
+        with self.cleanup_time.time():
+            if self.journal:
+                self.journal.flush()
+            now = (self.replay_time 
+                   if self.replay_time is not None 
+                   else self.clock.time())
+            expired_spots = self._expire_spots(now)
+            with self.merge_time.time():
+                expired_spots.extend(self._merge_changed_spots())
+            delta = self._collect_delta(expired_spots)
+            self.active_spots.set(len(self.spots.all_spots))
+        if delta:
+            self.spots_changed.emit(delta)
+
+    @QtCore.Slot(float)
+    def clock_advanced(self, timestamp):
+        """Clean up at the given recorded time of a replay, before the spots
+        of that time are received. The replay may already have moved the 
+        clock further, so all later cleanups use this time as well."""
+        self.replay_time = timestamp
+        self.cleanup_spots()
+
+    def _expire_spots(self, now):
+        expired_spots = []
+        while self.timeouts and self.timeouts[0][0] < now:
+            timeout, _, spot = heapq.heappop(self.timeouts)
+            if not self.spots.contains_spot(spot):
+                continue
+            if spot.timeout > timeout:
+                self._schedule_timeout(spot)
+                continue
+            self._remove_spot(spot)
+            self.changed_spots.discard(spot)
+            expired_spots.append(spot)
+        return expired_spots
+
+    def _merge_changed_spots(self):
+        """Merge every spot that changed since the last cleanup with the 
+        spots of its busted variants within FREQUENCY_WINDOW. The variants
+        are looked up in the busted call index, the other spots in the 
+        window are not touched. Returns the spots that were merged into 
+        others."""
+        removed_spots = []
+        changed_spots = sorted(
+            self.changed_spots, key = lambda spot: spot.frequency)
+        for spot in changed_spots:
+            if not self.spots.contains_spot(spot): continue
+            candidates = [spot]
+            for call in self.busted_calls.similar_calls(spot.call.base_call):
+                candidates.extend(
+                    other for other in self.spots.near(call, spot.frequency)
+                    if other is not spot)
+            if len(candidates) == 1: continue
+            merge_target = self._merge_spots(candidates)
+            for other in candidates:
+                if other is not merge_target:
+                    self._remove_spot(other)
+                    removed_spots.append(other)
+        return removed_spots
+
+    def _remove_spot(self, spot):
+        self.spots.remove(spot)
+        self.busted_calls.remove(spot.call.base_call)
+
+    def _collect_delta(self, removed_spots):
+        by_frequency = lambda spot: spot.frequency
+        added = sorted(
+            [spot for spot in self.added_spots 
+             if self.spots.contains_spot(spot)], 
+            key = by_frequency)
+        changed = sorted(
+            [spot for spot in self.changed_spots 
+             if not spot in self.added_spots 
+                and self.spots.contains_spot(spot)], 
+            key = by_frequency)
+        expired = [self.snapshots.pop(spot.id) for spot in removed_spots 
+                   if spot.id in self.snapshots]
+        self.added_spots = set()
+        self.changed_spots = set()
+        added = self._take_snapshots(added)
+        changed = self._take_snapshots(changed)
+        for snapshot in expired:
+            self.table.remove(snapshot.id)
+        for snapshot in added + changed:
+            self.table.update(snapshot)
+        table = self.table.copy() if added or changed or expired else None
+        return SpotDelta(added, changed, expired, table)
+
+    def _take_snapshots(self, spots):
+        snapshots = [spot.snapshot() for spot in spots]
+        for snapshot in snapshots:
+            self.snapshots[snapshot.id] = snapshot
+        return snapshots
 
     def _merge_spots(self, spots):
         if not spots: return None
-        merge_candidates = sorted(spots, key= lambda s: len(s.sources))
+        merge_candidates = sorted(spots, key= lambda s: s.source_count)
         merge_target = merge_candidates.pop()
         for spot in merge_candidates:
             merge_target.merge(spot)
+        if merge_candidates:
+            self.changed_spots.add(merge_target)
         return merge_target
 
-    def _group_spots_by_call(self, spots):
-        grouped_spots = {}
-        for spot in spots:
-            if not spot.call in grouped_spots:
-                grouped_spots[spot.call] = [spot]
-            else:
-                grouped_spots[spot.call].append(spot) 
-        return grouped_spots
-
-    def start_spotting(self, clusters, spotting_file = None):
-        for c in clusters:
-            st = SpottingThread.telnet(c.host, c.port, c.user, c.password)
-            st.spot_received.connect(self.spot_received)
-            st.start()
-            self.spotting_threads.append(st)
+    def start_spotting(
+            self, clusters, spotting_file = None, replay_speed = None,
+            parsing_pool = None, cluster_filter = None):
+        """Start spotting from the given clusters and the spotting file. 
+
+        With a replay_speed, the spotting file is replayed with its recorded
+        timing on the aggregator's clock, which must be a VirtualClock then.
+        Use float("inf") to replay as fast as possible. With a parsing_pool,
+        the lines of the clusters are parsed in its worker processes. With a
+        cluster_filter, the clusters are asked to send only the spots that
+        pass it, using the filter profile configured for each cluster."""
+        if clusters:
+            engine = ClusterEngine(self.dxcc, parsing_pool)
+            for c in clusters:
+                engine.add_cluster(
+                    c.host, c.port, c.user, c.password, cluster_filter, 
+                    c.filter_profile)
+            engine.spots_received.connect(self.spots_received)
+            engine.start()
+            self.spotting_threads.append(engine)
 
         if spotting_file:
-            st = SpottingThread.textfile(spotting_file)
-            st.spot_received.connect(self.spot_received)
+            if replay_speed:
+                speed = replay_speed if replay_speed != float("inf") else None
+                st = SpottingThread.replay(
+                    spotting_file, self.clock, speed, self.dxcc)
+                st.clock_advanced.connect(self.clock_advanced)
+            else:
+                st = SpottingThread.textfile(spotting_file, self.dxcc)
+            st.spots_received.connect(self.spots_received)
             st.start()
             self.spotting_threads.append(st)
 
@@ -398,10 +1356,36 @@ class SpotAggregator(QtCore.QObject):
         self.spotting_threads = []
 
 
+class AggregationThread(QtCore.QThread):
+    """Runs a SpotAggregator in its own thread with its own event loop. 
+
+    The spots are received and cleaned up in this thread, the GUI only gets
+    the snapshots that are published once per cleanup."""
+    def __init__(
+            self, aggregator, cleanup_interval = CLEANUP_INTERVAL, 
+            parent = None):
+        QtCore.QThread.__init__(self, parent)
+        self.aggregator = aggregator
+        self.cleanup_interval = cleanup_interval
+        self.aggregator.moveToThread(self)
+
+    def run(self):
+        cleanup_timer = QtCore.QTimer()
+        cleanup_timer.timeout.connect(self.aggregator.cleanup_spots)
+        cleanup_timer.start(self.cleanup_interval)
+        self.exec_()
+        cleanup_timer.stop()
+
+    @QtCore.Slot()
+    def stop(self):
+        self.quit()
+
+
 @QtCore.Slot(object)
-def print_spots(spots):
+def print_spots(delta):
     print("Spots at {}:".format(_time.z(time.time())))
-    print("\n".join([str(spot) for spot in spots]))
+    print("\n".join(
+        [str(spot) for spot in delta.table.sorted_by_frequency()]))
     print("")
     sys.stdout.flush()
     sys.stderr.flush()
@@ -414,7 +1398,7 @@ def main_(args):
     textfileClient = FastTextfileClient("rbn.txt")
     spotter = ClusterSpotter(textfileClient)
     aggregator = SpotAggregator(dxcc)
-    aggregator.update_spots.connect(print_spots)
+    aggregator.spots_changed.connect(print_spots)
     spotter.run(aggregator.spot_received)
     aggregator.cleanup_spots()
 
@@ -433,16 +1417,17 @@ def main(args):
     dxcc.load()
 
     aggregator = SpotAggregator(dxcc)
-    aggregator.update_spots.connect(print_spots)
+    aggregator.spots_changed.connect(print_spots)
 
     spot_cleanup_timer = QtCore.QTimer()
     spot_cleanup_timer.timeout.connect(aggregator.cleanup_spots)
     spot_cleanup_timer.start(10000)
 
-    st = SpottingThread.telnet("arcluster.reversebeacon.net", 7000, "dl3ney")
-    # st.spotter.record = True
+    st = ClusterEngine(dxcc)
+    spotter = st.add_cluster("arcluster.reversebeacon.net", 7000, "dl3ney")
+    # spotter.record = True
     #st = SpottingThread.textfile("rbn.txt")
-    st.spot_received.connect(aggregator.spot_received)
+    st.spots_received.connect(aggregator.spots_received)
     st.start()
 
     result = app.exec_()
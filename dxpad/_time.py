@@ -5,3 +5,26 @@ import time
 
 def z(timestamp):
     return time.strftime("%H%MZ", time.gmtime(timestamp))
+
+
+class Clock:
+    """The wall clock."""
+    def time(self):
+        return time.time()
+
+class VirtualClock:
+    """A clock that is set from outside, e.g. from the timestamps of a 
+    recorded file. It never goes backwards."""
+    def __init__(self, now = 0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def set(self, now):
+        self.now = max(self.now, now)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+WALL_CLOCK = Clock()
@@ -4,6 +4,7 @@
 import sys
 import os
 import unittest
+import pickle
 sys.path.insert(0, os.path.abspath('..'))
 
 import dxpad._location as _location
@@ -249,4 +250,47 @@ class TestCall(unittest.TestCase):
         self.assertCall(
             _callinfo.Call("WB3/DL3NEY/8/p"), "WB3", "DL3NEY", "8", "P")
 
+    def test_parse(self):
+        self.assertCall(
+            _callinfo.Call.parse("EA8/DL3NEY/p"), "EA8", "DL3NEY", None, "P")
+
+    def test_parse_trailing_qualifier(self):
+        self.assertCall(
+            _callinfo.Call.parse("DL3NEY/P/QRP"), None, "DL3NEY", None, "P")
+        self.assertEqual(_callinfo.Call.parse("DL3NEY/P/QRP"), 
+                         _callinfo.Call("DL3NEY/P/QRP"))
+
+    def test_parse_invalid_call(self):
+        self.assertIsNone(_callinfo.Call.parse("DL3NEY DL1ABC"))
+        self.assertIsNone(_callinfo.Call.parse("DL3NEY/P/EA8XY"))
+        self.assertIsNone(_callinfo.Call.parse("14074"))
+        self.assertIsNone(_callinfo.Call.parse(""))
+
+    def test_same_text_is_interned(self):
+        self.assertIs(_callinfo.Call("DL3NEY/p"), _callinfo.Call("DL3NEY/p"))
+        self.assertIs(_callinfo.Call.parse("DL3NEY"), 
+                      _callinfo.Call.parse("DL3NEY"))
+
+    def test_equality_and_hash(self):
+        call = _callinfo.Call("dl3ney/P")
+        other = _callinfo.Call("DL3NEY/p")
+        self.assertEqual(call, other)
+        self.assertEqual(hash(call), hash(other))
+        self.assertNotEqual(call, _callinfo.Call("DL3NEY"))
+        self.assertNotEqual(call, "DL3NEY/P")
+        self.assertEqual(1, len(set([call, other])))
+
+    def test_is_immutable(self):
+        call = _callinfo.Call("DL3NEY")
+        with self.assertRaises(AttributeError):
+            call.prefix = "EA6"
+
+    def test_invalid_call_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            _callinfo.Call("14074")
+
+    def test_pickle(self):
+        call = _callinfo.Call("EA6/DL3NEY")
+        self.assertEqual(call, pickle.loads(pickle.dumps(call)))
+
 if __name__ ==  '__main__': unittest.main()
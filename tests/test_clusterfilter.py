@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._clusterfilter as _clusterfilter
+import dxpad._bandplan as _bandplan
+
+BANDS = [
+    _bandplan.Band("40m", 7000.0, 7200.0, []),
+    _bandplan.Band("20m", 14000.0, 14350.0, [])]
+
+
+class TestClusterFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = _clusterfilter.ClusterFilter(["EU", "NA"], BANDS)
+
+    def test_dxspider(self):
+        self.assertEqual(self.filter.commands("dxspider"), [
+            "clear/spots all",
+            "accept/spots on 7000/7200,14000/14350 and by_zone "
+            "1,2,3,4,5,6,7,8,14,15,16,20,40"])
+
+    def test_arcluster(self):
+        self.assertEqual(self.filter.commands("arcluster"), [
+            "set dx filter (spottercont=EU or spottercont=NA) "
+            "and (band=40 or band=20)"])
+
+    def test_rbn(self):
+        self.assertEqual(self.filter.commands("rbn"), [
+            "set/skimmer", "set/nofilter", "set/filter doc/pass EU,NA"])
+
+    def test_unknownSoftwareOrNoContinents_shouldSendNothing(self):
+        self.assertEqual(self.filter.commands(None), [])
+        self.assertEqual(self.filter.commands(_clusterfilter.NONE), [])
+        self.assertEqual(
+            _clusterfilter.ClusterFilter([], BANDS).commands("dxspider"), [])
+
+
+class TestDetection(unittest.TestCase):
+    def test_detectSoftware(self):
+        self.assertEqual(
+            _clusterfilter.detect_software(
+                "DL3NEY de DB0OVP 16-Oct-2026 1200Z dxspider >"),
+            "dxspider")
+        self.assertEqual(
+            _clusterfilter.detect_software(
+                "Welcome to the Reverse Beacon Network"), 
+            "rbn")
+        self.assertEqual(
+            _clusterfilter.detect_software("Running AR-Cluster Version 6"),
+            "arcluster")
+        self.assertEqual(
+            _clusterfilter.detect_software("Welcome to CC-Cluster"),
+            "cccluster")
+        self.assertIsNone(_clusterfilter.detect_software("Hello"))
+
+    def test_isLoginPrompt(self):
+        self.assertTrue(_clusterfilter.is_login_prompt(
+            "DL3NEY de DB0OVP 16-Oct-2026 1200Z dxspider >", "DL3NEY"))
+        self.assertTrue(_clusterfilter.is_login_prompt(
+            "dl3ney de RELAY 16-Oct 1200Z >\r", "DL3NEY"))
+        self.assertFalse(_clusterfilter.is_login_prompt(
+            "DX de DL3NEY:  7018.0  UA3AKO  CW  1204Z", "DL3NEY"))
+        self.assertFalse(_clusterfilter.is_login_prompt(
+            "Please enter your call: ", "DL3NEY"))
+
+
+if __name__ == '__main__': unittest.main()
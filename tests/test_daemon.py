@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import asyncio
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._daemon as _daemon
+import dxpad._spotting as _spotting
+import dxpad._callinfo as _callinfo
+import dxpad._grid as _grid
+
+
+def dx_spot(call, frequency, *sources):
+    spot = _spotting.DxSpot(_callinfo.Call(call), frequency, None)
+    for source_call, snr in sources:
+        spot.add_source(_spotting.RbnSpot(
+            _callinfo.Call(call), frequency, 1000.0,
+            _callinfo.Call(source_call), _grid.Locator("JO62"), "CW", snr,
+            "22", "CQ"))
+    return spot.snapshot()
+
+
+class TestEncoding(unittest.TestCase):
+    def test_decodeSnapshot_shouldRestoreEncodedSnapshot(self):
+        snapshot = dx_spot("AA1BB/P", 7010.0, ("DL1ABC", 12), ("K1ABC", 20))
+
+        decoded, offset = _daemon.decode_snapshot(
+            _daemon.encode_snapshot(snapshot))
+
+        self.assertEqual(decoded.id, snapshot.id)
+        self.assertEqual(decoded.call, snapshot.call)
+        self.assertEqual(decoded.frequency, snapshot.frequency)
+        self.assertEqual(decoded.source_count, 2)
+        self.assertEqual(decoded.spotters, ("DL1ABC", "K1ABC"))
+        self.assertEqual(decoded.spotter_count, 2)
+        self.assertEqual(decoded.best_snr, 20)
+        self.assertEqual(decoded.average_snr, 16)
+        self.assertEqual(decoded.modes, ("CW",))
+        self.assertEqual(
+            [(str(source.source_call), source.snr) 
+             for source in decoded.sources],
+            [("DL1ABC", 12), ("K1ABC", 20)])
+        self.assertEqual(decoded.timeout, snapshot.timeout)
+
+    def test_decodeSnapshot_withoutSnr_shouldBeNone(self):
+        spot = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7010.0, None)
+        spot.add_source(_spotting.ClusterSpot(
+            _callinfo.Call("AA1BB"), 7010.0, 1000.0, _callinfo.Call("DL1ABC"),
+            None, "up 2"))
+
+        decoded, offset = _daemon.decode_snapshot(
+            _daemon.encode_snapshot(spot.snapshot()))
+
+        self.assertIsNone(decoded.best_snr)
+        self.assertIsNone(decoded.average_snr)
+
+    def test_decodeUpdate_shouldSplitAddedChangedAndExpired(self):
+        added = dx_spot("AA1BB", 7010.0, ("DL1ABC", 12))
+        changed = dx_spot("AA2BB", 7020.0, ("DL1ABC", 12))
+        frame = _daemon.encode_update(
+            _daemon.UPDATE, [_daemon.encode_snapshot(added)],
+            [_daemon.encode_snapshot(changed)], [4711])
+
+        added_spots, changed_spots, expired_ids = _daemon.decode_update(
+            frame[5:])
+
+        self.assertEqual([spot.id for spot in added_spots], [added.id])
+        self.assertEqual([spot.id for spot in changed_spots], [changed.id])
+        self.assertEqual(expired_ids, [4711])
+
+    def test_tcpAddress(self):
+        self.assertEqual(
+            _daemon.tcp_address("localhost:7373"), ("localhost", 7373))
+        self.assertEqual(_daemon.tcp_address(":7373"), ("127.0.0.1", 7373))
+        self.assertIsNone(_daemon.tcp_address("/tmp/daemon.sock"))
+
+
+class TestPublishing(unittest.TestCase):
+    def test_attachedClients_shouldReceiveStateAndDeltas(self):
+        spot1 = dx_spot("AA1BB", 7010.0, ("DL1ABC", 12))
+        spot2 = dx_spot("AA2BB", 7020.0, ("DL1ABC", 12))
+        first_deltas = []
+        second_deltas = []
+        dx_calls = []
+
+        async def run(address):
+            publisher = _daemon.SpotPublisher()
+            await publisher.start(address)
+            publisher.publish(_spotting.SpotDelta([spot1], [], []))
+            publisher.publish_dx_call(_callinfo.Call("AA1BB"))
+
+            first = _daemon.SpotSubscriber()
+            first_run = asyncio.ensure_future(first.run(
+                address, first_deltas.append, dx_calls.append))
+            while not first_deltas:
+                await asyncio.sleep(0.01)
+            publisher.publish(_spotting.SpotDelta([spot2], [], [spot1]))
+            while len(first_deltas) < 2:
+                await asyncio.sleep(0.01)
+
+            second = _daemon.SpotSubscriber()
+            second_run = asyncio.ensure_future(second.run(
+                address, second_deltas.append, dx_calls.append))
+            while not second_deltas:
+                await asyncio.sleep(0.01)
+
+            publisher.close()
+            await asyncio.wait_for(
+                asyncio.gather(first_run, second_run), 5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(os.path.join(directory, "daemon.sock")))
+
+        self.assertEqual(
+            [spot.id for spot in first_deltas[0].added], [spot1.id])
+        self.assertEqual(
+            [spot.id for spot in first_deltas[1].added], [spot2.id])
+        self.assertEqual(
+            [spot.id for spot in first_deltas[1].expired], [spot1.id])
+        self.assertEqual(
+            [str(spot.call) for spot in first_deltas[1].table.query()],
+            ["AA2BB"])
+        self.assertEqual(
+            [spot.id for spot in second_deltas[0].added], [spot2.id])
+        self.assertEqual([str(call) for call in dx_calls], ["AA1BB"] * 2)
+
+    def test_fullFrame_shouldExpirePreviousSpots(self):
+        subscriber = _daemon.SpotSubscriber()
+        spot1 = dx_spot("AA1BB", 7010.0, ("DL1ABC", 12))
+        spot2 = dx_spot("AA2BB", 7020.0, ("DL1ABC", 12))
+        subscriber.apply(_daemon.FULL, _daemon.encode_update(
+            _daemon.FULL, [_daemon.encode_snapshot(spot1)], [], [])[5:])
+
+        delta = subscriber.apply(_daemon.FULL, _daemon.encode_update(
+            _daemon.FULL, [_daemon.encode_snapshot(spot2)], [], [])[5:])
+
+        self.assertEqual([spot.id for spot in delta.expired], [spot1.id])
+        self.assertEqual([spot.id for spot in delta.added], [spot2.id])
+        self.assertEqual(len(delta.table), 1)
+
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._dxcc as _dxcc
+import dxpad._callinfo as _callinfo
+
+CTY = """Fed. Rep. of Germany:     14:  28:  EU:   51.00:   -10.00:    -1.0:  DL:
+    DA,DB,DC,DD,DF,DG,DH,DJ,DK,DL,DM,DN,DO,DP,DQ,DR,=DL0XYZ/P;
+England:                  14:  27:  EU:   52.77:     1.47:     0.0:  G:
+    2E,G,M;
+Hawaii:                   31:  61:  OC:   21.12:   157.48:    10.0:  KH6:
+    AH6,KH6,NH6,WH6;
+United States:            05:  08:  NA:   37.53:    91.67:     5.0:  K:
+    AA,K,N,W,=KH6ABC;
+"""
+
+
+class TestDXCC(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "cty.dat")
+        with open(filename, "w") as f:
+            f.write(CTY)
+        self.dxcc = _dxcc.DXCC()
+        self.dxcc.load_from_file(filename)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def prefix(self, call):
+        return self.dxcc.find_dxcc_prefix(_callinfo.Call(call))
+
+    def test_longestPrefix(self):
+        self.assertEqual(self.prefix("DL3NEY"), "DL")
+        self.assertEqual(self.prefix("KH6XY"), "KH6")
+        self.assertEqual(self.prefix("K1ABC"), "K")
+        self.assertIsNone(self.prefix("JA1ABC"))
+
+    def test_exactMatch_shouldOnlyMatchWholeCall(self):
+        self.assertEqual(self.prefix("KH6ABC"), "KH6ABC")
+        self.assertEqual(self.prefix("KH6ABD"), "KH6")
+        self.assertEqual(self.prefix("DL0XYZ/P"), "DL0XYZ/P")
+        self.assertEqual(
+            self.dxcc.find_dxcc_info(_callinfo.Call("KH6ABC")).name,
+            "United States")
+
+    def test_portablePrefix_shouldUsePrefix(self):
+        self.assertEqual(self.prefix("DL/G4ABC"), "DL")
+        self.assertEqual(self.prefix("KH6/DL3NEY"), "KH6")
+
+    def test_workingCondition_shouldUseBaseCall(self):
+        self.assertEqual(self.prefix("F4XYZ/P"), None)
+        self.assertEqual(self.prefix("G4ABC/P"), "G")
+        self.assertEqual(self.prefix("KH6ABC/M"), "KH6ABC")
+
+    def test_maritimeMobile_shouldBeInNoEntity(self):
+        self.assertIsNone(self.prefix("DL3NEY/MM"))
+        self.assertIsNone(self.prefix("DL3NEY/AM"))
+
+    def test_suffix_shouldUseSuffixIfItIsAPrefix(self):
+        self.assertEqual(self.prefix("K1ABC/KH6"), "KH6")
+        self.assertEqual(self.prefix("K1ABC/4"), "K")
+        self.assertEqual(self.prefix("DL3NEY/QRP"), "DL")
+
+    def test_text_shouldBeParsed(self):
+        self.assertEqual(self.dxcc.find_dxcc_prefix("dl/g4abc"), "DL")
+        self.assertEqual(self.dxcc.find_dxcc_prefix("KH6ABC"), "KH6ABC")
+        self.assertEqual(self.dxcc.find_dxcc_prefix("DL-1"), "DL")
+
+    def test_replacedPrefixes_shouldBeCompiledAgain(self):
+        info = self.dxcc.find_dxcc_info(_callinfo.Call("DL3NEY"))
+        self.dxcc.infos_by_prefix = {"JA": info}
+
+        self.assertIsNone(self.prefix("DL3NEY"))
+        self.assertEqual(self.prefix("JA1ABC"), "JA")
+
+
+class TestPrefixTrie(unittest.TestCase):
+    def test_longestPrefix(self):
+        trie = _dxcc.PrefixTrie(["A", "AB", "ABCD"])
+
+        self.assertEqual(trie.longest_prefix("ABC"), "AB")
+        self.assertEqual(trie.longest_prefix("ABCDE"), "ABCD")
+        self.assertEqual(trie.longest_prefix("AX"), "A")
+        self.assertIsNone(trie.longest_prefix("B"))
+        self.assertIsNone(trie.longest_prefix(""))
+
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import tempfile
+import shutil
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._journal as _journal
+import dxpad._spotting as _spotting
+import dxpad._pskreporter as _pskreporter
+import dxpad._callinfo as _callinfo
+import dxpad._grid as _grid
+
+DAY = 1476576000.0 # 2016-10-16 00:00Z
+
+class TestRecord(unittest.TestCase):
+    def assertSameSpot(self, spot, other):
+        self.assertIs(type(spot), type(other))
+        self.assertEqual(str(spot), str(other))
+
+    def roundtrip(self, spot):
+        data = _journal.encode_spot(spot)
+        decoded, end = _journal.decode_spot(data)
+        self.assertEqual(end, len(data))
+        self.assertSameSpot(spot, decoded)
+
+    def test_rbnSpot(self):
+        self.roundtrip(_spotting.RbnSpot(
+            _callinfo.Call("UA3AKO"), 7018.0, DAY + 60.5, 
+            _callinfo.Call("DL8LAS"), None, "CW", 12.0, "24", "CQ"))
+
+    def test_clusterSpot(self):
+        self.roundtrip(_spotting.ClusterSpot(
+            _callinfo.Call("VK7/DK6MP/P"), 14025.0, DAY, 
+            _callinfo.Call("EA6/DL3NEY"), _grid.Locator("JM19"), "up 2"))
+
+    def test_pskReporterSpot(self):
+        self.roundtrip(_pskreporter.PskReporterSpot(
+            _callinfo.Call("DL3NEY"), 14074.5, DAY, 
+            _callinfo.Call("K1TTT"), _grid.Locator("FN32"), "FT8", 17.0))
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.now = DAY + 12 * 3600
+        self.journal = _journal.Journal(self.directory, lambda: self.now)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def append(self, call, timestamp):
+        self.now = timestamp
+        self.journal.append(_spotting.RbnSpot(
+            _callinfo.Call(call), 7018.0, timestamp, 
+            _callinfo.Call("DL8LAS"), None, "CW", 12.0, "24", "CQ"))
+
+    def calls(self, spots):
+        return [str(spot.call) for spot in spots]
+
+    def test_spotsBetween_shouldUseTheTimeWindow(self):
+        start = DAY + 12 * 3600
+        for minute in range(10):
+            self.append("AA{}BB".format(minute), start + minute * 60 + 5)
+
+        self.assertEqual(
+            self.calls(self.journal.spots_between(
+                start + 3 * 60, start + 5 * 60 + 10)),
+            ["AA3BB", "AA4BB", "AA5BB"])
+
+    def test_spotsBetween_shouldReadAllDays(self):
+        self.append("AA1BB", DAY - 30)
+        self.append("AA2BB", DAY + 30)
+
+        self.assertEqual(
+            self.calls(self.journal.spots_between(DAY - 60, DAY + 60)),
+            ["AA1BB", "AA2BB"])
+        self.assertTrue(os.path.isfile(
+            _journal.journal_filename(self.directory, "20161015")))
+        self.assertTrue(os.path.isfile(
+            _journal.journal_filename(self.directory, "20161016")))
+
+    def test_reopen_shouldAppend(self):
+        self.append("AA1BB", DAY + 60)
+        self.journal.close()
+        journal = _journal.Journal(self.directory, lambda: self.now)
+        self.journal = journal
+        self.append("AA2BB", DAY + 120)
+
+        self.assertEqual(
+            self.calls(journal.spots_between(DAY, DAY + 180)),
+            ["AA1BB", "AA2BB"])
+
+    def test_reopenAfterTornRecord_shouldAppendBehindLastCompleteRecord(self):
+        record_size = len(_journal.encode_spot(_spotting.RbnSpot(
+            _callinfo.Call("AA1BB"), 7018.0, DAY, 
+            _callinfo.Call("DL8LAS"), None, "CW", 12.0, "24", "CQ")))
+
+        for cut in range(1, record_size):
+            with self.subTest(cut = cut):
+                self.journal.close()
+                directory = os.path.join(self.directory, str(cut))
+                self.journal = _journal.Journal(directory, lambda: self.now)
+                self.append("AA1BB", DAY + 60)
+                self.append("AA2BB", DAY + 120)
+                self.journal.close()
+                filename = _journal.journal_filename(directory, "20161016")
+                os.truncate(filename, os.path.getsize(filename) - cut)
+
+                self.journal = _journal.Journal(directory, lambda: self.now)
+                self.append("AA3BB", DAY + 120)
+                self.append("AA4BB", DAY + 180)
+
+                self.assertEqual(
+                    self.calls(self.journal.recent_spots()),
+                    ["AA1BB", "AA3BB", "AA4BB"])
+
+    def test_invalidRecord_shouldBeSkippedAndKept(self):
+        for call in ["AA1BB", "AA2BB", "AA3BB"]:
+            self.append(call, DAY + 60)
+        self.journal.close()
+        filename = _journal.journal_filename(self.directory, "20161016")
+        with open(filename, "rb") as f:
+            data = f.read()
+        with open(filename, "wb") as f:
+            f.write(data.replace(b"AA2BB", b"12345"))
+
+        self.journal = _journal.Journal(self.directory, lambda: self.now)
+        self.append("AA4BB", DAY + 120)
+
+        self.assertEqual(
+            self.calls(self.journal.recent_spots()),
+            ["AA1BB", "AA3BB", "AA4BB"])
+        self.assertEqual(os.path.getsize(filename), len(data) * 4 // 3)
+
+    def test_spots_shouldStopAtCorruptRecord(self):
+        self.append("AA1BB", DAY + 60)
+        self.journal.close()
+        filename = _journal.journal_filename(self.directory, "20161016")
+        with open(filename, "ab") as f:
+            f.write(b"\x05\x00garbage")
+
+        with _journal.JournalReader(self.directory, "20161016") as reader:
+            self.assertEqual(self.calls(reader), ["AA1BB"])
+
+    def test_recentSpots_shouldRestoreAggregator(self):
+        self.append("AA1BB", DAY + 60)
+        self.append("AA1BB", DAY + 61)
+        aggregator = _spotting.SpotAggregator(FakeDXCC(), self.journal)
+
+        aggregator.restore_spots(self.journal.recent_spots())
+
+        self.assertEqual(len(aggregator.spots), 1)
+        self.assertEqual(self.journal.writer.written, 2)
+
+    def test_restoreSpots_shouldNotChangeTheQueueDepth(self):
+        self.append("AA1BB", DAY + 60)
+        self.append("AA2BB", DAY + 61)
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        depth = aggregator.queue_depth.value
+
+        aggregator.restore_spots(self.journal.recent_spots())
+
+        self.assertEqual(aggregator.queue_depth.value, depth)
+
+
+class FakeDXCC:
+    def find_dxcc_info(self, call):
+        return None
+
+if __name__ == '__main__': unittest.main()
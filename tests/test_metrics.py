@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import json
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._metrics as _metrics
+import dxpad._spotting as _spotting
+
+class TestCounter(unittest.TestCase):
+    def test_rate_shouldCoverTheLastMinute(self):
+        now = [1000.0]
+        counter = _metrics.Counter(clock = lambda: now[0])
+        counter.inc(60)
+        now[0] += 30
+        counter.inc(60)
+        self.assertEqual(counter.rate(), 2.0)
+
+        now[0] += 40
+        self.assertEqual(counter.rate(), 1.0)
+        self.assertEqual(counter.value, 120)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_toDict(self):
+        histogram = _metrics.Histogram()
+        for value in range(1, 101):
+            histogram.observe(value)
+
+        values = histogram.to_dict()
+        self.assertEqual(values["count"], 100)
+        self.assertEqual(values["mean"], 50.5)
+        self.assertEqual(values["p50"], 51)
+        self.assertEqual(values["max"], 100)
+
+
+class TestRegistry(unittest.TestCase):
+    def test_dump_shouldWriteJSON(self):
+        registry = _metrics.Registry()
+        registry.counter("lines").inc(3)
+        registry.gauge("spots").set(7)
+        with registry.histogram("cleanup").time():
+            pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = registry.dump(os.path.join(directory, "metrics.json"))
+            with open(filename) as f:
+                metrics = json.load(f)["metrics"]
+
+        self.assertEqual(metrics["lines"]["value"], 3)
+        self.assertEqual(metrics["spots"]["value"], 7)
+        self.assertEqual(metrics["cleanup"]["count"], 1)
+
+    def test_sameName_shouldReturnSameMetric(self):
+        registry = _metrics.Registry()
+        self.assertIs(registry.counter("lines"), registry.counter("lines"))
+
+
+class TestSpottingMetrics(unittest.TestCase):
+    def test_clusterSpotter_shouldCountLinesAndParseFailures(self):
+        client = _spotting.FastTextfileClient("metrics-test.txt")
+        spotter = _spotting.ClusterSpotter(client)
+        failures = _metrics.METRICS.counter("parse_failures").value
+
+        spotter._line_received("WCY de DK0WCY-1 <18> : K=2\n", print)
+        spotter._line_received("DX de garbage\n", print)
+
+        self.assertEqual(spotter.lines_received.value, 2)
+        self.assertEqual(
+            _metrics.METRICS.counter("parse_failures").value, failures + 1)
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import unittest
+import asyncio
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._parsing as _parsing
+import dxpad._spotting as _spotting
+import dxpad._dxcc as _dxcc
+import dxpad._location as _location
+
+RBN_LINE = "DX de DL1ABC-#:   7018.0  UA3AKO       CW    12 dB  22 WPM  CQ      1204Z\n"
+CLUSTER_LINE = "DX de DL1ABC:     14025.0  UA3AKO       up 2                       1204Z JO62\n"
+
+def make_dxcc():
+    dxcc = _dxcc.DXCC()
+    germany = _dxcc.DXCCInfo(
+        "Fed. Rep. of Germany", 14, 28, "EU", _location.LatLon(51, 10),
+        -1.0, "DL")
+    russia = _dxcc.DXCCInfo(
+        "European Russia", 16, 29, "EU", _location.LatLon(54, 38),
+        -4.0, "UA")
+    dxcc.infos_by_prefix = {"DL": germany, "UA": russia}
+    return dxcc
+
+def spot_line(call, minute):
+    return ("DX de DL1ABC-#:   7018.0  {:<12} CW    12 dB  22 WPM  CQ      "
+            "12{:02d}Z\n".format(call, minute))
+
+
+class TestRecords(unittest.TestCase):
+    def test_decodeSpot_rbnSpot_shouldRebuildSpotWithDxccInfos(self):
+        dxcc = make_dxcc()
+        _parsing._init_worker(dxcc)
+        spot = _spotting.ClusterSpotter.parse_line(RBN_LINE, 1234.0)
+        record = _parsing.encode_spot(spot)
+        _parsing._init_worker(None)
+        spot.lookup_dxcc_info(dxcc)
+
+        decoded = _parsing.decode_spot(record, dxcc)
+
+        self.assertIsInstance(decoded, _spotting.RbnSpot)
+        self.assertEqual(str(decoded), str(spot))
+        self.assertIs(decoded.dxcc_info, dxcc.infos_by_prefix["UA"])
+        self.assertIs(decoded.source_dxcc_info, dxcc.infos_by_prefix["DL"])
+
+    def test_decodeSpot_clusterSpot_shouldRebuildSpot(self):
+        spot = _spotting.ClusterSpotter.parse_line(CLUSTER_LINE, 1234.0)
+
+        decoded = _parsing.decode_spot(_parsing.encode_spot(spot))
+
+        self.assertIsInstance(decoded, _spotting.ClusterSpot)
+        self.assertEqual(str(decoded), str(spot))
+        self.assertIsNone(decoded.dxcc_info)
+
+    def test_parseLines_shouldCountFailures(self):
+        records, failures = _parsing.parse_lines(
+            [(RBN_LINE, 1.0), ("DX de garbage\n", 2.0), (CLUSTER_LINE, 3.0)])
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(failures, 1)
+
+
+class ListClient:
+    def __init__(self, lines):
+        self.lines = lines
+        self.running = False
+        self.hostname = "list"
+        self.port = 0
+
+    async def run(self, line_callback):
+        for line in self.lines:
+            line_callback(line)
+            await asyncio.sleep(0)
+
+
+class TestParsingPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = _parsing.ParsingPool(make_dxcc(), 2, batch_size = 3)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_parseBatches_shouldKeepOrderOfLines(self):
+        batches = [
+            [(spot_line("UA3AK{}".format(chr(65 + i * 3 + j)), i), 0.0)
+             for j in range(3)]
+            for i in range(5)]
+
+        spots = list(self.pool.parse_batches(batches))
+
+        self.assertEqual(
+            [str(spot.call) for spot in spots],
+            ["UA3AK{}".format(chr(65 + i)) for i in range(15)])
+        self.assertEqual(spots[0].dxcc_info.primary_prefix, "UA")
+
+    def test_runSpotter_shouldDeliverSpotsInOrderOfLines(self):
+        calls = ["UA3AK{}".format(chr(65 + i)) for i in range(10)]
+        lines = [spot_line(call, 4) for call in calls]
+        lines.insert(4, "To ALL de DL1ABC: hello\n")
+        spotter = _spotting.ClusterSpotter(ListClient(lines))
+        spots = []
+        batchers = []
+
+        asyncio.run(self.pool.run_spotter(spotter, spots.append, batchers))
+
+        self.assertEqual([str(spot.call) for spot in spots], calls)
+        self.assertEqual(batchers, [])
+
+
+if __name__ == '__main__': unittest.main()
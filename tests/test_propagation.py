@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import tempfile
+import shutil
+import unittest
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._propagation as _propagation
+import dxpad._spotting as _spotting
+import dxpad._bandplan as _bandplan
+import dxpad._callinfo as _callinfo
+import dxpad._dxcc as _dxcc
+import dxpad._location as _location
+
+DAY = 1476576000.0 # 2016-10-16 00:00Z
+BAND_40M = _bandplan.IARU_REGION_1[3]
+BAND_20M = _bandplan.IARU_REGION_1[5]
+
+def dxcc_info(prefix, continent, lat = 0.0, lon = 0.0):
+    return _dxcc.DXCCInfo(
+        prefix, 0, 0, continent, _location.LatLon(lat, lon), 0.0, prefix)
+
+GERMANY = dxcc_info("DL", "EU", 51.0, 10.0)
+USA = dxcc_info("K", "NA", 37.5, -91.0)
+JAPAN = dxcc_info("JA", "AS", 36.0, 138.0)
+
+def spot(timestamp, frequency = 7010.0, dx = USA, source = GERMANY):
+    spot = _spotting.ClusterSpot(
+        _callinfo.Call("AA1BB"), frequency, timestamp,
+        _callinfo.Call("DL1ABC"), None, "")
+    spot.dxcc_info = dx
+    spot.source_dxcc_info = source
+    return spot
+
+
+class TestPropagationStatistics(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.now = DAY + 12 * 3600
+        self.statistics = self.open()
+
+    def tearDown(self):
+        self.statistics.close()
+        shutil.rmtree(self.directory)
+
+    def open(self, writable = True):
+        return _propagation.PropagationStatistics(
+            self.directory, clock = lambda: self.now, writable = writable)
+
+    def test_count_shouldCountPerBandContinentEntityAndHour(self):
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now, 14010.0))
+        self.statistics.count(spot(self.now, dx = JAPAN))
+        self.statistics.count(spot(self.now - 3600))
+
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA), 2)
+        self.assertEqual(self.statistics.activity(BAND_20M, "EU", USA), 1)
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", JAPAN), 1)
+        self.assertEqual(self.statistics.activity(BAND_40M, "NA", USA), 0)
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA, 11), 1)
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", GERMANY), 0)
+
+    def test_count_outOfBandOrUnknownEntity_shouldBeIgnored(self):
+        self.statistics.count(spot(self.now, 8000.0))
+        self.statistics.count(spot(self.now, dx = None))
+        self.statistics.count(spot(self.now, source = None))
+
+        self.assertEqual(self.statistics.entities, [])
+        self.assertEqual(self.statistics.band_activity("EU"), [0] * 10)
+
+    def test_count_spotOfAnotherDay_shouldBeIgnored(self):
+        self.statistics.count(spot(self.now - 86400))
+        self.statistics.count(spot(self.now + 86400))
+
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA, 12), 0)
+        self.now += 86400
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA, 12), 0)
+
+    def test_activity_shouldAverageOverTheDaysOfTheWindow(self):
+        for day in range(3):
+            self.statistics.count(spot(self.now))
+            self.now += 86400
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now))
+
+        self.assertEqual(self.statistics.days, 3)
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA), 5 / 4)
+
+    def test_activity_shouldDropDaysOutsideTheWindow(self):
+        self.statistics.count(spot(self.now))
+        self.now += (_propagation.WINDOW_DAYS + 1) * 86400
+
+        self.assertEqual(self.statistics.days, 0)
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA), 0)
+
+    def test_reopen_shouldRestoreCountsAndEntities(self):
+        self.statistics.count(spot(self.now, dx = JAPAN))
+        self.statistics.count(spot(self.now))
+        self.statistics.close()
+
+        self.statistics = self.open()
+
+        self.assertEqual(self.statistics.entities, ["JA", "K"])
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA), 1)
+
+    def test_readOnly_shouldSeeCountsOfWriter(self):
+        reader = self.open(writable = False)
+        self.statistics.count(spot(self.now))
+
+        self.assertEqual(reader.activity(BAND_40M, "EU", USA), 1)
+        self.assertEqual(
+            reader.usually_open(BAND_40M, "EU"),
+            [("K", USA.latlon, 1.0)])
+
+    def test_usuallyOpen_shouldApplyThreshold(self):
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now, dx = JAPAN))
+
+        self.assertEqual(
+            [prefix for prefix, latlon, activity
+             in self.statistics.usually_open(BAND_40M, "EU", threshold = 2)],
+            ["K"])
+
+    def test_bandActivity_shouldSumEntitiesPerBand(self):
+        self.statistics.count(spot(self.now))
+        self.statistics.count(spot(self.now, dx = JAPAN))
+        self.statistics.count(spot(self.now, 14010.0))
+
+        activity = self.statistics.band_activity("EU")
+
+        self.assertEqual(activity[3], 2)
+        self.assertEqual(activity[5], 1)
+
+    def test_aggregator_shouldCountReceivedButNotRestoredSpots(self):
+        class FakeDXCC:
+            def find_dxcc_info(self, call):
+                return USA
+        aggregator = _spotting.SpotAggregator(
+            FakeDXCC(), statistics = self.statistics)
+
+        aggregator.restore_spots([spot(self.now)])
+        aggregator.spot_received(spot(self.now, 7020.0))
+
+        self.assertEqual(self.statistics.activity(BAND_40M, "EU", USA), 1)
+
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,262 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import math
+import time
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.abspath('..'))
+
+import dxpad._spottable as _spottable
+import dxpad._spotting as _spotting
+import dxpad._bandplan as _bandplan
+import dxpad._callinfo as _callinfo
+import dxpad._dxcc as _dxcc
+import dxpad._location as _location
+
+
+def dxcc_info(continent):
+    return _dxcc.DXCCInfo(
+        continent, 0, 0, continent, _location.LatLon(0, 0), 0.0, continent)
+
+def source(continent, snr = None, source_call = "CT1XY", mode = "CW"):
+    if snr is None:
+        spot = _spotting.ClusterSpot(
+            _callinfo.Call("AA1BB"), 7010.0, 0, _callinfo.Call(source_call),
+            None, "")
+    else:
+        spot = _spotting.RbnSpot(
+            _callinfo.Call("AA1BB"), 7010.0, 0, _callinfo.Call(source_call),
+            None, mode, snr, "22", "CQ")
+    spot.source_dxcc_info = dxcc_info(continent) if continent else None
+    return spot
+
+def snapshot(
+        id, frequency, sources = [], timeout = 100, call = "AA1BB", 
+        last_seen = 0):
+    spot = _spotting.DxSpot(_callinfo.Call(call), frequency, None)
+    for source in sources:
+        spot.add_source(source)
+    return spot.snapshot()._replace(
+        id = id, frequency = frequency, timeout = timeout, first_seen = 0,
+        last_seen = last_seen)
+
+
+class TestSpotTable(unittest.TestCase):
+    def setUp(self):
+        self.table = _spottable.SpotTable()
+
+    def test_update_newSpot_shouldAddRow(self):
+        self.table.update(snapshot(1, 7010.0, [source("EU", 12), source("NA")]))
+
+        self.assertEqual(len(self.table), 1)
+        self.assertIn(1, self.table)
+        self.assertEqual(self.table.source_count[0], 2)
+        self.assertEqual(self.table.best_snr[0], 12)
+        self.assertEqual(self.table.band[0], 3)
+        self.assertEqual(
+            self.table.spotter_continents[0],
+            _spottable.continent_mask(["EU", "NA"]))
+
+    def test_update_noSnr_shouldBeNan(self):
+        self.table.update(snapshot(1, 7010.0, [source("EU")]))
+
+        self.assertTrue(math.isnan(self.table.best_snr[0]))
+
+    def test_update_existingSpot_shouldReplaceRow(self):
+        self.table.update(snapshot(1, 7010.0))
+        changed = snapshot(1, 7011.0)
+        self.table.update(changed)
+
+        self.assertEqual(len(self.table), 1)
+        self.assertEqual(self.table.frequency[0], 7011.0)
+        self.assertIs(self.table.spots[0], changed)
+
+    def test_remove_shouldMoveLastRow(self):
+        for i in range(3):
+            self.table.update(snapshot(i, 7000.0 + i))
+        self.table.remove(0)
+
+        self.assertEqual(len(self.table), 2)
+        self.assertNotIn(0, self.table)
+        self.assertEqual(
+            [spot.id for spot in self.table.sorted_by_frequency()], [1, 2])
+        self.assertEqual(self.table.frequency[self.table.rows_by_id[2]], 7002.0)
+
+    def test_update_beyondCapacity_shouldGrow(self):
+        count = _spottable.INITIAL_CAPACITY + 1
+        for i in range(count):
+            self.table.update(snapshot(i, 14000.0 + i / count))
+
+        self.assertEqual(len(self.table), count)
+        self.assertEqual(len(self.table.sorted_by_frequency()), count)
+
+    def test_inBand_shouldSelectSpotsOfBand(self):
+        self.table.update(snapshot(1, 7010.0))
+        self.table.update(snapshot(2, 14010.0))
+        self.table.update(snapshot(3, 7200.0))
+        band_40m = _bandplan.IARU_REGION_1[3]
+
+        spots = self.table.select(self.table.in_band(band_40m))
+
+        self.assertEqual([spot.id for spot in spots], [1])
+
+    def test_spottedFrom_shouldSelectSpotsWithSourceOnContinent(self):
+        self.table.update(snapshot(1, 7010.0, [source("EU")]))
+        self.table.update(snapshot(2, 7020.0, [source("NA")]))
+        self.table.update(snapshot(3, 7030.0, [source(None)]))
+
+        spots = self.table.select(self.table.spotted_from(["EU", "AS"]))
+
+        self.assertEqual([spot.id for spot in spots], [1])
+
+    def test_expired_shouldSelectTimedOutSpots(self):
+        self.table.update(snapshot(1, 7010.0, timeout = 50))
+        self.table.update(snapshot(2, 7020.0, timeout = 150))
+
+        spots = self.table.select(self.table.expired(100))
+
+        self.assertEqual([spot.id for spot in spots], [1])
+
+    def test_sortedByFrequency_shouldSortSelectedSpots(self):
+        self.table.update(snapshot(1, 7030.0, [source("EU")]))
+        self.table.update(snapshot(2, 7010.0, [source("EU")]))
+        self.table.update(snapshot(3, 7020.0, [source("NA")]))
+
+        spots = self.table.sorted_by_frequency(self.table.spotted_from(["EU"]))
+
+        self.assertEqual([spot.id for spot in spots], [2, 1])
+
+    def test_copy_shouldBeIndependentAndReadOnly(self):
+        self.table.update(snapshot(1, 7010.0))
+        copy = self.table.copy()
+        self.table.update(snapshot(2, 7020.0))
+
+        self.assertEqual(len(copy), 1)
+        self.assertEqual(len(copy.select(copy.all())), 1)
+        with self.assertRaises(ValueError):
+            copy.frequency[0] = 0
+
+    def test_copy_shouldShareColumnsUntilTableChanges(self):
+        self.table.update(snapshot(1, 7010.0))
+        copy = self.table.copy()
+
+        self.assertTrue(np.shares_memory(copy.frequency, self.table.frequency))
+        self.assertIs(copy.spots, self.table.spots)
+        self.table.remove(1)
+        self.assertFalse(np.shares_memory(copy.frequency, self.table.frequency))
+        self.assertEqual(len(copy.spots), 1)
+        self.assertIn(1, copy)
+
+
+class TestSpotIndex(unittest.TestCase):
+    def test_sharedKey_shouldHoldSetOnlyWhileShared(self):
+        index = _spottable.SpotIndex()
+        index.add("AA1BB", 1)
+        self.assertEqual(index.ids["AA1BB"], 1)
+        index.add("AA1BB", 2)
+        self.assertEqual(set(index.get("AA1BB")), {1, 2})
+        index.discard("AA1BB", 1)
+        self.assertEqual(index.ids["AA1BB"], 2)
+        index.discard("AA1BB", 2)
+        self.assertEqual(index.get("AA1BB"), ())
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.table = _spottable.SpotTable()
+        self.table.update(snapshot(
+            1, 7010.0, [source("EU", 10, "DL1ABC")], call = "AA1BB", 
+            last_seen = 10))
+        self.table.update(snapshot(
+            2, 7020.0, [source("NA", 20, "K1ABC", "RTTY")], call = "AA2BB",
+            last_seen = 20))
+        self.table.update(snapshot(
+            3, 14010.0, [source("EU", 30, "DL1ABC")], call = "AA1BB/P",
+            last_seen = 30))
+        self.table.update(snapshot(
+            4, 7030.0, [source("EU")], call = "AA3BB", last_seen = 40))
+
+    def query(self, **criteria):
+        return [spot.id for spot in self.table.query(**criteria)]
+
+    def test_noCriteria_shouldReturnAllSpotsSortedByFrequency(self):
+        self.assertEqual(self.query(), [1, 2, 4, 3])
+
+    def test_band(self):
+        self.assertEqual(
+            self.query(band = _bandplan.IARU_REGION_1[3]), [1, 2, 4])
+
+    def test_freqRange(self):
+        self.assertEqual(self.query(freq_range = (7015, 7030)), [2, 4])
+
+    def test_spotterContinents(self):
+        self.assertEqual(self.query(spotter_continents = ["NA"]), [2])
+
+    def test_dxCall_shouldMatchBaseCall(self):
+        self.assertEqual(self.query(dx_call = "AA1BB"), [1, 3])
+        self.assertEqual(self.query(dx_call = _callinfo.Call("AA1BB/P")), [1, 3])
+
+    def test_sourceCall(self):
+        self.assertEqual(self.query(source_call = "DL1ABC"), [1, 3])
+
+    def test_mode(self):
+        self.assertEqual(self.query(mode = "RTTY"), [2])
+
+    def test_since(self):
+        self.assertEqual(self.query(since = 25), [4, 3])
+
+    def test_combinedCriteria(self):
+        self.assertEqual(
+            self.query(
+                band = _bandplan.IARU_REGION_1[3], source_call = "DL1ABC", 
+                mode = "CW"), 
+            [1])
+
+    def test_unknownCall_shouldReturnNothing(self):
+        self.assertEqual(self.query(dx_call = "ZZ9ZZ"), [])
+
+    def test_updatedSpot_shouldBeReindexed(self):
+        self.table.update(snapshot(
+            1, 7010.0, [source("EU", 10, "OK1ABC")], call = "AA1BB"))
+
+        self.assertEqual(self.query(source_call = "DL1ABC"), [3])
+        self.assertEqual(self.query(source_call = "OK1ABC"), [1])
+
+    def test_removedSpot_shouldBeUnindexed(self):
+        self.table.remove(1)
+
+        self.assertEqual(self.query(dx_call = "AA1BB"), [3])
+
+    def test_copy_shouldQueryItsOwnSpots(self):
+        copy = self.table.copy()
+        self.table.remove(3)
+
+        self.assertEqual(
+            [spot.id for spot in copy.query(source_call = "DL1ABC")], [1, 3])
+
+
+class TestAggregatorTable(unittest.TestCase):
+    def test_cleanupSpots_shouldPublishTableWithActiveSpots(self):
+        aggregator = _spotting.SpotAggregator(_dxcc.DXCC())
+        deltas = []
+        aggregator.spots_changed.connect(deltas.append)
+        now = time.time()
+        aggregator.spot_received(_spotting.Spot(
+            60, _callinfo.Call("AA1BB"), 7010.0, now,
+            _callinfo.Call("CT1XY"), None))
+        aggregator.cleanup_spots()
+
+        table = deltas[0].table
+        self.assertEqual(
+            [str(spot.call) for spot in table.sorted_by_frequency()],
+            ["AA1BB"])
+        self.assertEqual(table.spots[0].id, deltas[0].added[0].id)
+        self.assertEqual(
+            [str(spot.call) for spot in aggregator.query(source_call = "CT1XY")],
+            ["AA1BB"])
+
+
+if __name__ == '__main__': unittest.main()
@@ -5,12 +5,19 @@ import sys
 import os
 import time
 import unittest
+import asyncio
+import tempfile
 sys.path.insert(0, os.path.abspath('..'))
 
 import dxpad._spotting as _spotting
 import dxpad._dxcc as _dxcc
 import dxpad._callinfo as _callinfo
 import dxpad._grid as _grid
+import dxpad._time as _time
+import dxpad._location as _location
+import dxpad._spottable as _spottable
+import dxpad._clusterfilter as _clusterfilter
+import dxpad._metrics as _metrics
 
 
 class TestAggregation(unittest.TestCase):
@@ -30,7 +37,7 @@ class TestAggregation(unittest.TestCase):
         self.assertEqual(len(spot.sources), 2)
 
         for source in spot.sources:
-            self.assertEqual(source.source_dxcc_info, "FakeDXCCInfo")
+            self.assertEqual(source.source_dxcc_info, FAKE_DXCC_INFO)
         self.assertEqual(spot.frequency, 14070000)
         self.assertEqual(spot.timeout, now + 60)
         self.assertEqual(spot.first_seen, now - 1)
@@ -49,19 +56,19 @@ class TestAggregation(unittest.TestCase):
 
         self.assertEqual(len(aggregator.spots[spot_call]), 2)
 
-        spot1 = aggregator.spots[spot_call][0]
+        spot1 = aggregator.spots[spot_call][1]
         self.assertEqual(len(spot1.sources), 1)
         for source in spot1.sources:
-            self.assertEqual(source.source_dxcc_info, "FakeDXCCInfo")
+            self.assertEqual(source.source_dxcc_info, FAKE_DXCC_INFO)
         self.assertEqual(spot1.frequency, 14070000)
         self.assertEqual(spot1.timeout, now - 1 + 60)
         self.assertEqual(spot1.first_seen, now - 1)
         self.assertEqual(spot1.last_seen, now - 1)
 
-        spot2 = aggregator.spots[spot_call][1]
+        spot2 = aggregator.spots[spot_call][0]
         self.assertEqual(len(spot2.sources), 1)
         for source in spot2.sources:
-            self.assertEqual(source.source_dxcc_info, "FakeDXCCInfo")
+            self.assertEqual(source.source_dxcc_info, FAKE_DXCC_INFO)
         self.assertEqual(spot2.frequency, 7040000)
         self.assertEqual(spot2.timeout, now + 60)
         self.assertEqual(spot2.first_seen, now)
@@ -85,7 +92,7 @@ class TestAggregation(unittest.TestCase):
         spot1 = aggregator.spots[spot_call1][0]
         self.assertEqual(len(spot1.sources), 1)
         for source in spot1.sources:
-            self.assertEqual(source.source_dxcc_info, "FakeDXCCInfo")
+            self.assertEqual(source.source_dxcc_info, FAKE_DXCC_INFO)
         self.assertEqual(spot1.frequency, 14070000)
         self.assertEqual(spot1.timeout, now - 1 + 60)
         self.assertEqual(spot1.first_seen, now - 1)
@@ -94,13 +101,70 @@ class TestAggregation(unittest.TestCase):
         spot2 = aggregator.spots[spot_call2][0]
         self.assertEqual(len(spot2.sources), 1)
         for source in spot2.sources:
-            self.assertEqual(source.source_dxcc_info, "FakeDXCCInfo")
+            self.assertEqual(source.source_dxcc_info, FAKE_DXCC_INFO)
         self.assertEqual(spot2.frequency, 7040000)
         self.assertEqual(spot2.timeout, now + 60)
         self.assertEqual(spot2.first_seen, now)
         self.assertEqual(spot2.last_seen, now)
 
 
+class TestSpotStore(unittest.TestCase):
+    def dx_spot(self, call, frequency):
+        return _spotting.DxSpot(_callinfo.Call(call), frequency, None)
+
+    def test_spotsByCall_shouldBeSortedByFrequency(self):
+        store = _spotting.SpotStore()
+        for frequency in [14020, 7010, 21030, 3500]:
+            store.add(self.dx_spot("AA1BB", frequency))
+
+        self.assertEqual(
+            [spot.frequency for spot in store[_callinfo.Call("AA1BB")]],
+            [3500, 7010, 14020, 21030])
+
+    def test_find_shouldReturnClosestSpotWithinWindow(self):
+        store = _spotting.SpotStore()
+        store.add(self.dx_spot("AA1BB", 14000))
+        store.add(self.dx_spot("AA1BB", 14012))
+        store.add(self.dx_spot("AA2BB", 14008))
+
+        spot = store.find(_callinfo.Call("AA1BB"), 14007)
+        self.assertEqual(spot.frequency, 14012)
+        self.assertIsNone(store.find(_callinfo.Call("AA1BB"), 14030))
+        self.assertIsNone(store.find(_callinfo.Call("AA3BB"), 14000))
+
+    def test_inRange_shouldReturnSpotsOfAllCalls(self):
+        store = _spotting.SpotStore()
+        store.add(self.dx_spot("AA1BB", 7010))
+        store.add(self.dx_spot("AA2BB", 14005))
+        store.add(self.dx_spot("AA1BB", 14010))
+        store.add(self.dx_spot("AA3BB", 14050))
+
+        self.assertEqual(
+            [str(spot.call) for spot in store.in_range(14000, 14020)],
+            ["AA2BB", "AA1BB"])
+
+    def test_remove_lastSpotOfCall_shouldRemoveCall(self):
+        store = _spotting.SpotStore()
+        spot = self.dx_spot("AA1BB", 7010)
+        store.add(spot)
+        store.remove(spot)
+
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.in_range(0, 30000), [])
+
+    def test_near_shouldFindSpotsOfTheBaseCallInTheWindow(self):
+        spots = [
+            self.dx_spot("DL1ABC", 7010), self.dx_spot("DL1ABC/P", 7015),
+            self.dx_spot("DL1ABC", 14010), self.dx_spot("DL2ABC", 7012)]
+        store = _spotting.SpotStore(spots)
+
+        self.assertEqual(store.near("DL1ABC", 7012), spots[:2])
+        self.assertEqual(store.near("DL3ABC", 7012), [])
+
+        store.remove(spots[0])
+        self.assertEqual(store.near("DL1ABC", 7012), spots[1:2])
+
+
 class TestTimeoutCleanup(unittest.TestCase):
     def test_updateSpots_shouldRemoveTimedoutSpots(self):
         now = time.time()
@@ -126,6 +190,89 @@ class TestTimeoutCleanup(unittest.TestCase):
         aggregator.cleanup_spots()
         self.assertEqual(len(aggregator.spots), 1)
 
+    def test_updateSpots_shouldKeepExtendedSpots(self):
+        now = time.time()
+        spot_call = _callinfo.Call("AA1BB")
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        aggregator.spot_received(_spotting.Spot(60, spot_call, 14070000, 
+            now - 61, _callinfo.Call("CT1XY"), _grid.Locator("JN12aa")))
+        aggregator.spot_received(_spotting.Spot(60, spot_call, 14070000, 
+            now - 1, _callinfo.Call("CT2XY"), _grid.Locator("JN12aa")))
+
+        aggregator.cleanup_spots()
+        self.assertEqual(len(aggregator.spots), 1)
+        self.assertEqual(len(aggregator.spots[spot_call][0].sources), 2)
+
+
+class TestSpotDelta(unittest.TestCase):
+    def setUp(self):
+        self.aggregator = _spotting.SpotAggregator(FakeDXCC())
+        self.deltas = []
+        self.aggregator.spots_changed.connect(self.deltas.append)
+
+    def spot(self, call, frequency, time, source_call):
+        return _spotting.Spot(60, _callinfo.Call(call), frequency, time,
+            _callinfo.Call(source_call), _grid.Locator("JN12aa"))
+
+    def test_newSpot_shouldBeAdded(self):
+        now = time.time()
+        self.aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT1XY"))
+        self.aggregator.cleanup_spots()
+
+        self.assertEqual(len(self.deltas), 1)
+        self.assertEqual(
+            [str(spot.call) for spot in self.deltas[0].added], ["AA1BB"])
+        self.assertEqual(self.deltas[0].changed, [])
+        self.assertEqual(self.deltas[0].expired, [])
+
+    def test_newSource_shouldChangeSpot(self):
+        now = time.time()
+        self.aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT1XY"))
+        self.aggregator.spot_received(self.spot("AA2BB", 14040, now, "CT1XY"))
+        self.aggregator.cleanup_spots()
+        self.aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT2XY"))
+        self.aggregator.cleanup_spots()
+
+        self.assertEqual(len(self.deltas), 2)
+        self.assertEqual(self.deltas[1].added, [])
+        self.assertEqual(
+            [str(spot.call) for spot in self.deltas[1].changed], ["AA1BB"])
+        self.assertEqual(
+            self.deltas[1].changed[0].id, self.deltas[0].added[0].id)
+
+    def test_timedoutSpot_shouldExpire(self):
+        now = time.time()
+        self.aggregator.spot_received(
+            self.spot("AA1BB", 7040, now - 59.9, "CT1XY"))
+        self.aggregator.cleanup_spots()
+        time.sleep(0.2)
+        self.aggregator.cleanup_spots()
+
+        self.assertEqual(len(self.deltas), 2)
+        self.assertEqual(
+            [spot.id for spot in self.deltas[1].expired], 
+            [spot.id for spot in self.deltas[0].added])
+
+    def test_publishedSnapshot_shouldNotChange(self):
+        now = time.time()
+        self.aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT1XY"))
+        self.aggregator.cleanup_spots()
+        self.aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT2XY"))
+        self.aggregator.cleanup_spots()
+
+        added = self.deltas[0].added[0]
+        changed = self.deltas[1].changed[0]
+        self.assertIsInstance(added, _spotting.DxSpotSnapshot)
+        self.assertEqual(len(added.sources), 1)
+        self.assertEqual(len(changed.sources), 2)
+        with self.assertRaises(AttributeError):
+            added.frequency = 14040
+
+    def test_nothingChanged_shouldNotEmitDelta(self):
+        self.aggregator.cleanup_spots()
+
+        self.assertEqual(self.deltas, [])
+
 
 class TestLevenshteinCleanup(unittest.TestCase):
     def test_twoCalls_oneDifference_shouldAggregateToOneSpotUsingMajorityWhenChoosingFile(self):
@@ -148,12 +295,609 @@ class TestLevenshteinCleanup(unittest.TestCase):
         self.assertFalse(spot_call1 in aggregator.spots)
         self.assertTrue(spot_call2 in aggregator.spots)
 
+    def test_twoCalls_differentFirstCharacter_shouldAggregateToOneSpot(self):
+        now = time.time()
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        aggregator.spot_received(_spotting.Spot(60, _callinfo.Call("EA1BB"), 
+            7040000, now, _callinfo.Call("CT1XY"), _grid.Locator("JN12aa")))
+        aggregator.spot_received(_spotting.Spot(60, _callinfo.Call("AA1BB"), 
+            7040005, now, _callinfo.Call("CT2XY"), _grid.Locator("JN12aa")))
+        aggregator.spot_received(_spotting.Spot(60, _callinfo.Call("AA1BB"), 
+            7040005, now, _callinfo.Call("CT3XY"), _grid.Locator("JN12aa")))
+        aggregator.cleanup_spots()
+
+        self.assertEqual(len(aggregator.spots), 1)
+        self.assertTrue(_callinfo.Call("AA1BB") in aggregator.spots)
+
+    def test_newBustedSpot_shouldBeMergedIntoUnchangedSpot(self):
+        now = time.time()
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        deltas = []
+        aggregator.spots_changed.connect(deltas.append)
+        for source_call in ["CT1XY", "CT2XY"]:
+            aggregator.spot_received(_spotting.Spot(
+                60, _callinfo.Call("AA1BB"), 7040, now, 
+                _callinfo.Call(source_call), None))
+        aggregator.spot_received(_spotting.Spot(
+            60, _callinfo.Call("DL1ABC"), 7041, now, 
+            _callinfo.Call("CT1XY"), None))
+        aggregator.cleanup_spots()
+
+        aggregator.spot_received(_spotting.Spot(
+            60, _callinfo.Call("EA1BB"), 7040.5, now, 
+            _callinfo.Call("CT3XY"), None))
+        aggregator.cleanup_spots()
+
+        self.assertEqual(
+            sorted(str(call) for call in aggregator.spots), 
+            ["AA1BB", "DL1ABC"])
+        self.assertEqual(deltas[1].added, [])
+        self.assertEqual(
+            [(str(spot.call), spot.source_count) 
+             for spot in deltas[1].changed], 
+            [("AA1BB", 3)])
+
+    def test_twoCalls_twoDifferences_shouldKeepBothSpots(self):
+        now = time.time()
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        aggregator.spot_received(_spotting.Spot(60, _callinfo.Call("AA1BB"), 
+            7040000, now, _callinfo.Call("CT1XY"), _grid.Locator("JN12aa")))
+        aggregator.spot_received(_spotting.Spot(60, _callinfo.Call("AA2BC"), 
+            7040000, now, _callinfo.Call("CT2XY"), _grid.Locator("JN12aa")))
+        aggregator.cleanup_spots()
+
+        self.assertEqual(len(aggregator.spots), 2)
+
+
+class TestBustedCallIndex(unittest.TestCase):
+    def index(self, *calls):
+        index = _spotting.BustedCallIndex()
+        for call in calls:
+            index.add(call)
+        return index
+
+    def test_cwConfusedSubstitution_shouldBeSimilar(self):
+        index = self.index("DL1ABC", "DL1ABS", "DL1ABK", "DL2ABC", "DI1ABC")
+
+        self.assertEqual(
+            index.similar_calls("DL1ABC"), 
+            set(["DL1ABC", "DL1ABK", "DL2ABC"]))
+
+    def test_insertionAndDeletion_shouldBeSimilar(self):
+        index = self.index("DL1ABC", "DL1AB", "L1ABC", "DL1ABCE", "DL1AEBC")
+
+        self.assertEqual(
+            index.similar_calls("DL1ABC"), 
+            set(["DL1ABC", "DL1AB", "L1ABC", "DL1ABCE", "DL1AEBC"]))
+
+    def test_twoDifferences_shouldNotBeSimilar(self):
+        index = self.index("DL1ABC", "DL1BAC", "DL2ABD", "DL1A")
+
+        self.assertEqual(index.similar_calls("DL1ABC"), set(["DL1ABC"]))
+
+    def test_variants_shouldBeMaintainedIncrementally(self):
+        index = self.index("DL1ABC", "DL1ABH")
+        index.add("DL1ABS")
+        self.assertEqual(
+            index.similar_calls("DL1ABH"), set(["DL1ABH", "DL1ABS"]))
+
+        index.remove("DL1ABS")
+        self.assertEqual(index.similar_calls("DL1ABH"), set(["DL1ABH"]))
+        self.assertFalse("DL1ABS" in index)
+
+    def test_remove_shouldKeepCallsThatAreStillReferenced(self):
+        index = self.index("DL1ABC", "DL1ABC", "DL2ABC")
+        index.remove("DL1ABC")
+
+        self.assertEqual(
+            index.similar_calls("DL2ABC"), set(["DL1ABC", "DL2ABC"]))
+
+
+    def test_remove_shouldLeaveSingleCallsInSharedKeys(self):
+        index = self.index("DL1ABC", "DL1ABS", "DL1AB")
+        index.remove("DL1ABS")
+        index.remove("DL1AB")
+
+        self.assertTrue(all(
+            isinstance(calls, str) for calls in index.calls_by_key.values()))
+        self.assertEqual(
+            index.similar_calls("DL1ABK"), set(["DL1ABK", "DL1ABC"]))
+        index.remove("DL1ABC")
+        self.assertEqual(index.calls_by_key, {})
+        self.assertEqual(index.variants, {})
+
+class TestClusterSpotter(unittest.TestCase):
+    def test_parseLine_rbnSpot(self):
+        spot = _spotting.ClusterSpotter.parse_line(
+            "DX de DL8LAS-#:    7018.0  UA3AKO         CW    12 dB  24 WPM  "
+            "CQ      1204Z\n")
+
+        self.assertIsInstance(spot, _spotting.RbnSpot)
+        self.assertEqual(spot.call, _callinfo.Call("UA3AKO"))
+        self.assertEqual(spot.source_call, _callinfo.Call("DL8LAS"))
+        self.assertEqual(spot.frequency, 7018.0)
+        self.assertEqual(spot.snr, 12.0)
+        self.assertEqual(spot.speed, "24")
+        self.assertFalse(hasattr(spot, "__dict__"))
+
+    def test_parseLine_clusterSpotWithGrid(self):
+        spot = _spotting.ClusterSpotter.parse_line(
+            "DX de EA6/DL3NEY:  14025.0  VK7/DK6MP/P  up 2 loud   "
+            "1830Z JM19\n")
+
+        self.assertIsInstance(spot, _spotting.ClusterSpot)
+        self.assertEqual(spot.call, _callinfo.Call("VK7/DK6MP/P"))
+        self.assertEqual(spot.source_call, _callinfo.Call("EA6/DL3NEY"))
+        self.assertEqual(spot.comment, "up 2 loud")
+        self.assertIsNotNone(spot.source_grid)
+
+    def test_parseLine_shouldIgnoreQualifierBehindWorkingCondition(self):
+        spot = _spotting.ClusterSpotter.parse_line(
+            "DX de DL1ABC:      7093.0  DL2ABC/P/QRP  cq cq   1830Z\n")
+
+        self.assertEqual(spot.call, _callinfo.Call("DL2ABC/P"))
+
+    def test_lineReceived_shouldLookUpDXCCInfo(self):
+        spotter = _spotting.ClusterSpotter(None, FakeDXCC())
+        spots = []
+        spotter._line_received(
+            "DX de DL8LAS-#:    7018.0  UA3AKO         CW    12 dB  24 WPM  "
+            "CQ      1204Z\n", spots.append)
+
+        self.assertEqual(spots[0].dxcc_info, FAKE_DXCC_INFO)
+        self.assertEqual(spots[0].source_dxcc_info, FAKE_DXCC_INFO)
+
+    def test_spotReceived_shouldUseDXCCInfoOfTheSpot(self):
+        dxcc = CountingDXCC()
+        aggregator = _spotting.SpotAggregator(dxcc)
+        spot = _spotting.Spot(60, _callinfo.Call("UA3AKO"), 7018, time.time(),
+                              _callinfo.Call("DL8LAS"), None)
+        spot.lookup_dxcc_info(FakeDXCC())
+
+        aggregator.spot_received(spot)
+
+        self.assertEqual(dxcc.lookups, 0)
+        self.assertEqual(
+            aggregator.spots[_callinfo.Call("UA3AKO")][0].dxcc_info, 
+            FAKE_DXCC_INFO)
+
+    def test_parseLine_shouldRejectOtherLines(self):
+        for line in ["To ALL de DL1ABC: contest this weekend\n",
+                     "WCY de DK0WCY-1 <18> : K=2 expK=0 A=7\n",
+                     "DL1ABC de DL2ABC: hello\n",
+                     ""]:
+            self.assertIsNone(_spotting.ClusterSpotter.parse_line(line))
+
+    def test_parseLine_shouldRejectInvalidCalls(self):
+        self.assertIsNone(_spotting.ClusterSpotter.parse_line(
+            "DX de DL8LAS-#:    7018.0  12345          CW    12 dB  24 WPM  "
+            "CQ      1204Z\n"))
+        self.assertIsNone(_spotting.ClusterSpotter.parse_line(
+            "DX de 12345:       7018.0  UA3AKO         CW    12 dB  24 WPM  "
+            "CQ      1204Z\n"))
+
+
+class TestSpotBatcher(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.batches = []
+        self.batcher = _spotting.SpotBatcher(
+            self.batches.append, max_size = 3, max_delay = 0.1, 
+            clock = lambda: self.now)
+
+    def test_add_shouldDeliverFullBatch(self):
+        for spot in range(7):
+            self.batcher.add(spot)
+
+        self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(len(self.batcher), 1)
+
+    def test_add_shouldDeliverAfterMaxDelay(self):
+        self.batcher.add(1)
+        self.now = 0.05
+        self.batcher.add(2)
+        self.assertEqual(self.batches, [])
+
+        self.now = 0.1
+        self.batcher.add(3)
+        self.assertEqual(self.batches, [[1, 2, 3]])
+
+    def test_flushIfDue(self):
+        self.batcher.add(1)
+        self.batcher.flush_if_due()
+        self.assertEqual(self.batches, [])
+
+        self.now = 0.2
+        self.batcher.flush_if_due()
+        self.batcher.flush_if_due()
+        self.assertEqual(self.batches, [[1]])
+
+    def test_spotsReceived_shouldAggregateAllSpotsOfTheBatch(self):
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        now = time.time()
+        aggregator.spots_received([
+            _spotting.Spot(60, _callinfo.Call("AA1BB"), 7040, now, 
+                           _callinfo.Call("CT1XY"), None),
+            _spotting.Spot(60, _callinfo.Call("AA1BB"), 7040, now, 
+                           _callinfo.Call("CT2XY"), None),
+            _spotting.Spot(60, _callinfo.Call("AA2BB"), 14040, now, 
+                           _callinfo.Call("CT1XY"), None)])
+
+        self.assertEqual(len(aggregator.spots), 2)
+        self.assertEqual(
+            len(aggregator.spots[_callinfo.Call("AA1BB")][0].sources), 2)
+
+
+class TestDuplicateFilter(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.filter = _spotting.DuplicateFilter(
+            max_size = 3, max_age = 600, clock = lambda: self.now)
+
+    def spot(self, call, frequency, time, source_call):
+        return _spotting.Spot(60, _callinfo.Call(call), frequency, time,
+            _callinfo.Call(source_call), None)
+
+    def test_sameSpotFromAnotherCluster_shouldBeDuplicate(self):
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040.1, 1200, "CT1XY")))
+        self.assertTrue(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040.3, 1210, "CT1XY")))
+        self.assertEqual(self.filter.passed, 1)
+        self.assertEqual(self.filter.suppressed, 1)
+
+    def test_differentSourceFrequencyOrMinute_shouldNotBeDuplicate(self):
+        self.filter.is_duplicate(self.spot("AA1BB", 7040, 1200, "CT1XY"))
+
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040, 1200, "CT2XY")))
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7045, 1200, "CT1XY")))
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040, 1260, "CT1XY")))
+        self.assertEqual(self.filter.suppressed, 0)
+
+    def test_acrossBucketEdges_shouldBeDuplicate(self):
+        self.filter.is_duplicate(self.spot("AA1BB", 14024.9, 1259, "CT1XY"))
+
+        self.assertTrue(self.filter.is_duplicate(
+            self.spot("AA1BB", 14025.0, 1261, "CT1XY")))
+        self.assertTrue(self.filter.is_duplicate(
+            self.spot("AA1BB", 14025.9, 1201, "CT1XY")))
+
+    def test_spotsReceived_shouldCountSpotsAndDuplicatesPerBatch(self):
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        now = time.time()
+        counter = _metrics.METRICS.counter("spots.Spot")
+        duplicates = aggregator.duplicates_counter
+        spots, duplicate_count = counter.value, duplicates.value
+
+        aggregator.spots_received([
+            self.spot("AA1BB", 7040, now, "CT1XY"),
+            self.spot("AA1BB", 7040.5, now, "CT1XY"),
+            self.spot("AA2BB", 7040, now, "CT1XY")])
+
+        self.assertEqual(counter.value - spots, 3)
+        self.assertEqual(duplicates.value - duplicate_count, 1)
+
+    def test_shouldEvictOldKeys(self):
+        self.filter.is_duplicate(self.spot("AA1BB", 7040, 1200, "CT1XY"))
+        self.now += 601
+
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040, 1200, "CT1XY")))
+        self.assertEqual(len(self.filter), 1)
+
+    def test_shouldBeBounded(self):
+        for call in ["AA1BB", "AA2BB", "AA3BB", "AA4BB"]:
+            self.filter.is_duplicate(self.spot(call, 7040, 1200, "CT1XY"))
+
+        self.assertEqual(len(self.filter), 3)
+        self.assertFalse(self.filter.is_duplicate(
+            self.spot("AA1BB", 7040, 1200, "CT1XY")))
+
+    def test_aggregator_shouldIgnoreDuplicates(self):
+        aggregator = _spotting.SpotAggregator(FakeDXCC())
+        now = time.time()
+        aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT1XY"))
+        aggregator.spot_received(self.spot("AA1BB", 7040, now, "CT1XY"))
+
+        self.assertEqual(
+            len(aggregator.spots[_callinfo.Call("AA1BB")][0].sources), 1)
+        self.assertEqual(aggregator.duplicates.suppressed, 1)
+
+
+class TestReplayClient(unittest.TestCase):
+    DAY = 1476576000.0 # 2016-10-16 00:00Z
+
+    def replay(self, lines, speed = None):
+        with tempfile.NamedTemporaryFile("w", suffix = ".txt") as f:
+            f.writelines(lines)
+            f.flush()
+            clock = _time.VirtualClock()
+            client = _spotting.ReplayClient(f.name, clock, speed, self.DAY)
+            spotter = _spotting.ClusterSpotter(client, None, clock)
+            spots = []
+            spotter.run(spots.append)
+        return clock, spots
+
+    def line(self, call, hhmm):
+        return ("DX de DL8LAS-#:    7018.0  {:<14} CW    12 dB  24 WPM  "
+                "CQ      {}Z\n".format(call, hhmm))
+
+    def test_run_shouldUseRecordedTime(self):
+        clock, spots = self.replay([
+            self.line("AA1BB", "1204"), 
+            "WCY de DK0WCY-1 <18> : K=2 expK=0 A=7\n",
+            self.line("AA2BB", "1206")])
+
+        self.assertEqual(
+            [spot.time for spot in spots], 
+            [self.DAY + 12 * 3600 + 240, self.DAY + 12 * 3600 + 360])
+        self.assertEqual(clock.time(), self.DAY + 12 * 3600 + 360)
+
+    def test_run_shouldContinueOnTheNextDay(self):
+        clock, spots = self.replay([
+            self.line("AA1BB", "2359"), self.line("AA2BB", "0001")])
+
+        self.assertEqual(spots[1].time, self.DAY + 86400 + 60)
+
+    def test_run_shouldKeepTheSpeedFactor(self):
+        start = time.monotonic()
+        self.replay([self.line("AA1BB", "1204"), self.line("AA2BB", "1205")],
+                    speed = 600)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_spottingThread_shouldDeliverBeforeTheClockAdvances(self):
+        with tempfile.NamedTemporaryFile("w", suffix = ".txt") as f:
+            f.writelines([
+                self.line("AA1BB", "0916"), self.line("AA2BB", "0916"),
+                self.line("AA3BB", "0917")])
+            f.flush()
+            clock = _time.VirtualClock()
+            thread = _spotting.SpottingThread.replay(f.name, clock, None)
+            thread.spotter.client.day_start = self.DAY
+            events = []
+            thread.spots_received.connect(
+                lambda spots: events.append(
+                    ([str(spot.call) for spot in spots], clock.time())))
+            thread.clock_advanced.connect(events.append)
+
+            thread.run()
+
+        minute = self.DAY + 9 * 3600 + 16 * 60
+        self.assertEqual(events, [
+            minute,
+            (["AA1BB", "AA2BB"], minute),
+            minute + 60,
+            (["AA3BB"], minute + 60)])
+
+    def test_aggregator_shouldCleanUpAtTheReplayedTime(self):
+        clock = _time.VirtualClock(self.DAY)
+        aggregator = _spotting.SpotAggregator(FakeDXCC(), clock = clock)
+        aggregator.spot_received(_spotting.RbnSpot(
+            _callinfo.Call("AA1BB"), 7018, self.DAY, _callinfo.Call("DL8LAS"), 
+            None, "CW", 12, "24", "CQ"))
+        clock.advance(600) # the replay thread is ahead
+
+        aggregator.clock_advanced(self.DAY + 30)
+        aggregator.cleanup_spots()
+        self.assertEqual(len(aggregator.spots), 1)
+
+        aggregator.clock_advanced(self.DAY + 120)
+        self.assertEqual(len(aggregator.spots), 0)
+
+    def test_firstSeen_shouldBeTheTimeOfTheFirstSource(self):
+        spot = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7018, None)
+        spot.add_source(_spotting.Spot(
+            60, _callinfo.Call("AA1BB"), 7018, self.DAY + 60, 
+            _callinfo.Call("DL8LAS"), None))
+        spot.add_source(_spotting.Spot(
+            60, _callinfo.Call("AA1BB"), 7018, self.DAY, 
+            _callinfo.Call("DL8LAS"), None))
+
+        self.assertEqual(spot.first_seen, self.DAY)
+
+    def test_aggregator_shouldExpireOnTheVirtualClock(self):
+        clock = _time.VirtualClock(self.DAY)
+        aggregator = _spotting.SpotAggregator(FakeDXCC(), clock = clock)
+        aggregator.spot_received(_spotting.RbnSpot(
+            _callinfo.Call("AA1BB"), 7018, self.DAY, _callinfo.Call("DL8LAS"), 
+            None, "CW", 12, "24", "CQ"))
+        clock.advance(59)
+        aggregator.cleanup_spots()
+        self.assertEqual(len(aggregator.spots), 1)
+
+        clock.advance(2)
+        aggregator.cleanup_spots()
+        self.assertEqual(len(aggregator.spots), 0)
+
+
+class TestTelnetCommands(unittest.TestCase):
+    def test_plainData(self):
+        self.assertEqual(
+            _spotting.strip_telnet_commands(b"DX de DL1ABC\r\n"),
+            (b"DX de DL1ABC\r\n", b"", b""))
+
+    def test_refuseOptions(self):
+        payload, replies, rest = _spotting.strip_telnet_commands(
+            b"\xff\xfd\x18login: \xff\xfb\x01")
+
+        self.assertEqual(payload, b"login: ")
+        self.assertEqual(replies, b"\xff\xfc\x18\xff\xfe\x01")
+        self.assertEqual(rest, b"")
+
+    def test_skipSubnegotiationAndEscapedIAC(self):
+        self.assertEqual(
+            _spotting.strip_telnet_commands(b"a\xff\xfa\x18\x01\xff\xf0b\xff\xff"),
+            (b"ab\xff", b"", b""))
+
+    def test_keepIncompleteCommand(self):
+        self.assertEqual(
+            _spotting.strip_telnet_commands(b"abc\xff\xfd"),
+            (b"abc", b"", b"\xff\xfd"))
+
+
+class TestClusterConnection(unittest.TestCase):
+    def test_run_shouldLoginAndFrameLines(self):
+        received_lines = []
+        logins = []
+
+        async def serve(reader, writer):
+            writer.write(b"\xff\xfd\x18Please enter your call: ")
+            logins.append(await reader.readline())
+            writer.write(b"Hello DL3NEY\r\nDX de DL1")
+            await writer.drain()
+            writer.write(b"ABC:  7018.0  UA3AKO  CW  1204Z\r\nbye\r\n")
+            await writer.drain()
+            await reader.read()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(serve, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            connection = _spotting.ClusterConnection(
+                "127.0.0.1", port, "DL3NEY")
+            def line_received(line):
+                received_lines.append(line)
+                if line.startswith("bye"):
+                    connection.stop()
+            await asyncio.wait_for(connection.run(line_received), 5)
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(run())
+
+        self.assertEqual(logins, [b"\xff\xfc\x18DL3NEY\n"])
+        self.assertEqual(received_lines, [
+            "Please enter your call: Hello DL3NEY\r", 
+            "DX de DL1ABC:  7018.0  UA3AKO  CW  1204Z\r", 
+            "bye\r"])
+
+
+    def test_run_withClusterFilter_shouldSendFilterAfterLogin(self):
+        commands = []
+
+        async def serve(reader, writer):
+            writer.write(b"Welcome to DB0XX, running DXSpider\r\n")
+            writer.write(b"login: ")
+            await reader.readline()
+            writer.write(b"Hello DL3NEY\r\nDL3NEY de DB0XX 1200Z dxspider >")
+            for i in range(2):
+                commands.append(await reader.readline())
+            writer.write(b"\r\nbye\r\n")
+            await reader.read()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(serve, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            connection = _spotting.ClusterConnection(
+                "127.0.0.1", port, "DL3NEY", 
+                cluster_filter = _clusterfilter.ClusterFilter(["EU"]),
+                software = _clusterfilter.AUTO)
+            def line_received(line):
+                if line.startswith("bye"):
+                    connection.stop()
+            await asyncio.wait_for(connection.run(line_received), 5)
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(run())
+
+        self.assertEqual(
+            [command.decode().strip() for command in commands],
+            _clusterfilter.ClusterFilter(["EU"]).commands("dxspider"))
+
+
+class TestDxSpotSummary(unittest.TestCase):
+    def source(self, source_call, snr, time, continent = "EU"):
+        spot = _spotting.RbnSpot(
+            _callinfo.Call("AA1BB"), 7010.0, time, _callinfo.Call(source_call),
+            None, "CW", snr, "22", "CQ")
+        spot.source_dxcc_info = _dxcc.DXCCInfo(
+            continent, 0, 0, continent, _location.LatLon(0, 0), 0.0, 
+            continent)
+        return spot
+
+    def test_addSource_manySources_shouldKeepSummaryAndRecentSources(self):
+        spot = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7010.0, None)
+        for i in range(100):
+            spot.add_source(self.source("DL{}ABC".format(i % 4), i % 30, i))
+
+        self.assertEqual(spot.source_count, 100)
+        self.assertEqual(len(spot.sources), _spotting.DxSpot.RECENT_SOURCES)
+        self.assertEqual(spot.sources[-1].time, 99)
+        self.assertEqual(
+            spot.spotters, ("DL0ABC", "DL1ABC", "DL2ABC", "DL3ABC"))
+        self.assertEqual(spot.spotter_count, 4)
+        self.assertEqual(spot.best_snr, 29)
+        self.assertAlmostEqual(
+            spot.average_snr(), sum(i % 30 for i in range(100)) / 100)
+        self.assertEqual(spot.modes, ("CW",))
+
+    def test_addSource_manySpotters_shouldKeepCountAndRecentSpotters(self):
+        spot = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7010.0, None)
+        for i in range(100):
+            spot.add_source(self.source("DL{}ABC".format(i), 10, i))
+
+        self.assertEqual(spot.spotter_count, 100)
+        self.assertEqual(
+            len(spot.spotters), _spotting.DxSpot.RECENT_SPOTTERS)
+        self.assertEqual(spot.spotters[-1], "DL99ABC")
+
+    def test_merge_shouldCombineSummaries(self):
+        spot1 = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7010.0, None)
+        spot1.add_source(self.source("DL1ABC", 10, 2, "EU"))
+        spot2 = _spotting.DxSpot(_callinfo.Call("AA1BC"), 7010.0, None)
+        spot2.add_source(self.source("K1ABC", 20, 1, "NA"))
+        spot2.add_source(self.source("K1ABC", 5, 3, "NA"))
+        spot2.add_source(self.source("DL1ABC", 5, 3, "EU"))
+
+        spot1.merge(spot2)
+
+        self.assertEqual(spot1.source_count, 4)
+        self.assertEqual(spot1.spotters, ("DL1ABC", "K1ABC"))
+        self.assertEqual(spot1.spotter_count, 2)
+        self.assertEqual(spot1.best_snr, 20)
+        self.assertAlmostEqual(spot1.average_snr(), 40 / 4)
+        self.assertEqual(
+            spot1.spotter_continents, 
+            _spottable.continent_mask(["EU", "NA"]))
+        self.assertEqual([source.time for source in spot1.sources], [1, 2, 3, 3])
+
+    def test_snapshot_shouldContainSummary(self):
+        spot = _spotting.DxSpot(_callinfo.Call("AA1BB"), 7010.0, None)
+        spot.add_source(self.source("DL1ABC", 10, 2))
+
+        snapshot = spot.snapshot()
+
+        self.assertEqual(snapshot.source_count, 1)
+        self.assertIs(snapshot.spotters, spot.spotters)
+        self.assertEqual(snapshot.spotter_count, 1)
+        self.assertEqual(snapshot.best_snr, 10)
+        self.assertEqual(snapshot.average_snr, 10)
+        self.assertEqual(len(snapshot.sources), 1)
+
+
+FAKE_DXCC_INFO = _dxcc.DXCCInfo(
+    "FakeDXCCInfo", 14, 28, "EU", _location.LatLon(0, 0), 0.0, "FAKE")
 
 class FakeDXCC(_dxcc.DXCC):
     def __init__(self):
         _dxcc.DXCC.__init__(self)
 
     def find_dxcc_info(self, call):
-        return "FakeDXCCInfo"
+        return FAKE_DXCC_INFO
+
+class CountingDXCC(FakeDXCC):
+    def __init__(self):
+        FakeDXCC.__init__(self)
+        self.lookups = 0
+
+    def find_dxcc_info(self, call):
+        self.lookups += 1
+        return FakeDXCC.find_dxcc_info(self, call)
 
 if __name__ == '__main__': unittest.main()